@@ -8,7 +8,7 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
-from game.models import TaskCompletion, ScoreEntry, UserProfile, QuizAttempt
+from game.models import TaskCompletion, ScoreEntry, ScoreEntryArchive, UserProfile, QuizAttempt
 
 
 def _is_valid_telegram_init_data(init_data: str) -> bool:
@@ -84,7 +84,7 @@ class UserProfileSerializer(serializers.ModelSerializer[UserProfile]):
     referred_by_code = serializers.CharField(
         source="referred_by.referral_code", allow_null=True, read_only=True
     )
-    referrals_count = serializers.SerializerMethodField()
+    referrals_count = serializers.IntegerField(read_only=True)
     stats = serializers.SerializerMethodField()
 
     class Meta:
@@ -103,11 +103,11 @@ class UserProfileSerializer(serializers.ModelSerializer[UserProfile]):
             "is_banned",
         )
 
-    def get_referrals_count(self, obj: UserProfile) -> int:
-        return obj.referrals.count()
-
     def get_stats(self, obj: UserProfile) -> dict[str, int]:
-        failures_completed = ScoreEntry.objects.filter(profile=obj).count()
+        failures_completed = (
+            ScoreEntry.objects.filter(profile=obj).count()
+            + ScoreEntryArchive.objects.filter(profile=obj).count()
+        )
         quizzes_completed = QuizAttempt.objects.filter(profile=obj).count()
         tasks_completed = TaskCompletion.objects.filter(
             profile=obj, is_completed=True
@@ -6,6 +6,7 @@ from .views import (
     PromoCodeApplyView,
     ReferralCodeApplyView,
     TelegramAuthView,
+    TopInvitersView,
 )
 
 urlpatterns = [
@@ -13,5 +14,6 @@ urlpatterns = [
     path("me/", CurrentUserProfileView.as_view(), name="current-profile"),
     path("legal-check/", LegalCheckView.as_view(), name="legal-check"),
     path("referral/", ReferralCodeApplyView.as_view(), name="referral-apply"),
+    path("referral/top/", TopInvitersView.as_view(), name="referral-top"),
     path("promo/", PromoCodeApplyView.as_view(), name="promo-apply"),
 ]
@@ -6,6 +6,7 @@ import requests
 from django.conf import settings
 from django.db import transaction
 from django.db.models import F
+from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.request import Request
 from rest_framework.response import Response
@@ -25,6 +26,16 @@ from game.models import (
     ReferralProgramConfig,
     UserProfile,
 )
+from game.services import (
+    LEADERBOARD_MAX_PAGE_SIZE,
+    LEADERBOARD_PAGE_SIZE,
+    CursorError,
+    change_referrals_count,
+    credit,
+    inviter_position,
+    inviter_row,
+    top_inviters_page,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -148,17 +159,62 @@ class ReferralCodeApplyView(APIView):
         reward_cfg = ReferralProgramConfig.get_solo()
         reward_amount = int(reward_cfg.reward_for_activation or 0)
 
-        profile.referred_by = referrer
-        if reward_amount > 0:
-            profile.balance = F("balance") + reward_amount
-            profile.save(update_fields=["referred_by", "balance", "updated_at"])
-            profile.refresh_from_db(fields=["balance", "referred_by"])
-        else:
-            profile.save(update_fields=["referred_by", "updated_at"])
+        # условный UPDATE вместо save(): повторная активация в параллельном
+        # запросе не пройдёт, а счётчик пригласившего меняется в той же транзакции
+        now = timezone.now()
+        with transaction.atomic():
+            activated = UserProfile.objects.filter(
+                pk=profile.pk, referred_by__isnull=True
+            ).update(referred_by=referrer, updated_at=now)
+            if not activated:
+                return Response(
+                    {"detail": "Реферальный код уже был активирован."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            change_referrals_count(referrer.id, 1)
+            if reward_amount > 0:
+                credit(profile, reward_amount, now=now)
 
+        profile.referred_by = referrer
+        profile.updated_at = now
         return Response(UserProfileSerializer(profile).data, status=status.HTTP_200_OK)
 
 
+class TopInvitersView(APIView):
+    """Топ пригласивших по счётчику рефералов; параметры limit и cursor."""
+
+    permission_classes = (permissions.IsAuthenticated, IsNotBanned)
+
+    def get(self, request: Request) -> Response:
+        try:
+            limit = int(request.query_params.get("limit", LEADERBOARD_PAGE_SIZE))
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "Некорректные параметры пагинации."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, LEADERBOARD_MAX_PAGE_SIZE))
+        cursor = request.query_params.get("cursor") or None
+
+        try:
+            rows, next_cursor = top_inviters_page(cursor=cursor, limit=limit)
+        except CursorError:
+            return Response(
+                {"detail": "Некорректный курсор."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        profile = getattr(request.user, "profile", None) or request.user.userprofile
+        position = inviter_position(profile)
+        return Response(
+            {
+                "entries": rows,
+                "next_cursor": next_cursor,
+                "current_user": inviter_row(profile, position) if position else None,
+            }
+        )
+
+
 class PromoCodeApplyView(APIView):
     permission_classes = (permissions.IsAuthenticated, IsNotBanned)
 
@@ -201,9 +257,7 @@ class PromoCodeApplyView(APIView):
             promo.save(update_fields=["is_active", "updated_at"])
 
         if promo.reward:
-            profile.balance = F("balance") + promo.reward
-            profile.save(update_fields=["balance", "updated_at"])
-            profile.refresh_from_db(fields=["balance"])
+            credit(profile, promo.reward)
 
         return Response(UserProfileSerializer(profile).data, status=status.HTTP_200_OK)
 
@@ -83,10 +83,17 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("POSTGRES_HOST", "db"),
         "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        # API работает под WSGI и держит соединения; сервис SSE-потока (ASGI)
+        # запускается с DB_CONN_MAX_AGE=0, см. docker-compose.yml
         "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
     }
 }
 
+# отдельная база для нагрузочных команд: failure_throughput / simulate_failure_event
+# с --database loadtest не трогают рабочие данные
+if os.getenv("LOADTEST_POSTGRES_DB"):
+    DATABASES["loadtest"] = {**DATABASES["default"], "NAME": os.environ["LOADTEST_POSTGRES_DB"]}
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = "ru-ru"
@@ -128,9 +135,18 @@ SIMPLE_JWT = {
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "skip_failure_start_rejections": {
+            "()": "cat_game_backend.log_filters.SkipFailureStartRejections",
+        },
+    },
     "handlers": {"console": {"class": "logging.StreamHandler"}},
     "root": {"handlers": ["console"], "level": "INFO"},
-    "loggers": {"accounts": {"level": "DEBUG"}},
+    "loggers": {
+        "accounts": {"level": "DEBUG"},
+        # отказы очереди старта сбоя сводкой пишет сам gate, а не строкой на запрос
+        "django.request": {"filters": ["skip_failure_start_rejections"]},
+    },
 }
 
 JAZZMIN_SETTINGS = {
@@ -155,8 +171,15 @@ JAZZMIN_SETTINGS = {
         "game.DailyRewardClaim": "fas fa-hand-holding-usd",
         "game.Failure": "fas fa-exclamation-triangle",
         "game.FailureBonusPurchase": "fas fa-shopping-cart",
+        "game.FailureRun": "fas fa-running",
+        "game.FailureWebhookEvent": "fas fa-paper-plane",
+        "game.FailureStanding": "fas fa-trophy",
+        "game.Season": "fas fa-calendar-alt",
+        "game.SeasonScore": "fas fa-medal",
         "game.QuizQuestion": "fas fa-question-circle",
         "game.ScoreEntry": "fas fa-chart-line",
+        "game.ScoreEntryArchive": "fas fa-archive",
+        "game.FailurePrizePayout": "fas fa-award",
         "game.QuizAttempt": "fas fa-clipboard-list",
         "game.PromoCode": "fas fa-ticket-alt",
         "game.PromoCodeRedemption": "fas fa-check-circle",
@@ -183,7 +206,44 @@ FAILURE_CREATE_TIMEOUT = int(os.environ.get("FAILURE_CREATE_TIMEOUT", "10"))
 FAILURE_DELETE_URL = os.environ.get("FAILURE_DELETE_URL", "https://stakanonline.ru/outages/delete")
 FAILURE_DELETE_SECRET = os.environ.get("FAILURE_DELETE_SECRET", FAILURE_CREATE_SECRET)
 FAILURE_DELETE_TIMEOUT = int(os.environ.get("FAILURE_DELETE_TIMEOUT", "10"))
+FAILURE_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("FAILURE_OUTBOX_MAX_ATTEMPTS", "10"))
+FAILURE_OUTBOX_RETRY_BASE_SECONDS = float(os.environ.get("FAILURE_OUTBOX_RETRY_BASE_SECONDS", "5"))
+FAILURE_OUTBOX_RETRY_MAX_SECONDS = float(os.environ.get("FAILURE_OUTBOX_RETRY_MAX_SECONDS", "600"))
 
 LEGAL_CHECK_URL = os.environ.get("LEGAL_CHECK_URL", "https://stakanonline.ru/check-legal")
 LEGAL_CHECK_SECRET = os.environ.get("LEGAL_CHECK_SECRET", TELEGRAM_CHECK_SECRET)
 LEGAL_CHECK_TIMEOUT = int(os.environ.get("LEGAL_CHECK_TIMEOUT", "10"))
+
+RANK_INDEX_SYNC_SECONDS = float(os.environ.get("RANK_INDEX_SYNC_SECONDS", "2"))
+RANK_INDEX_SYNC_OVERLAP_SECONDS = float(os.environ.get("RANK_INDEX_SYNC_OVERLAP_SECONDS", "5"))
+RANK_INDEX_REBUILD_SECONDS = float(os.environ.get("RANK_INDEX_REBUILD_SECONDS", "300"))
+LEADERBOARD_DELTA_MAX_AGE_SECONDS = float(
+    os.environ.get("LEADERBOARD_DELTA_MAX_AGE_SECONDS", "600")
+)
+SCORE_HISTOGRAM_FLUSH_SECONDS = float(os.environ.get("SCORE_HISTOGRAM_FLUSH_SECONDS", "1"))
+
+LEADERBOARD_STREAM_TICK_SECONDS = float(os.environ.get("LEADERBOARD_STREAM_TICK_SECONDS", "1"))
+LEADERBOARD_STREAM_TOP = int(os.environ.get("LEADERBOARD_STREAM_TOP", "10"))
+LEADERBOARD_STREAM_HEARTBEAT_SECONDS = float(
+    os.environ.get("LEADERBOARD_STREAM_HEARTBEAT_SECONDS", "15")
+)
+LEADERBOARD_STREAM_MAX_SECONDS = float(os.environ.get("LEADERBOARD_STREAM_MAX_SECONDS", "300"))
+LEADERBOARD_STREAM_TOKEN_SECONDS = int(os.environ.get("LEADERBOARD_STREAM_TOKEN_SECONDS", "60"))
+
+FAILURE_SCHEDULE_TTL_SECONDS = float(os.environ.get("FAILURE_SCHEDULE_TTL_SECONDS", "30"))
+FAILURE_SKETCH_SYNC_SECONDS = float(os.environ.get("FAILURE_SKETCH_SYNC_SECONDS", "10"))
+FAILURE_ACTIVE_WINDOW_SECONDS = float(os.environ.get("FAILURE_ACTIVE_WINDOW_SECONDS", "300"))
+FAILURE_SKETCH_CACHE_SIZE = int(os.environ.get("FAILURE_SKETCH_CACHE_SIZE", "256"))
+FAILURE_RUN_GRACE_SECONDS = float(os.environ.get("FAILURE_RUN_GRACE_SECONDS", "60"))
+FAILURE_RUN_TOKEN_REQUIRED = os.environ.get("FAILURE_RUN_TOKEN_REQUIRED", "0") == "1"
+FAILURE_SCORE_WRITE_BEHIND = os.environ.get("FAILURE_SCORE_WRITE_BEHIND", "0") == "1"
+FAILURE_SCORE_FLUSH_SECONDS = float(os.environ.get("FAILURE_SCORE_FLUSH_SECONDS", "0.25"))
+FAILURE_SCORE_BUFFER_MAX = int(os.environ.get("FAILURE_SCORE_BUFFER_MAX", "1000"))
+FAILURE_REPLAY_MAX_TAPS_PER_SECOND = int(os.environ.get("FAILURE_REPLAY_MAX_TAPS_PER_SECOND", "20"))
+FAILURE_REPLAY_TOLERANCE_MS = float(os.environ.get("FAILURE_REPLAY_TOLERANCE_MS", "250"))
+FAILURE_REPLAY_AUTO_BAN = os.environ.get("FAILURE_REPLAY_AUTO_BAN", "0") == "1"
+FAILURE_DELETE_MAX_LIVE_SCORES = int(os.environ.get("FAILURE_DELETE_MAX_LIVE_SCORES", "10000"))
+FAILURE_START_MAX_CONCURRENT = int(os.environ.get("FAILURE_START_MAX_CONCURRENT", "8"))
+FAILURE_START_RETRY_MS = float(os.environ.get("FAILURE_START_RETRY_MS", "500"))
+FAILURE_START_RETRY_MAX_MS = float(os.environ.get("FAILURE_START_RETRY_MAX_MS", "5000"))
+FAILURE_START_TICKET_TTL_SECONDS = float(os.environ.get("FAILURE_START_TICKET_TTL_SECONDS", "60"))
@@ -7,7 +7,9 @@ from xml.etree import ElementTree
 from xml.sax.saxutils import escape
 
 from django import forms
+from django.conf import settings
 from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
@@ -26,12 +28,21 @@ from .models import (
     Failure,
     FailureBan,
     FailureBonusPurchase,
+    FailurePrizePayout,
+    FailurePrizeTier,
+    FailureRun,
+    FailureStanding,
+    FailureWebhookEvent,
+    FailureWebhookStatus,
     PromoCode,
     PromoCodeRedemption,
     ReferralProgramConfig,
     QuizQuestion,
     RuleCategory,
     ScoreEntry,
+    ScoreEntryArchive,
+    Season,
+    SeasonScore,
     SimulationConfig,
     SimulationRewardClaim,
     Task,
@@ -39,6 +50,12 @@ from .models import (
     UserProfile,
 )
 from .models import generate_promo_code
+from .services import (
+    ban_profiles_in_failure,
+    pay_failure_prizes,
+    profiles_to_ban,
+    standings_are_final,
+)
 
 # --- Типы только для mypy ---
 if TYPE_CHECKING:
@@ -104,6 +121,57 @@ class PromoCodeGenerateForm(forms.Form):
     )
 
 
+def _split_identifiers(value: str) -> list[str]:
+    return [item for item in re.split(r"[\s,;]+", value) if item]
+
+
+class FailureBulkBanForm(forms.Form):
+    failure = forms.ModelChoiceField(
+        queryset=Failure.objects.order_by("-start_time", "-id"), label="Сбой"
+    )
+    usernames = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 6}),
+        label="Логины",
+        help_text="Через пробел, запятую или с новой строки.",
+    )
+    telegram_ids = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 6}),
+        label="Telegram ID",
+        help_text="Через пробел, запятую или с новой строки.",
+    )
+    min_points = forms.IntegerField(
+        required=False,
+        min_value=1,
+        label="Очков не меньше",
+        help_text="Забанить всех участников сбоя с таким результатом и выше.",
+    )
+    reason = forms.CharField(
+        required=False, max_length=255, initial="Массовый бан", label="Причина бана"
+    )
+
+    def clean_usernames(self) -> list[str]:
+        return _split_identifiers(self.cleaned_data["usernames"])
+
+    def clean_telegram_ids(self) -> list[int]:
+        values = _split_identifiers(self.cleaned_data["telegram_ids"])
+        invalid = [value for value in values if not value.isdigit()]
+        if invalid:
+            raise forms.ValidationError(f"Не похоже на Telegram ID: {', '.join(invalid[:10])}")
+        return [int(value) for value in values]
+
+    def clean(self):
+        cleaned = super().clean()
+        if not (
+            cleaned.get("usernames")
+            or cleaned.get("telegram_ids")
+            or cleaned.get("min_points") is not None
+        ):
+            raise forms.ValidationError("Укажите логины, Telegram ID или порог очков.")
+        return cleaned
+
+
 _COLUMN_RE = re.compile(r"([A-Z]+)([0-9]+)")
 _EXCEL_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
 
@@ -270,7 +338,7 @@ class UserProfileAdmin(UserProfileAdminBase):
     list_filter = ("legal_accepted", "is_banned")
 
     # ДОБАВИЛИ referral_code в readonly
-    readonly_fields = ("created_at", "updated_at", "referral_code")
+    readonly_fields = ("created_at", "updated_at", "referral_code", "referrals_count")
 
     fieldsets = (
         (
@@ -286,10 +354,20 @@ class UserProfileAdmin(UserProfileAdminBase):
                 )
             },
         ),
-        ("Реферальная программа", {"fields": ("referral_code", "referred_by")}),
+        ("Реферальная программа", {"fields": ("referral_code", "referred_by", "referrals_count")}),
         ("Служебное", {"fields": ("created_at", "updated_at"), "classes": ("collapse",)}),
     )
 
+    def save_model(self, request: HttpRequest, obj: UserProfile, form, change: bool) -> None:
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+        # только изменённые поля: баланс и referrals_count меняются UPDATE ... F()
+        # параллельно с правкой, и значение из формы их бы затёрло
+        fields = {field.name for field in obj._meta.concrete_fields}
+        changed = [name for name in form.changed_data if name in fields]
+        obj.save(update_fields=[*changed, "updated_at"])
+
 
 @admin.register(FailureBan)
 class FailureBanAdmin(admin.ModelAdmin):
@@ -297,6 +375,60 @@ class FailureBanAdmin(admin.ModelAdmin):
     search_fields = ("profile__user__username", "failure__name", "reason")
     list_filter = ("failure",)
     readonly_fields = ("created_at", "updated_at")
+    change_list_template = "admin/game/failureban/change_list.html"
+
+    def get_urls(self):  # type: ignore[override]
+        urls = super().get_urls()
+        custom = [
+            path(
+                "bulk/",
+                self.admin_site.admin_view(self.bulk_ban_view),
+                name="game_failureban_bulk",
+            ),
+        ]
+        return custom + urls
+
+    def bulk_ban_view(self, request: HttpRequest) -> HttpResponse:
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+        )
+
+        if request.method == "POST":
+            form = FailureBulkBanForm(request.POST)
+            if form.is_valid():
+                failure = form.cleaned_data["failure"]
+                profile_ids, unknown = profiles_to_ban(
+                    failure,
+                    usernames=form.cleaned_data["usernames"],
+                    telegram_ids=form.cleaned_data["telegram_ids"],
+                    min_points=form.cleaned_data["min_points"],
+                )
+                result = ban_profiles_in_failure(
+                    failure, profile_ids, reason=form.cleaned_data["reason"]
+                )
+                messages.success(
+                    request,
+                    f"{failure.name}: найдено игроков {result.matched}, новых банов "
+                    f"{result.created}, исключено результатов {result.scores_banned}.",
+                )
+                if unknown:
+                    preview = ", ".join(unknown[:20])
+                    more = f" и ещё {len(unknown) - 20}" if len(unknown) > 20 else ""
+                    messages.warning(request, f"Не найдены: {preview}{more}")
+                return redirect("..")
+
+            context["form"] = form
+        else:
+            context["form"] = FailureBulkBanForm()
+
+        return TemplateResponse(
+            request,
+            "admin/game/failureban/bulk_ban.html",
+            context,
+        )
 
 @admin.register(Task)
 class TaskAdmin(TaskAdminBase):
@@ -507,6 +639,44 @@ class SimulationRewardClaimAdmin(SimulationRewardClaimAdminBase):
     readonly_fields = ("created_at", "updated_at")
 
 
+class FailurePrizeTierFormSet(forms.BaseInlineFormSet):
+    def clean(self) -> None:
+        super().clean()
+        ranges = sorted(
+            (form.cleaned_data["position_from"], form.cleaned_data["position_to"])
+            for form in self.forms
+            if form.cleaned_data
+            and not form.cleaned_data.get("DELETE")
+            and form.cleaned_data.get("position_from")
+            and form.cleaned_data.get("position_to")
+        )
+        for (_, previous_to), (position_from, _) in zip(ranges, ranges[1:]):
+            if position_from <= previous_to:
+                raise forms.ValidationError(
+                    f"Диапазоны мест пересекаются: место {position_from} попадает в два приза."
+                )
+
+
+class FailurePrizeTierInline(admin.TabularInline):
+    model = FailurePrizeTier
+    formset = FailurePrizeTierFormSet
+    fields = ("position_from", "position_to", "amount")
+    extra = 0
+
+    # после выплаты таблица призов фиксируется вместе с журналом выплат
+    def _paid(self, obj) -> bool:
+        return bool(obj and obj.prizes_paid_at)
+
+    def has_add_permission(self, request: HttpRequest, obj=None) -> bool:
+        return not self._paid(obj) and super().has_add_permission(request, obj)
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return not self._paid(obj) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request: HttpRequest, obj=None) -> bool:
+        return not self._paid(obj) and super().has_delete_permission(request, obj)
+
+
 @admin.register(Failure)
 class FailureAdmin(FailureAdminBase):
     list_display = (
@@ -521,11 +691,20 @@ class FailureAdmin(FailureAdminBase):
         "bombs_max_count",
         "created_at",
     )
-    list_filter = ("start_time", "end_time", "shop_enabled")
+    list_filter = ("start_time", "end_time", "shop_enabled", "season")
     search_fields = ("name",)
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = (
+        "created_at",
+        "updated_at",
+        "standings_frozen_at",
+        "standings_stale_at",
+        "scores_archived_at",
+        "prizes_paid_at",
+    )
+    inlines = (FailurePrizeTierInline,)
+    actions = ("pay_prizes",)
     fieldsets = (
-        (None, {"fields": ("name", "reward", "start_time", "end_time")}),
+        (None, {"fields": ("name", "reward", "start_time", "end_time", "season")}),
         (
             "Параметры игры",
             {
@@ -552,16 +731,279 @@ class FailureAdmin(FailureAdminBase):
             },
         ),
         ("Главный приз", {"fields": ("main_prize_title", "main_prize_image")}),
-        ("Служебное", {"fields": ("created_at", "updated_at"), "classes": ("collapse",)}),
+        (
+            "Служебное",
+            {
+                "fields": (
+                    "standings_frozen_at",
+                    "standings_stale_at",
+                    "scores_archived_at",
+                    "prizes_paid_at",
+                    "created_at",
+                    "updated_at",
+                ),
+                "classes": ("collapse",),
+            },
+        ),
+    )
+
+    # удаление сбоя обнуляет failure у всех его очков одним UPDATE; большие
+    # сбои сначала переносятся в архив командой archive_failure_scores
+    def _too_many_live_scores(self, failure_ids) -> list[int]:
+        limit = int(getattr(settings, "FAILURE_DELETE_MAX_LIVE_SCORES", 10000))
+        return [
+            row["failure_id"]
+            for row in ScoreEntry.objects.filter(failure_id__in=failure_ids)
+            .values("failure_id")
+            .annotate(total=Count("id"))
+            .filter(total__gt=limit)
+        ]
+
+    def _archive_first(self, request: HttpRequest, failure_ids: list[int]) -> None:
+        ids = " ".join(f"--failure {failure_id}" for failure_id in failure_ids)
+        self.message_user(
+            request,
+            "Слишком много очков для удаления сбоя в запросе админки. "
+            f"Сначала перенесите их в архив: manage.py archive_failure_scores {ids}",
+            level=messages.ERROR,
+        )
+
+    def delete_view(self, request: HttpRequest, object_id, extra_context=None):
+        if str(object_id).isdigit():
+            blocked = self._too_many_live_scores([int(object_id)])
+            if blocked:
+                self._archive_first(request, blocked)
+                return redirect("admin:game_failure_change", object_id)
+        return super().delete_view(request, object_id, extra_context)
+
+    def delete_queryset(self, request: HttpRequest, queryset) -> None:
+        blocked = self._too_many_live_scores(list(queryset.values_list("pk", flat=True)))
+        if blocked:
+            self._archive_first(request, blocked)
+            queryset = queryset.exclude(pk__in=blocked)
+        super().delete_queryset(request, queryset)
+
+    @admin.action(description="Выплатить призы")
+    def pay_prizes(self, request: HttpRequest, queryset) -> None:
+        now = timezone.now()
+        for failure in queryset.order_by("end_time", "id"):
+            if not failure.prizes_paid_at and not standings_are_final(failure, now):
+                self.message_user(
+                    request,
+                    f"{failure.name}: забеги ещё идут, итоги не окончательные",
+                    messages.WARNING,
+                )
+                continue
+            result = pay_failure_prizes(failure)
+            if result.already_paid:
+                self.message_user(
+                    request, f"{failure.name}: призы уже выплачены", messages.WARNING
+                )
+                continue
+            self.message_user(
+                request,
+                f"{failure.name}: выплачено {result.total} монет, победителей {result.winners}",
+                messages.SUCCESS,
+            )
+
+
+@admin.register(Season)
+class SeasonAdmin(admin.ModelAdmin):
+    list_display = ("name", "start_time", "end_time", "created_at")
+    search_fields = ("name",)
+    readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(SeasonScore)
+class SeasonScoreAdmin(admin.ModelAdmin):
+    list_display = ("season", "profile", "points", "failures_played", "best_rank", "earned_at")
+    list_filter = ("season",)
+    search_fields = ("profile__user__username",)
+    ordering = ("season", "-points", "earned_at")
+    readonly_fields = (
+        "season",
+        "profile",
+        "points",
+        "failures_played",
+        "best_rank",
+        "earned_at",
+        "created_at",
+        "updated_at",
+    )
+
+    # суммы ведутся сервисом seasons, правка — через recompute_season_scores
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+
+@admin.register(FailureStanding)
+class FailureStandingAdmin(admin.ModelAdmin):
+    list_display = ("failure", "position", "profile", "points", "earned_at")
+    list_filter = ("failure",)
+    search_fields = ("profile__user__username", "failure__name")
+    ordering = ("failure", "position")
+    readonly_fields = (
+        "failure",
+        "position",
+        "profile",
+        "points",
+        "earned_at",
+        "created_at",
+        "updated_at",
     )
 
+    # итоги пересчитываются только сервисом freeze_standings
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
 
 @admin.register(FailureBonusPurchase)
 class FailureBonusPurchaseAdmin(FailureBonusPurchaseAdminBase):
     list_display = ("profile", "failure", "bonus_type", "created_at")
     list_filter = ("bonus_type", "failure")
     search_fields = ("profile__user__username", "failure__name")
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("profile", "failure", "bonus_type", "created_at", "updated_at")
+
+    # архив покупок до токенов забегов: бонусы теперь хранятся в FailureRun.bonuses
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+
+@admin.register(FailureRun)
+class FailureRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "profile",
+        "failure",
+        "status",
+        "bonus_count",
+        "points",
+        "replay_status",
+        "replay_flags",
+        "expires_at",
+        "created_at",
+    )
+    list_filter = ("status", "replay_status", "failure")
+    search_fields = ("profile__user__username", "failure__name", "token")
+    readonly_fields = (
+        "token",
+        "profile",
+        "failure",
+        "status",
+        "bonuses",
+        "bonus_count",
+        "expires_at",
+        "finished_at",
+        "points",
+        "duration_seconds",
+        "replay_status",
+        "replay_flags",
+        "replay",
+        "created_at",
+        "updated_at",
+    )
+
+    # забеги открываются и закрываются только API сбоя
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+
+@admin.register(ScoreEntryArchive)
+class ScoreEntryArchiveAdmin(admin.ModelAdmin):
+    list_display = ("profile", "failure_id", "points", "earned_at", "is_banned", "archived_at")
+    list_filter = ("is_banned",)
+    search_fields = ("profile__user__username", "failure_id")
+    readonly_fields = (
+        "id",
+        "profile",
+        "failure",
+        "points",
+        "duration_seconds",
+        "earned_at",
+        "is_banned",
+        "archived_at",
+        "created_at",
+        "updated_at",
+    )
+
+    # строки попадают сюда только из ScoreEntry командой archive_failure_scores
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+
+@admin.register(FailurePrizePayout)
+class FailurePrizePayoutAdmin(admin.ModelAdmin):
+    list_display = ("failure", "position", "profile", "amount", "balance_after", "created_at")
+    list_filter = ("failure",)
+    search_fields = ("profile__user__username",)
+    ordering = ("failure", "position")
+    list_select_related = ("failure", "profile__user")
+    readonly_fields = (
+        "failure",
+        "profile",
+        "position",
+        "amount",
+        "balance_after",
+        "created_at",
+        "updated_at",
+    )
+
+    # журнал пишет только pay_failure_prizes вместе с начислением
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+    def has_delete_permission(self, request: HttpRequest, obj=None) -> bool:
+        return False
+
+
+@admin.register(FailureWebhookEvent)
+class FailureWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("kind", "failure_id", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "kind")
+    search_fields = ("failure_id",)
+    readonly_fields = (
+        "kind",
+        "failure_id",
+        "payload",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "last_error",
+        "sent_at",
+        "created_at",
+        "updated_at",
+    )
+    actions = ("retry_now",)
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    @admin.action(description="Отправить повторно")
+    def retry_now(self, request: HttpRequest, queryset) -> None:
+        updated = queryset.exclude(status=FailureWebhookStatus.SENT).update(
+            status=FailureWebhookStatus.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        self.message_user(request, f"Поставлено в очередь: {updated}", messages.SUCCESS)
 
 
 @admin.register(AdvertisementButton)
@@ -704,10 +1146,30 @@ class ScoreEntryAdmin(ScoreEntryAdminBase):
         "points",
         "duration_seconds",
         "earned_at",
+        "is_banned",
     )
-    list_filter = ("failure",)
+    list_filter = ("failure", "is_banned")
     search_fields = ("profile__user__username",)
-    readonly_fields = ("earned_at", "created_at", "updated_at")
+    readonly_fields = ("earned_at", "is_banned", "created_at", "updated_at")
+    actions = ("ban_in_failure",)
+
+    @admin.action(description="Забанить в сбое")
+    def ban_in_failure(self, request: HttpRequest, queryset) -> None:
+        by_failure: dict[int, set[int]] = {}
+        for failure_id, profile_id in queryset.filter(failure__isnull=False).values_list(
+            "failure_id", "profile_id"
+        ):
+            by_failure.setdefault(failure_id, set()).add(profile_id)
+        for failure in Failure.objects.filter(pk__in=by_failure).order_by("id"):
+            result = ban_profiles_in_failure(
+                failure, by_failure[failure.pk], reason="Массовый бан из списка результатов"
+            )
+            self.message_user(
+                request,
+                f"{failure.name}: новых банов {result.created}, "
+                f"исключено результатов {result.scores_banned}",
+                messages.SUCCESS,
+            )
 
 
 @admin.register(AdsgramBlock)
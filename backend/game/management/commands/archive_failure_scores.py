@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from game.management.periodic import add_interval_argument, run_periodically
+from game.models import Failure
+from game.services import (
+    ARCHIVE_BATCH_SIZE,
+    archivable_failures,
+    archive_failure_scores,
+    standings_are_final,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит очки давно завершённых сбоев из таблицы очков в архив пачками "
+        "(итоги фиксируются заранее). Живая таблица остаётся маленькой, а удаление "
+        "сбоя больше не обновляет миллионы строк."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=30,
+            help="Переносить сбои, завершившиеся больше N дней назад",
+        )
+        parser.add_argument(
+            "--failure",
+            type=int,
+            action="append",
+            help="ID завершённого сбоя (можно несколько); --older-than-days не учитывается",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+            help="Строк за одну транзакцию",
+        )
+        add_interval_argument(parser)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        if options["older_than_days"] < 0:
+            raise CommandError("--older-than-days не может быть отрицательным")
+        run_periodically(options["interval"], lambda: self._archive(options, batch_size))
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+    def _archive(self, options: dict, batch_size: int) -> None:
+        now = timezone.now()
+        if options["failure"]:
+            failures = list(
+                Failure.objects.filter(pk__in=options["failure"], end_time__lte=now).order_by("id")
+            )
+            missing = set(options["failure"]) - {failure.pk for failure in failures}
+            if missing:
+                ids = ", ".join(f"#{pk}" for pk in sorted(missing))
+                raise CommandError(f"Завершённые сбои не найдены: {ids}")
+        else:
+            days = options["older_than_days"]
+            failures = list(archivable_failures(now - timedelta(days=days)))
+
+        pending = [failure for failure in failures if not standings_are_final(failure, now)]
+        if pending and options["failure"]:
+            ids = ", ".join(f"#{failure.pk}" for failure in pending)
+            raise CommandError(f"Забеги сбоев ещё идут, итоги не окончательные: {ids}")
+        failures = [failure for failure in failures if failure not in pending]
+
+        total = 0
+        for failure in failures:
+            moved = archive_failure_scores(failure, batch_size=batch_size)
+            total += moved
+            self.stdout.write(f"{failure.name} (#{failure.pk}): {moved} строк в архиве")
+        self.stdout.write(f"Перенесено строк: {total}")
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.models import Failure
+from game.services import BULK_BAN_BATCH_SIZE, ban_profiles_in_failure, profiles_to_ban
+
+
+class Command(BaseCommand):
+    help = (
+        "Банит игроков в сбое одной пачкой: по логинам, Telegram ID (в том числе из "
+        "файла) или всех с результатом от порога. Итоги, гистограмма, сезон и кэш "
+        "лидерборда сбоя пересчитываются один раз."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--failure", type=int, required=True, help="ID сбоя")
+        parser.add_argument(
+            "--username", action="append", default=[], help="Логин (можно несколько)"
+        )
+        parser.add_argument(
+            "--telegram-id",
+            type=int,
+            action="append",
+            default=[],
+            help="Telegram ID (можно несколько)",
+        )
+        parser.add_argument(
+            "--usernames-file", help="Файл с логинами через пробел, запятую или с новой строки"
+        )
+        parser.add_argument(
+            "--telegram-ids-file",
+            help="Файл с Telegram ID через пробел, запятую или с новой строки",
+        )
+        parser.add_argument(
+            "--min-points",
+            type=int,
+            help="Забанить всех участников сбоя с таким результатом и выше",
+        )
+        parser.add_argument("--reason", default="Массовый бан", help="Причина бана")
+        parser.add_argument(
+            "--batch-size", type=int, default=BULK_BAN_BATCH_SIZE, help="Банов за один INSERT"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Только показать, сколько игроков найдено"
+        )
+
+    def _read(self, path: str | None) -> list[str]:
+        if not path:
+            return []
+        try:
+            with open(path, encoding="utf-8") as source:
+                return [item for item in re.split(r"[\s,;]+", source.read()) if item]
+        except OSError as exc:
+            raise CommandError(f"Не удалось прочитать {path}: {exc}") from exc
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        if options["min_points"] is not None and options["min_points"] < 1:
+            raise CommandError("--min-points должен быть больше нуля")
+        failure = Failure.objects.filter(pk=options["failure"]).first()
+        if failure is None:
+            raise CommandError(f"Сбой #{options['failure']} не найден")
+
+        usernames = options["username"] + self._read(options["usernames_file"])
+        raw_ids = self._read(options["telegram_ids_file"])
+        invalid = [value for value in raw_ids if not value.isdigit()]
+        if invalid:
+            raise CommandError(f"Не похоже на Telegram ID: {', '.join(invalid[:10])}")
+        telegram_ids = options["telegram_id"] + [int(value) for value in raw_ids]
+        if not (usernames or telegram_ids or options["min_points"] is not None):
+            raise CommandError("Укажите логины, Telegram ID или --min-points")
+
+        profile_ids, unknown = profiles_to_ban(
+            failure,
+            usernames=usernames,
+            telegram_ids=telegram_ids,
+            min_points=options["min_points"],
+        )
+        if unknown:
+            self.stdout.write(f"Не найдены ({len(unknown)}): {', '.join(unknown[:50])}")
+        if options["dry_run"]:
+            self.stdout.write(
+                f"{failure.name} (#{failure.pk}): найдено игроков {len(profile_ids)}"
+            )
+            self.stdout.write(self.style.SUCCESS("Готово"))
+            return
+
+        result = ban_profiles_in_failure(
+            failure, profile_ids, reason=options["reason"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            f"{failure.name} (#{failure.pk}): найдено игроков {result.matched}, "
+            f"новых банов {result.created}, исключено результатов {result.scores_banned}"
+        )
+        self.stdout.write(self.style.SUCCESS("Готово"))
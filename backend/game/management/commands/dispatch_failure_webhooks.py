@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from game.services import (
+    dispatch_failure_events,
+    failure_outbox_backlog,
+    purge_failure_events,
+    webhook_session,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Отправляет уведомления о создании и удалении сбоев из очереди "
+        "(transactional outbox): пачками, с повторными попытками и отчётом о бэклоге."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Отправить всё, что уже пора, и выйти"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Событий за одну пачку"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Пауза в секундах, когда отправлять нечего",
+        )
+        parser.add_argument(
+            "--stats-every",
+            type=float,
+            default=60.0,
+            help="Как часто печатать бэклог (секунды)",
+        )
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=7,
+            help="Сколько дней хранить отправленные события (0 — не удалять)",
+        )
+        parser.add_argument(
+            "--stats", action="store_true", help="Только напечатать бэклог и выйти"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size должно быть больше нуля")
+        if options["interval"] <= 0:
+            raise CommandError("--interval должно быть больше нуля")
+        if options["keep_days"] < 0:
+            raise CommandError("--keep-days не может быть отрицательным")
+
+        if options["stats"]:
+            self._report_backlog()
+            return
+
+        session = webhook_session()
+        reported_at = 0.0
+        try:
+            while True:
+                close_old_connections()
+                stats = dispatch_failure_events(batch_size=batch_size, session=session)
+                if stats.claimed:
+                    self.stdout.write(
+                        f"пачка: {stats.claimed}, отправлено {stats.sent}, "
+                        f"склеено {stats.skipped}, повтор {stats.retried}, "
+                        f"не доставлено {stats.failed}"
+                    )
+                if time.monotonic() - reported_at >= options["stats_every"]:
+                    reported_at = time.monotonic()
+                    self._report_backlog()
+                    if options["keep_days"]:
+                        purge_failure_events(timezone.now() - timedelta(days=options["keep_days"]))
+                if stats.claimed < batch_size:
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            session.close()
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+    def _report_backlog(self) -> None:
+        backlog = failure_outbox_backlog()
+        self.stdout.write(
+            f"в очереди {backlog['pending']} (пора отправить {backlog['due']}), "
+            f"старейшее ждёт {backlog['oldest_pending_seconds']} с, "
+            f"не доставлено {backlog['failed']}"
+        )
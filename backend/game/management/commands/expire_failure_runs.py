@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from game.management.periodic import add_interval_argument, run_periodically
+from game.services import expire_runs, purge_runs
+
+
+class Command(BaseCommand):
+    help = (
+        "Помечает брошенные забеги сбоев просроченными и удаляет старые "
+        "завершённые и просроченные забеги."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--purge-days",
+            type=int,
+            default=7,
+            help="Удалять закрытые забеги старше стольких дней (0 — не удалять)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Строк за один запрос"
+        )
+        add_interval_argument(parser)
+
+    def handle(self, *args, **options):
+        purge_days = options["purge_days"]
+        batch_size = options["batch_size"]
+        if purge_days < 0:
+            raise CommandError("--purge-days не может быть отрицательным")
+        if batch_size < 1:
+            raise CommandError("--batch-size должно быть больше нуля")
+
+        run_periodically(options["interval"], lambda: self._expire(purge_days, batch_size))
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+    def _expire(self, purge_days: int, batch_size: int) -> None:
+        now = timezone.now()
+        expired = expire_runs(now, batch_size=batch_size)
+        self.stdout.write(f"Просрочено забегов: {expired}")
+        if purge_days:
+            purged = purge_runs(now - timedelta(days=purge_days), batch_size=batch_size)
+            self.stdout.write(f"Удалено забегов: {purged}")
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import multiprocessing
+import random
+import statistics
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from game.models import Failure, ScoreEntry, UserProfile
+from game.management.loadtest import add_database_argument, use_load_database
+from game.services import flush_failure_scores, suppress_failure_events
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочная проверка старта и завершения сбоя: одновременные игроки "
+        "на одном сбое, пропускная способность и ожидание блокировок для разного "
+        "числа процессов. Забеги одного игрока идут из разных процессов одновременно; "
+        "после прогона проверяется, что у каждого игрока одна запись с лучшим "
+        "принятым результатом (нет потерянных обновлений). "
+        "Создаёт временный сбой и игроков и удаляет их после прогона."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            default="1,2,4,8,16",
+            help="Число параллельных процессов через запятую (по умолчанию 1,2,4,8,16)",
+        )
+        parser.add_argument(
+            "--players",
+            type=int,
+            default=200,
+            help="Игроков на каждый прогон",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=1,
+            help="Забегов (пар start + complete) на игрока, из разных процессов",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять созданные сбой и игроков"
+        )
+        add_database_argument(parser)
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(value) for value in options["workers"].split(",") if value.strip()]
+        except ValueError as exc:
+            raise CommandError("--workers: ожидается список чисел через запятую") from exc
+        if not levels or min(levels) < 1:
+            raise CommandError("--workers: нужен хотя бы один поток")
+        players = options["players"]
+        runs = options["runs"]
+        if players < 1 or runs < 1:
+            raise CommandError("--players и --runs должны быть больше нуля")
+
+        use_load_database(options["database"])
+
+        now = timezone.now()
+        tag = uuid.uuid4().hex[:8]
+        # временный сбой не должен уходить вебхуком на внешний сервис
+        with suppress_failure_events():
+            failure = Failure.objects.create(
+                name=f"Нагрузочный тест {tag}",
+                start_time=now - timedelta(minutes=1),
+                end_time=now + timedelta(hours=1),
+            )
+        users: list = []
+        lost = 0
+        try:
+            for level in levels:
+                batch = self._create_players(tag, level, players)
+                users.extend(batch)
+                elapsed, latencies, errors, waits, completed = self._run(
+                    failure, batch, level, runs
+                )
+                lost += self._lost_updates(failure, completed)
+                self._report(level, elapsed, latencies, errors, waits, lost)
+        finally:
+            if options["keep"]:
+                self.stdout.write(f"Сбой #{failure.pk} и игроки bench_{tag}_* оставлены")
+            else:
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+                with suppress_failure_events():
+                    failure.delete()
+        if lost:
+            raise CommandError(f"Потеряно обновлений лучшего результата: {lost}")
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+    def _create_players(self, tag: str, level: int, count: int) -> list:
+        users = User.objects.bulk_create(
+            User(username=f"bench_{tag}_{level}_{index}") for index in range(count)
+        )
+        UserProfile.objects.bulk_create(
+            UserProfile(user=user, balance=1_000_000) for user in users
+        )
+        return list(User.objects.filter(pk__in=[user.pk for user in users]))
+
+    def _run(self, failure: Failure, users: list, workers: int, runs: int):
+        # забеги одного игрока раскладываются по разным процессам и идут
+        # примерно в одно время: так проверяется гонка за лучший результат
+        plays: list[list[tuple[int, int]]] = [[] for _ in range(workers)]
+        for run in range(runs):
+            for index, user in enumerate(users):
+                plays[(index + run) % workers].append((user.pk, random.randint(1, 10_000)))
+
+        # отдельные процессы, как воркеры gunicorn: потоки упёрлись бы в GIL
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        connections.close_all()
+        processes = [
+            context.Process(target=_play, args=(failure.pk, plays[i], results))
+            for i in range(workers)
+        ]
+        waits: list[int] = []
+        done = threading.Event()
+        sampler = threading.Thread(target=_sample_lock_waits, args=(done, waits))
+        began = time.perf_counter()
+        for process in processes:
+            process.start()
+        sampler.start()
+        latencies: list[float] = []
+        errors: list[str] = []
+        completed: list[tuple[int, int]] = []
+        for _ in processes:
+            chunk_latencies, chunk_errors, chunk_completed = results.get()
+            latencies.extend(chunk_latencies)
+            errors.extend(chunk_errors)
+            completed.extend(chunk_completed)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - began
+        done.set()
+        sampler.join()
+        return elapsed, latencies, errors, waits, completed
+
+    def _lost_updates(self, failure: Failure, completed: list[tuple[int, int]]) -> int:
+        """Players whose stored score is not the best of their accepted completions."""
+        expected: dict[int, int] = {}
+        for user_id, points in completed:
+            expected[user_id] = max(points, expected.get(user_id, 0))
+        stored: dict[int, list[int]] = {}
+        for user_id, points in ScoreEntry.objects.filter(
+            failure=failure, profile__user_id__in=list(expected)
+        ).values_list("profile__user_id", "points"):
+            stored.setdefault(user_id, []).append(points)
+        return sum(
+            1 for user_id, points in expected.items() if stored.get(user_id) != [points]
+        )
+
+    def _report(
+        self,
+        workers: int,
+        elapsed: float,
+        latencies: list[float],
+        errors: list[str],
+        waits: list[int],
+        lost: int,
+    ):
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0
+        self.stdout.write(
+            f"процессов={workers:>3}  игроков/с={len(latencies) / elapsed:8.1f}  "
+            f"p50={statistics.median(latencies) * 1000 if latencies else 0:7.1f} мс  "
+            f"p95={p95 * 1000:7.1f} мс  "
+            f"ждут блокировку={statistics.mean(waits) if waits else 0:5.2f} "
+            f"(макс. {max(waits, default=0)})  ошибок={len(errors)}  потеряно={lost}"
+        )
+
+
+def _sample_lock_waits(done: threading.Event, waits: list[int]) -> None:
+    """Сколько соединений в среднем стоит в очереди на блокировку строки во время прогона."""
+    try:
+        with connection.cursor() as cursor:
+            while not done.wait(0.02):
+                cursor.execute(
+                    "SELECT COUNT(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                )
+                waits.append(cursor.fetchone()[0])
+    finally:
+        connection.close()
+
+
+def _play(failure_id: int, plays: list[tuple[int, int]], results) -> None:
+    """Один процесс-воркер: последовательно start + complete для каждой пары (игрок, очки)."""
+    latencies: list[float] = []
+    errors: list[str] = []
+    completed: list[tuple[int, int]] = []
+    try:
+        users = User.objects.in_bulk({user_id for user_id, _ in plays})
+        for user_id, points in plays:
+            user = users[user_id]
+            client = APIClient()
+            client.force_authenticate(user)
+            started = time.perf_counter()
+            start = client.post("/api/failures/start/", {"failure_id": failure_id}, format="json")
+            complete = client.post(
+                "/api/failures/complete/",
+                {
+                    "failure_id": failure_id,
+                    "points": points,
+                    "duration_seconds": 60,
+                    "run_token": start.data.get("run_token"),
+                },
+                format="json",
+            )
+            latencies.append(time.perf_counter() - started)
+            errors.extend(
+                str(response.status_code)
+                for response in (start, complete)
+                if response.status_code != 200
+            )
+            if complete.status_code == 200:
+                completed.append((user_id, points))
+    finally:
+        # дочерний процесс multiprocessing выходит без atexit — буфер сбрасываем сами
+        flush_failure_scores()
+        connections.close_all()
+        results.put((latencies, errors, completed))
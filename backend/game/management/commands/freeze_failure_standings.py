@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from game.management.periodic import add_interval_argument, run_periodically
+from game.models import Failure
+from game.services import freeze_standings, standings_are_final
+
+
+class Command(BaseCommand):
+    help = (
+        "Фиксирует итоговые места завершённых сбоев в таблице итогов, когда истекли "
+        "все забеги (окончание + длительность + FAILURE_RUN_GRACE_SECONDS), и "
+        "пересобирает итоги, помеченные поздними результатами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--failure", type=int, help="ID сбоя; по умолчанию все завершённые")
+        parser.add_argument(
+            "--force", action="store_true", help="Пересчитать уже зафиксированные итоги"
+        )
+        add_interval_argument(parser)
+
+    def handle(self, *args, **options):
+        failure_id = options.get("failure")
+        force = options["force"]
+        run_periodically(options["interval"], lambda: self._freeze(failure_id, force))
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+    def _freeze(self, failure_id: int | None, force: bool) -> None:
+        now = timezone.now()
+
+        qs = Failure.objects.filter(end_time__lte=now).order_by("id")
+        if failure_id is not None:
+            qs = qs.filter(pk=failure_id)
+            if not qs.exists():
+                raise CommandError(f"Завершённый сбой #{failure_id} не найден")
+        elif not force:
+            qs = qs.filter(
+                Q(standings_frozen_at__isnull=True) | Q(standings_stale_at__isnull=False)
+            )
+
+        for failure in qs:
+            if not standings_are_final(failure, now):
+                if failure_id is not None:
+                    self.stdout.write(f"{failure.name} (#{failure.pk}): забеги ещё идут")
+                continue
+            rows = freeze_standings(failure, force=force or bool(failure.standings_stale_at))
+            self.stdout.write(f"{failure.name} (#{failure.pk}): {rows} мест")
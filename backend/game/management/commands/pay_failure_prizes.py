@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from game.models import Failure
+from game.services import (
+    PAYOUT_BATCH_SIZE,
+    failure_prizes,
+    pay_failure_prizes,
+    prize_table,
+    standings_are_final,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Выплачивает призы завершённых сбоев по таблице призов (без неё — награда за "
+        "первое место) по зафиксированным итогам. Каждый сбой выплачивается один раз."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--failure",
+            type=int,
+            action="append",
+            help="ID завершённого сбоя (можно несколько); по умолчанию все невыплаченные",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=PAYOUT_BATCH_SIZE,
+            help="Победителей за один запрос",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать выплаты, ничего не начисляя",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+
+        qs = Failure.objects.filter(end_time__lte=timezone.now()).order_by("end_time", "id")
+        if options["failure"]:
+            failures = list(qs.filter(pk__in=options["failure"]))
+            missing = set(options["failure"]) - {failure.pk for failure in failures}
+            if missing:
+                ids = ", ".join(f"#{pk}" for pk in sorted(missing))
+                raise CommandError(f"Завершённые сбои не найдены: {ids}")
+        else:
+            failures = list(qs.filter(prizes_paid_at__isnull=True))
+
+        now = timezone.now()
+        for failure in failures:
+            label = f"{failure.name} (#{failure.pk})"
+            if not failure.prizes_paid_at and not standings_are_final(failure, now):
+                self.stdout.write(f"{label}: забеги ещё идут, итоги не окончательные")
+                continue
+            if options["dry_run"]:
+                if failure.prizes_paid_at:
+                    self.stdout.write(f"{label}: призы уже выплачены")
+                elif not failure.standings_frozen_at:
+                    self.stdout.write(f"{label}: итоги ещё не зафиксированы")
+                else:
+                    prizes = failure_prizes(failure, prize_table(failure))
+                    total = sum(amount for _, _, amount in prizes)
+                    self.stdout.write(f"{label}: {total} монет, победителей {len(prizes)}")
+                continue
+
+            result = pay_failure_prizes(failure, batch_size=batch_size)
+            if result.already_paid:
+                self.stdout.write(f"{label}: призы уже выплачены")
+            else:
+                self.stdout.write(
+                    f"{label}: выплачено {result.total} монет, победителей {result.winners}"
+                )
+        self.stdout.write(self.style.SUCCESS("Готово"))
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.models import Failure
+from game.services import rebuild_score_histogram
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает гистограммы очков сбоев по таблице результатов."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--failure", type=int, help="ID сбоя; по умолчанию все сбои")
+
+    def handle(self, *args, **options):
+        failure_id = options.get("failure")
+
+        qs = Failure.objects.order_by("id")
+        if failure_id is not None:
+            qs = qs.filter(pk=failure_id)
+            if not qs.exists():
+                raise CommandError(f"Сбой #{failure_id} не найден")
+
+        for failure in qs:
+            total = rebuild_score_histogram(failure)
+            self.stdout.write(f"{failure.name} (#{failure.pk}): {total} участников")
+        self.stdout.write(self.style.SUCCESS("Готово"))
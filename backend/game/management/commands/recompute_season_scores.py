@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.models import Season
+from game.services import recompute_season
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сезонные суммы очков по таблице результатов."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--season", type=int, help="ID сезона; по умолчанию все сезоны")
+
+    def handle(self, *args, **options):
+        season_id = options.get("season")
+
+        qs = Season.objects.order_by("id")
+        if season_id is not None:
+            qs = qs.filter(pk=season_id)
+            if not qs.exists():
+                raise CommandError(f"Сезон #{season_id} не найден")
+
+        for season in qs:
+            rows = recompute_season(season)
+            self.stdout.write(f"{season.name} (#{season.pk}): {rows} игроков")
+        self.stdout.write(self.style.SUCCESS("Готово"))
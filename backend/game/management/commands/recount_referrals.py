@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from game.services import recount_referrals
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики приглашённых пользователей по полю referred_by."
+
+    def handle(self, *args, **options):
+        fixed = recount_referrals()
+        self.stdout.write(f"Исправлено профилей: {fixed}")
+        self.stdout.write(self.style.SUCCESS("Готово"))
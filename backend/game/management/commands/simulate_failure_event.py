@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import json
+import math
+import multiprocessing
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from game.models import Failure, FailureBonusType, UserProfile
+from game.management.loadtest import add_database_argument, use_load_database
+from game.services import flush_failure_scores, suppress_failure_events
+
+User = get_user_model()
+
+ENDPOINTS = ("start", "bonus", "complete", "leaderboard")
+_APP_PREFIX = "load:"
+_SAMPLE_SECONDS = 0.01
+
+
+class Command(BaseCommand):
+    help = (
+        "Имитация выхода сбоя в эфир: создаёт сбой и N игроков, затем в нескольких "
+        "процессах гоняет start → бонусы → complete → лидерборд через настоящие "
+        "DRF-представления на локальной базе. Печатает JSON-отчёт: p50/p95/p99, "
+        "запросы к базе, ожидание блокировок и взаимные блокировки по эндпоинтам."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=2000, help="Сколько игроков создать")
+        parser.add_argument("--workers", type=int, default=8, help="Параллельных процессов")
+        parser.add_argument(
+            "--bonuses", type=int, default=2, help="Бонусов на забег (не больше лимита сбоя)"
+        )
+        parser.add_argument(
+            "--output", default="-", help="Файл для JSON-отчёта (по умолчанию stdout)"
+        )
+        parser.add_argument(
+            "--max-p95-ms",
+            type=float,
+            default=None,
+            help="Завершиться ошибкой, если p95 любого эндпоинта выше (для CI)",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять созданные сбой и игроков"
+        )
+        add_database_argument(parser)
+
+    def handle(self, *args, **options):
+        players = options["players"]
+        workers = options["workers"]
+        bonuses = options["bonuses"]
+        if players < 1 or workers < 1:
+            raise CommandError("--players и --workers должны быть больше нуля")
+        if not 0 <= bonuses <= len(FailureBonusType.values):
+            raise CommandError(f"--bonuses: от 0 до {len(FailureBonusType.values)}")
+
+        use_load_database(options["database"])
+
+        tag = uuid.uuid4().hex[:8]
+        failure = self._seed_failure(tag, bonuses)
+        users: list[int] = []
+        try:
+            users = self._seed_players(tag, players)
+            report = self._run(failure, users, workers, bonuses)
+        finally:
+            if options["keep"]:
+                self.stderr.write(f"Сбой #{failure.pk} и игроки load_{tag}_* оставлены")
+            else:
+                User.objects.filter(pk__in=users).delete()
+                with suppress_failure_events():
+                    failure.delete()
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"] == "-":
+            self.stdout.write(payload)
+        else:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(payload + "\n")
+            self.stderr.write(f"Отчёт записан в {options['output']}")
+
+        problems = [
+            f"{name}: ошибок {stats['errors']}, взаимных блокировок {stats['deadlocks']}"
+            for name, stats in report["endpoints"].items()
+            if stats["errors"] or stats["deadlocks"]
+        ]
+        limit = options["max_p95_ms"]
+        if limit is not None:
+            problems += [
+                f"{name}: p95 {stats['p95_ms']} мс > {limit} мс"
+                for name, stats in report["endpoints"].items()
+                if stats["p95_ms"] > limit
+            ]
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stderr.write(self.style.SUCCESS("Готово"))
+
+    def _seed_failure(self, tag: str, bonuses: int) -> Failure:
+        now = timezone.now()
+        # временный сбой не должен уходить вебхуком на внешний сервис
+        with suppress_failure_events():
+            return Failure.objects.create(
+                name=f"Имитация эфира {tag}",
+                start_time=now - timedelta(seconds=1),
+                end_time=now + timedelta(hours=1),
+                duration_seconds=60,
+                max_bonuses_per_run=max(bonuses, 1),
+                **{f"bonus_price_{bonus}": 1 for bonus in FailureBonusType.values[:bonuses]},
+            )
+
+    def _seed_players(self, tag: str, count: int) -> list[int]:
+        created = User.objects.bulk_create(
+            (User(username=f"load_{tag}_{index}") for index in range(count)), batch_size=1000
+        )
+        ids = [user.pk for user in created]
+        UserProfile.objects.bulk_create(
+            (UserProfile(user_id=user_id, balance=1_000_000) for user_id in ids), batch_size=1000
+        )
+        return ids
+
+    def _run(self, failure: Failure, user_ids: list[int], workers: int, bonuses: int) -> dict:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+            )
+            deadlocks_before = cursor.fetchone()[0]
+
+        # отдельные процессы, как воркеры gunicorn: потоки упёрлись бы в GIL
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        connections.close_all()
+        processes = [
+            context.Process(
+                target=_play, args=(failure.pk, user_ids[i::workers], bonuses, results)
+            )
+            for i in range(workers)
+        ]
+        lock_samples: dict[str, int] = defaultdict(int)
+        waiting: list[int] = []
+        done = threading.Event()
+        sampler = threading.Thread(
+            target=_sample_lock_waits, args=(done, lock_samples, waiting), daemon=True
+        )
+
+        began = time.perf_counter()
+        for process in processes:
+            process.start()
+        sampler.start()
+        samples: dict[str, list[tuple[float, int, str | None]]] = defaultdict(list)
+        for _ in processes:
+            for name, chunk in results.get().items():
+                samples[name].extend(chunk)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - began
+        done.set()
+        sampler.join()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+            )
+            deadlocks_after = cursor.fetchone()[0]
+
+        return {
+            "failure_id": failure.pk,
+            "players": len(user_ids),
+            "workers": workers,
+            "bonuses_per_run": bonuses,
+            "elapsed_seconds": round(elapsed, 3),
+            "players_per_second": round(len(user_ids) / elapsed, 1) if elapsed else 0.0,
+            "endpoints": {
+                name: _endpoint_stats(samples.get(name, []), lock_samples.get(name, 0))
+                for name in ENDPOINTS
+            },
+            "lock_waits": {
+                "sample_interval_ms": _SAMPLE_SECONDS * 1000,
+                "mean_waiting": round(statistics.mean(waiting), 3) if waiting else 0.0,
+                "max_waiting": max(waiting, default=0),
+            },
+            "database_deadlocks": deadlocks_after - deadlocks_before,
+        }
+
+
+def _percentile(sorted_values: list[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(share * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _endpoint_stats(samples: list[tuple[float, int, str | None]], lock_samples: int) -> dict:
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    outcomes = [outcome for _, _, outcome in samples]
+
+    def ms(value: float) -> float:
+        return round(value * 1000, 2)
+
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for outcome in outcomes if outcome is not None),
+        "deadlocks": sum(1 for outcome in outcomes if outcome == "deadlock"),
+        "p50_ms": ms(_percentile(latencies, 0.50)),
+        "p95_ms": ms(_percentile(latencies, 0.95)),
+        "p99_ms": ms(_percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "queries_mean": round(statistics.mean(queries), 2) if queries else 0.0,
+        "queries_max": max(queries, default=0),
+        # оценка: сколько раз соединение эндпоинта застали в ожидании блокировки
+        "lock_wait_seconds": round(lock_samples * _SAMPLE_SECONDS, 3),
+    }
+
+
+def _sample_lock_waits(
+    done: threading.Event, per_endpoint: dict[str, int], waiting: list[int]
+) -> None:
+    try:
+        with connection.cursor() as cursor:
+            while not done.wait(_SAMPLE_SECONDS):
+                cursor.execute(
+                    "SELECT application_name, COUNT(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND wait_event_type = 'Lock' "
+                    "GROUP BY application_name"
+                )
+                total = 0
+                for application_name, count in cursor.fetchall():
+                    total += count
+                    if application_name.startswith(_APP_PREFIX):
+                        per_endpoint[application_name[len(_APP_PREFIX):]] += count
+                waiting.append(total)
+    finally:
+        connection.close()
+
+
+def _is_deadlock(exc: BaseException) -> bool:
+    while exc is not None:
+        if getattr(exc, "sqlstate", None) == "40P01":
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def _call(client: APIClient, name: str, method: str, path: str, data=None):
+    """Один запрос с замером: (ответ или None, (задержка, запросов к базе, ошибка))."""
+    with connection.cursor() as cursor:
+        # по имени приложения семплер относит ожидание блокировки к эндпоинту
+        cursor.execute("SELECT set_config('application_name', %s, false)", [_APP_PREFIX + name])
+    response = None
+    outcome: str | None = None
+    started = time.perf_counter()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            if method == "get":
+                response = client.get(path, data)
+            else:
+                response = client.post(path, data, format="json")
+    except DatabaseError as exc:
+        outcome = "deadlock" if _is_deadlock(exc) else type(exc).__name__
+        connection.close()
+    latency = time.perf_counter() - started
+    if response is not None and response.status_code >= 400:
+        outcome = str(response.status_code)
+    return response, (latency, len(queries.captured_queries), outcome)
+
+
+def _play(failure_id: int, user_ids: list[int], bonuses: int, results) -> None:
+    """Один процесс-воркер: полный забег за каждого своего игрока по очереди."""
+    samples: dict[str, list] = defaultdict(list)
+    bonus_types = FailureBonusType.values[:bonuses]
+    try:
+        for user in User.objects.filter(pk__in=user_ids):
+            client = APIClient()
+            client.force_authenticate(user)
+
+            start, sample = _call(
+                client, "start", "post", "/api/failures/start/", {"failure_id": failure_id}
+            )
+            samples["start"].append(sample)
+            token = start.data.get("run_token") if start is not None else None
+            if token is None:
+                continue
+
+            for bonus_type in bonus_types:
+                _, sample = _call(
+                    client,
+                    "bonus",
+                    "post",
+                    "/api/failures/bonus-purchase/",
+                    {"failure_id": failure_id, "bonus_type": bonus_type, "run_token": token},
+                )
+                samples["bonus"].append(sample)
+
+            _, sample = _call(
+                client,
+                "complete",
+                "post",
+                "/api/failures/complete/",
+                {
+                    "failure_id": failure_id,
+                    "points": random.randint(1, 10_000),
+                    "duration_seconds": 60,
+                    "run_token": token,
+                },
+            )
+            samples["complete"].append(sample)
+
+            _, sample = _call(
+                client,
+                "leaderboard",
+                "get",
+                "/api/leaderboard/",
+                {"failure": failure_id, "limit": 20, "around": 3},
+            )
+            samples["leaderboard"].append(sample)
+    except Exception as exc:  # pragma: no cover - harness failure path
+        print(f"[load] worker failed: {exc!r}", file=sys.stderr)
+    finally:
+        # дочерний процесс multiprocessing выходит без atexit — буфер сбрасываем сами
+        flush_failure_scores()
+        connections.close_all()
+        results.put(dict(samples))
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from game.services import BONUS_BITS, ReplayRun, verify_pending_replays, verify_replays
+from game.services.replays import MULTIPLIER_WINDOW_MS, MULTIPLIERS
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверяет записи завершённых забегов сбоев пачками вне запросов: пересчитывает "
+        "очки по событиям, темп, бомбы и купленные бонусы; подозрительные забеги "
+        "помечает и при --auto-ban банит в сбое."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Проверить всё, что в очереди, и выйти"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=2000, help="Забегов за одну пачку"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Пауза в секундах, когда очередь пуста",
+        )
+        parser.add_argument(
+            "--auto-ban",
+            action="store_true",
+            default=None,
+            help="Банить владельцев подозрительных забегов (по умолчанию FAILURE_REPLAY_AUTO_BAN)",
+        )
+        parser.add_argument(
+            "--benchmark",
+            type=int,
+            metavar="N",
+            help="Не трогая базу, проверить N синтетических забегов и напечатать скорость",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size должно быть больше нуля")
+        if options["interval"] <= 0:
+            raise CommandError("--interval должно быть больше нуля")
+
+        if options["benchmark"] is not None:
+            if options["benchmark"] < 1:
+                raise CommandError("--benchmark должно быть больше нуля")
+            self._benchmark(options["benchmark"], batch_size)
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                stats = verify_pending_replays(batch_size=batch_size, auto_ban=options["auto_ban"])
+                if stats.checked:
+                    self.stdout.write(
+                        f"пачка: {stats.checked}, чисто {stats.passed}, "
+                        f"подозрительно {stats.flagged}, забанено {stats.banned}"
+                    )
+                if stats.checked < batch_size:
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+    def _benchmark(self, count: int, batch_size: int) -> None:
+        rng = random.Random(count)
+        runs = [_synthetic_run(rng, index, cheat=index % 10 == 0) for index in range(count)]
+        cheaters = {run.run_id for run in runs if run.run_id % 10 == 0}
+
+        max_taps = int(getattr(settings, "FAILURE_REPLAY_MAX_TAPS_PER_SECOND", 20))
+        tolerance = float(getattr(settings, "FAILURE_REPLAY_TOLERANCE_MS", 250))
+        started = time.perf_counter()
+        verdicts = []
+        for offset in range(0, count, batch_size):
+            verdicts += verify_replays(
+                runs[offset : offset + batch_size],
+                max_taps_per_second=max_taps,
+                tolerance_ms=tolerance,
+            )
+        elapsed = time.perf_counter() - started
+
+        flagged = {run.run_id for run, flags in zip(runs, verdicts) if flags}
+        events = sum(len(run.replay["pops"]) for run in runs)
+        self.stdout.write(
+            f"забегов: {count} (событий {events}), пачка {batch_size}: {elapsed:.3f} с, "
+            f"{count / elapsed:,.0f} забегов/с на ядро"
+        )
+        self.stdout.write(
+            f"поймано {len(flagged & cheaters)} из {len(cheaters)} подделок, "
+            f"ложных срабатываний {len(flagged - cheaters)}"
+        )
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+
+def _synthetic_run(rng: random.Random, run_id: int, *, cheat: bool) -> ReplayRun:
+    """A 60-second run played by the client rules; a cheat claims extra points."""
+    duration = 60
+    pops: list[int] = []
+    moment = rng.randrange(0, 2000)
+    while moment < duration * 1000:
+        pops.append(moment)
+        moment += rng.randrange(120, 600)
+    bombs = sorted(rng.randrange(1500, duration * 1000 - 2500) for _ in range(rng.randint(0, 2)))
+    bought = rng.sample(sorted(MULTIPLIERS), rng.randint(0, 2))
+    bonuses = {bonus: rng.randrange(0, duration * 1000) for bonus in bought}
+
+    points = 0
+    events = sorted([(moment, 1) for moment in pops] + [(moment, 0) for moment in bombs])
+    for moment, is_pop in events:
+        if not is_pop:
+            points = 0
+            continue
+        active = [(start, bonus) for bonus, start in bonuses.items() if start <= moment]
+        start, bonus = max(active, default=(None, None))
+        points += MULTIPLIERS[bonus] if bonus and moment < start + MULTIPLIER_WINDOW_MS else 1
+    if cheat:
+        points += rng.randint(50, 500)
+
+    return ReplayRun(
+        run_id=run_id,
+        points=points,
+        duration_seconds=duration,
+        failure_duration_seconds=duration,
+        bombs_max=2,
+        bonuses=sum(BONUS_BITS[bonus] for bonus in bought),
+        replay={"pops": pops, "bombs": bombs, "bonuses": bonuses},
+    )
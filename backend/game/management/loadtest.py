@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def add_database_argument(parser) -> None:
+    parser.add_argument(
+        "--database",
+        default=DEFAULT_DB_ALIAS,
+        help="Алиас базы из DATABASES для прогона (например, loadtest); "
+        "с базой default команда работает только при DEBUG",
+    )
+
+
+def use_load_database(alias: str) -> None:
+    """Refuse to load the working database; run everything against ``alias``.
+
+    The commands drive the real views, which always use the default
+    connection, so the default alias is pointed at ``alias`` for the process
+    (forked workers inherit it).
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        if not settings.DEBUG:
+            raise CommandError(
+                "Нагрузочный прогон создаёт активный сбой, видимый всем клиентам этой базы: "
+                "запускайте с DEBUG=1 или с --database на отдельную базу"
+            )
+        return
+    if alias not in connections.databases:
+        raise CommandError(f"База {alias!r} не описана в DATABASES")
+    connections.close_all()
+    connections.databases[DEFAULT_DB_ALIAS] = dict(connections.databases[alias])
+    connections[DEFAULT_DB_ALIAS].settings_dict = connections.databases[DEFAULT_DB_ALIAS]
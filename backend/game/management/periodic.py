@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from django.core.management.base import CommandError
+from django.db import close_old_connections
+
+
+def add_interval_argument(parser) -> None:
+    parser.add_argument(
+        "--interval",
+        type=float,
+        help="Повторять каждые N секунд, не выходя (сервис в docker-compose); "
+        "без него — один проход, как из cron",
+    )
+
+
+def run_periodically(interval: float | None, job: Callable[[], None]) -> None:
+    """Run ``job`` once, or every ``interval`` seconds until interrupted."""
+    if interval is None:
+        job()
+        return
+    if interval <= 0:
+        raise CommandError("--interval должно быть больше нуля")
+    try:
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            job()
+            time.sleep(max(interval - (time.monotonic() - started), 0))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0006_userprofile_telegram_id"),
+        ("game", "0018_userprofile_ban_failureban"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="scoreentry",
+            index=models.Index(
+                fields=["failure", "-points", "earned_at", "id"],
+                name="score_failure_rank_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0019_scoreentry_rank_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="scoreentry",
+            index=models.Index(
+                fields=["failure", "updated_at"],
+                name="score_failure_updated_idx",
+            ),
+        ),
+    ]
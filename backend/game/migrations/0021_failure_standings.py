@@ -0,0 +1,83 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0020_scoreentry_failure_updated_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="failure",
+            name="standings_frozen_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Итоги зафиксированы",
+            ),
+        ),
+        migrations.CreateModel(
+            name="FailureStanding",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("position", models.PositiveIntegerField(verbose_name="Место")),
+                ("points", models.PositiveIntegerField(default=0, verbose_name="Очки")),
+                ("earned_at", models.DateTimeField(verbose_name="Дата получения")),
+                (
+                    "failure",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="standings",
+                        to="game.failure",
+                        verbose_name="Сбой",
+                    ),
+                ),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="failure_standings",
+                        to="game.userprofile",
+                        verbose_name="Профиль",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Итоговое место",
+                "verbose_name_plural": "Итоги сбоев",
+                "db_table": "итоги_сбоев",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="failurestanding",
+            constraint=models.UniqueConstraint(
+                fields=("failure", "position"),
+                name="uniq_standing_position",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="failurestanding",
+            constraint=models.UniqueConstraint(
+                fields=("failure", "profile"),
+                name="uniq_standing_profile",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0021_failure_standings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="failure",
+            name="standings_version",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="Версия таблицы лидеров",
+            ),
+        ),
+    ]
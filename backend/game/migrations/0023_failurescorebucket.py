@@ -0,0 +1,56 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0022_failure_standings_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FailureScoreBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("bucket", models.PositiveSmallIntegerField(verbose_name="Корзина")),
+                ("count", models.PositiveIntegerField(default=0, verbose_name="Участников")),
+                (
+                    "failure",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="score_buckets",
+                        to="game.failure",
+                        verbose_name="Сбой",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Корзина гистограммы",
+                "verbose_name_plural": "Гистограммы сбоев",
+                "db_table": "гистограммы_сбоев",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="failurescorebucket",
+            constraint=models.UniqueConstraint(
+                fields=("failure", "bucket"),
+                name="uniq_failure_score_bucket",
+            ),
+        ),
+    ]
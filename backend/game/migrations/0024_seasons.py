@@ -0,0 +1,125 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0023_failurescorebucket"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Season",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("name", models.CharField(max_length=255, verbose_name="Название сезона")),
+                ("start_time", models.DateTimeField(verbose_name="Начало сезона")),
+                ("end_time", models.DateTimeField(verbose_name="Окончание сезона")),
+            ],
+            options={
+                "verbose_name": "Сезон",
+                "verbose_name_plural": "Сезоны",
+                "db_table": "сезоны",
+                "ordering": ("-start_time",),
+            },
+        ),
+        migrations.AddField(
+            model_name="failure",
+            name="season",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="После смены сезона у прошедшего сбоя запустите recompute_season_scores.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="failures",
+                to="game.season",
+                verbose_name="Сезон",
+            ),
+        ),
+        migrations.CreateModel(
+            name="SeasonScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("points", models.BigIntegerField(default=0, verbose_name="Очки за сезон")),
+                (
+                    "failures_played",
+                    models.PositiveIntegerField(default=0, verbose_name="Сыграно сбоев"),
+                ),
+                (
+                    "best_rank",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="Лучшее место в сбое"
+                    ),
+                ),
+                ("earned_at", models.DateTimeField(verbose_name="Последнее улучшение")),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="season_scores",
+                        to="game.userprofile",
+                        verbose_name="Профиль",
+                    ),
+                ),
+                (
+                    "season",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scores",
+                        to="game.season",
+                        verbose_name="Сезон",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Очки сезона",
+                "verbose_name_plural": "Очки сезонов",
+                "db_table": "очки_сезонов",
+                "indexes": [
+                    models.Index(
+                        fields=["season", "-points", "earned_at", "id"],
+                        name="season_score_rank_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="seasonscore",
+            constraint=models.UniqueConstraint(
+                fields=("season", "profile"),
+                name="uniq_season_score_profile",
+            ),
+        ),
+    ]
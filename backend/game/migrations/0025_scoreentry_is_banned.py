@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Q
+
+
+def backfill_ban_flags(apps, schema_editor):
+    ScoreEntry = apps.get_model("game", "ScoreEntry")
+    FailureBan = apps.get_model("game", "FailureBan")
+
+    failure_ban = FailureBan.objects.filter(
+        profile_id=OuterRef("profile_id"), failure_id=OuterRef("failure_id")
+    )
+    ScoreEntry.objects.filter(Q(profile__is_banned=True) | Exists(failure_ban)).update(
+        is_banned=True
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0024_seasons"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scoreentry",
+            name="is_banned",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                help_text="Бан в этом сбое или блокировка профиля; ведётся сигналами.",
+                verbose_name="Исключён из рейтинга",
+            ),
+        ),
+        migrations.RunPython(backfill_ban_flags, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="scoreentry",
+            name="score_failure_rank_idx",
+        ),
+        migrations.AddIndex(
+            model_name="scoreentry",
+            index=models.Index(
+                condition=models.Q(("is_banned", False), ("points__gt", 0)),
+                fields=["failure", "-points", "earned_at", "id"],
+                name="score_failure_ranked_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+TABLE_NAME = '"профили_пользователей"'
+
+# Колонка и FK созданы сырым SQL в 0005/0013, поэтому индекса, который Django
+# обычно строит для ForeignKey, в базе нет (в состоянии миграций он уже есть).
+CREATE_REFERRED_BY_INDEX_SQL = f"""
+CREATE INDEX IF NOT EXISTS userprofile_referred_by_idx
+ON {TABLE_NAME} (referred_by_id);
+"""
+
+DROP_REFERRED_BY_INDEX_SQL = """
+DROP INDEX IF EXISTS userprofile_referred_by_idx;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0025_scoreentry_is_banned"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_REFERRED_BY_INDEX_SQL, DROP_REFERRED_BY_INDEX_SQL),
+    ]
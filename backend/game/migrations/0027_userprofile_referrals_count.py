@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+TABLE_NAME = '"профили_пользователей"'
+
+BACKFILL_REFERRALS_COUNT_SQL = f"""
+UPDATE {TABLE_NAME} AS profile
+SET referrals_count = invited.total
+FROM (
+    SELECT referred_by_id, COUNT(*) AS total
+    FROM {TABLE_NAME}
+    WHERE referred_by_id IS NOT NULL
+    GROUP BY referred_by_id
+) AS invited
+WHERE profile.id = invited.referred_by_id;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0026_userprofile_referred_by_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="referrals_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Счётчик приглашённых; меняется вместе с referred_by приглашённого.",
+                verbose_name="Приглашено пользователей",
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_REFERRALS_COUNT_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name="userprofile",
+            index=models.Index(
+                condition=models.Q(("is_banned", False), ("referrals_count__gt", 0)),
+                fields=["-referrals_count", "id"],
+                name="profile_top_inviters_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0027_userprofile_referrals_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FailurePlayersSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("period", models.PositiveBigIntegerField(default=0, verbose_name="Период")),
+                ("registers", models.BinaryField(verbose_name="Регистры")),
+                (
+                    "failure",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="player_sketches",
+                        to="game.failure",
+                        verbose_name="Сбой",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Скетч участников сбоя",
+                "verbose_name_plural": "Скетчи участников сбоев",
+                "db_table": "скетчи_участников_сбоев",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="failureplayerssketch",
+            constraint=models.UniqueConstraint(
+                fields=("failure", "period"),
+                name="uniq_failure_players_sketch",
+            ),
+        ),
+    ]
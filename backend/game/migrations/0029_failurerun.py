@@ -0,0 +1,109 @@
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0028_failureplayerssketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FailureRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                (
+                    "token",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        unique=True,
+                        verbose_name="Токен забега",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("open", "Идёт"),
+                            ("completed", "Завершён"),
+                            ("expired", "Истёк"),
+                        ],
+                        default="open",
+                        max_length=16,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "bonuses",
+                    models.PositiveSmallIntegerField(default=0, verbose_name="Бонусы (маска)"),
+                ),
+                (
+                    "bonus_count",
+                    models.PositiveSmallIntegerField(default=0, verbose_name="Куплено бонусов"),
+                ),
+                ("expires_at", models.DateTimeField(verbose_name="Действует до")),
+                (
+                    "finished_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Завершён"),
+                ),
+                (
+                    "failure",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="runs",
+                        to="game.failure",
+                        verbose_name="Сбой",
+                    ),
+                ),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="failure_runs",
+                        to="game.userprofile",
+                        verbose_name="Профиль",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Забег сбоя",
+                "verbose_name_plural": "Забеги сбоев",
+                "db_table": "забеги_сбоев",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="failurerun",
+            index=models.Index(
+                condition=models.Q(("status", "open")),
+                fields=["profile", "failure", "-id"],
+                name="failure_run_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="failurerun",
+            index=models.Index(
+                condition=models.Q(("status", "open")),
+                fields=["expires_at"],
+                name="failure_run_expiry_idx",
+            ),
+        ),
+    ]
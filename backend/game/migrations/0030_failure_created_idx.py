@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0029_failurerun"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="failure",
+            index=models.Index(fields=["-created_at", "-id"], name="failure_created_idx"),
+        ),
+    ]
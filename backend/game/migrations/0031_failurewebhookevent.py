@@ -0,0 +1,88 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0030_failure_created_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FailureWebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("created", "Создан"), ("deleted", "Удалён")],
+                        max_length=16,
+                        verbose_name="Событие",
+                    ),
+                ),
+                ("failure_id", models.BigIntegerField(verbose_name="ID сбоя")),
+                ("payload", models.JSONField(default=dict, verbose_name="Данные")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает отправки"),
+                            ("sent", "Отправлено"),
+                            ("skipped", "Пропущено"),
+                            ("failed", "Не доставлено"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(default=0, verbose_name="Попыток"),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Следующая попытка",
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, default="", verbose_name="Последняя ошибка"),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Отправлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Уведомление о сбое",
+                "verbose_name_plural": "Уведомления о сбоях",
+                "db_table": "исходящие_события_сбоев",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "pending")),
+                        fields=["next_attempt_at", "id"],
+                        name="failure_webhook_due_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0031_failurewebhookevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="failure",
+            name="scores_archived_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Очки перенесены в архив",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ScoreEntryArchive",
+            fields=[
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("points", models.PositiveIntegerField(default=0, verbose_name="Очки")),
+                (
+                    "duration_seconds",
+                    models.PositiveIntegerField(default=0, verbose_name="Время (сек)"),
+                ),
+                ("earned_at", models.DateTimeField(verbose_name="Дата получения")),
+                (
+                    "is_banned",
+                    models.BooleanField(default=False, verbose_name="Исключён из рейтинга"),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Перенесено в архив"
+                    ),
+                ),
+                (
+                    "failure",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="archived_scores",
+                        to="game.failure",
+                        verbose_name="Сбой",
+                    ),
+                ),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_scores",
+                        to="game.userprofile",
+                        verbose_name="Профиль",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Очки в архиве",
+                "verbose_name_plural": "Архив очков",
+                "db_table": "архив_очков",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("profile", "failure"),
+                        name="uniq_archived_score_per_failure",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0032_scoreentryarchive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="failurerun",
+            name="points",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Заявленные очки"
+            ),
+        ),
+        migrations.AddField(
+            model_name="failurerun",
+            name="duration_seconds",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Заявленное время (сек)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="failurerun",
+            name="replay",
+            field=models.JSONField(
+                blank=True,
+                help_text="Моменты лопнутых капель, бомб и бонусов в мс от начала игры.",
+                null=True,
+                verbose_name="Запись забега",
+            ),
+        ),
+        migrations.AddField(
+            model_name="failurerun",
+            name="replay_status",
+            field=models.CharField(
+                choices=[
+                    ("none", "Не проверяется"),
+                    ("pending", "Ждёт проверки"),
+                    ("passed", "Проверен"),
+                    ("flagged", "Подозрительный"),
+                ],
+                default="none",
+                max_length=16,
+                verbose_name="Проверка",
+            ),
+        ),
+        migrations.AddField(
+            model_name="failurerun",
+            name="replay_flags",
+            field=models.CharField(
+                blank=True, default="", max_length=255, verbose_name="Нарушения"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="failurerun",
+            index=models.Index(
+                condition=models.Q(("replay_status", "pending")),
+                fields=["id"],
+                name="failure_run_replay_queue_idx",
+            ),
+        ),
+    ]
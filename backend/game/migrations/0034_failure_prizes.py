@@ -0,0 +1,128 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0033_failurerun_replay"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="failure",
+            name="prizes_paid_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Призы выплачены"
+            ),
+        ),
+        migrations.CreateModel(
+            name="FailurePrizeTier",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                (
+                    "position_from",
+                    models.PositiveIntegerField(
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="С места",
+                    ),
+                ),
+                (
+                    "position_to",
+                    models.PositiveIntegerField(
+                        validators=[django.core.validators.MinValueValidator(1)],
+                        verbose_name="По место",
+                    ),
+                ),
+                ("amount", models.PositiveIntegerField(verbose_name="Приз (монеты)")),
+                (
+                    "failure",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prize_tiers",
+                        to="game.failure",
+                        verbose_name="Сбой",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Приз за место",
+                "verbose_name_plural": "Призы за места",
+                "db_table": "призы_сбоев",
+                "ordering": ("position_from",),
+                "constraints": [
+                    models.CheckConstraint(
+                        check=models.Q(("position_from__gte", 1))
+                        & models.Q(("position_to__gte", models.F("position_from"))),
+                        name="prize_tier_positions_valid",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="FailurePrizePayout",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("position", models.PositiveIntegerField(verbose_name="Место")),
+                ("amount", models.PositiveIntegerField(verbose_name="Приз (монеты)")),
+                (
+                    "balance_after",
+                    models.PositiveIntegerField(verbose_name="Баланс после выплаты"),
+                ),
+                (
+                    "failure",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prize_payouts",
+                        to="game.failure",
+                        verbose_name="Сбой",
+                    ),
+                ),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="failure_prize_payouts",
+                        to="game.userprofile",
+                        verbose_name="Профиль",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Выплата приза",
+                "verbose_name_plural": "Выплаты призов",
+                "db_table": "выплаты_призов_сбоев",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("failure", "profile"), name="uniq_prize_payout_per_profile"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("game", "0034_failure_prizes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="failure",
+            name="standings_stale_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Итоги ждут пересчёта"
+            ),
+        ),
+    ]
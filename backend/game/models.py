@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import secrets
 import string
+import uuid
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -101,6 +102,12 @@ class UserProfile(TimestampedModel):
         related_name="referrals",
         verbose_name="Пригласивший пользователь",
     )
+    referrals_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Приглашено пользователей",
+        help_text="Счётчик приглашённых; меняется вместе с referred_by приглашённого.",
+    )
     daily_reward_streak = models.PositiveSmallIntegerField(
         default=0,
         validators=[MinValueValidator(0), MaxValueValidator(8)],
@@ -125,6 +132,13 @@ class UserProfile(TimestampedModel):
         db_table = "профили_пользователей"
         verbose_name = "Профиль пользователя"
         verbose_name_plural = "Профили пользователей"
+        indexes = [
+            models.Index(
+                fields=("-referrals_count", "id"),
+                name="profile_top_inviters_idx",
+                condition=models.Q(is_banned=False, referrals_count__gt=0),
+            ),
+        ]
 
     def __str__(self):
         return f"Профиль {self.user.username}"
@@ -494,6 +508,23 @@ class DailyRewardClaim(TimestampedModel):
 # Failures (Сбои)
 # ==============================
 
+class Season(TimestampedModel):
+    """Сезон объединяет несколько сбоев в общий рейтинг."""
+
+    name = models.CharField(max_length=255, verbose_name="Название сезона")
+    start_time = models.DateTimeField(verbose_name="Начало сезона")
+    end_time = models.DateTimeField(verbose_name="Окончание сезона")
+
+    class Meta:
+        db_table = "сезоны"
+        verbose_name = "Сезон"
+        verbose_name_plural = "Сезоны"
+        ordering = ("-start_time",)
+
+    def __str__(self):
+        return self.name
+
+
 class Failure(TimestampedModel):
     name = models.CharField(max_length=255, verbose_name="Название сбоя")
     reward = models.PositiveIntegerField(default=0, verbose_name="Награда (монеты)")
@@ -540,12 +571,54 @@ class Failure(TimestampedModel):
         help_text="Максимальный размер — 1500×1500px. Соотношение сторон любое.",
         validators=[validate_hd_image],
     )
+    standings_frozen_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Итоги зафиксированы",
+    )
+    standings_stale_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Итоги ждут пересчёта",
+    )
+    scores_archived_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Очки перенесены в архив",
+    )
+    prizes_paid_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Призы выплачены",
+    )
+    standings_version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Версия таблицы лидеров",
+    )
+    season = models.ForeignKey(
+        Season,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="failures",
+        verbose_name="Сезон",
+        help_text="После смены сезона у прошедшего сбоя запустите recompute_season_scores.",
+    )
 
 
     class Meta:
         db_table = "сбои"
         verbose_name = "Сбой"
         verbose_name_plural = "Сбои"
+        indexes = [
+            # keyset-пагинация списка сбоев (services.failures_page)
+            models.Index(fields=("-created_at", "-id"), name="failure_created_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -604,6 +677,12 @@ class FailureBonusType(models.TextChoices):
 
 
 class FailureBonusPurchase(TimestampedModel):
+    """Архив покупок бонусов до токенов забегов.
+
+    Бонусы теперь хранятся в ``FailureRun.bonuses``, сюда больше ничего не пишется;
+    таблица оставлена только для чтения, чтобы старые покупки были видны в админке.
+    """
+
     profile = models.ForeignKey(
         UserProfile,
         on_delete=models.CASCADE,
@@ -632,6 +711,153 @@ class FailureBonusPurchase(TimestampedModel):
         return f"{self.profile_id} → {self.failure_id}: {self.bonus_type}"
 
 
+class FailureRunStatus(models.TextChoices):
+    OPEN = "open", "Идёт"
+    COMPLETED = "completed", "Завершён"
+    EXPIRED = "expired", "Истёк"
+
+
+class FailureRunReplayStatus(models.TextChoices):
+    NONE = "none", "Не проверяется"
+    PENDING = "pending", "Ждёт проверки"
+    PASSED = "passed", "Проверен"
+    FLAGGED = "flagged", "Подозрительный"
+
+
+class FailureRun(TimestampedModel):
+    """Одна попытка прохождения сбоя: от старта до complete.
+
+    Купленные бонусы — битовая маска (services.runs.BONUS_BITS), поэтому
+    покупка и завершение — один условный UPDATE этой строки.
+    """
+
+    token = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name="Токен забега",
+    )
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="failure_runs",
+        verbose_name="Профиль",
+    )
+    failure = models.ForeignKey(
+        Failure,
+        on_delete=models.CASCADE,
+        related_name="runs",
+        verbose_name="Сбой",
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=FailureRunStatus.choices,
+        default=FailureRunStatus.OPEN,
+        verbose_name="Статус",
+    )
+    bonuses = models.PositiveSmallIntegerField(default=0, verbose_name="Бонусы (маска)")
+    bonus_count = models.PositiveSmallIntegerField(default=0, verbose_name="Куплено бонусов")
+    expires_at = models.DateTimeField(verbose_name="Действует до")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершён")
+    points = models.PositiveIntegerField(null=True, blank=True, verbose_name="Заявленные очки")
+    duration_seconds = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name="Заявленное время (сек)"
+    )
+    replay = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name="Запись забега",
+        help_text="Моменты лопнутых капель, бомб и бонусов в мс от начала игры.",
+    )
+    replay_status = models.CharField(
+        max_length=16,
+        choices=FailureRunReplayStatus.choices,
+        default=FailureRunReplayStatus.NONE,
+        verbose_name="Проверка",
+    )
+    replay_flags = models.CharField(
+        max_length=255, blank=True, default="", verbose_name="Нарушения"
+    )
+
+    class Meta:
+        db_table = "забеги_сбоев"
+        verbose_name = "Забег сбоя"
+        verbose_name_plural = "Забеги сбоев"
+        indexes = [
+            models.Index(
+                fields=("profile", "failure", "-id"),
+                name="failure_run_open_idx",
+                condition=models.Q(status="open"),
+            ),
+            models.Index(
+                fields=("expires_at",),
+                name="failure_run_expiry_idx",
+                condition=models.Q(status="open"),
+            ),
+            # очередь проверки записей (services.replays)
+            models.Index(
+                fields=("id",),
+                name="failure_run_replay_queue_idx",
+                condition=models.Q(replay_status="pending"),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.profile_id} → {self.failure_id}: {self.get_status_display()}"
+
+
+class FailureWebhookKind(models.TextChoices):
+    CREATED = "created", "Создан"
+    DELETED = "deleted", "Удалён"
+
+
+class FailureWebhookStatus(models.TextChoices):
+    PENDING = "pending", "Ожидает отправки"
+    SENT = "sent", "Отправлено"
+    SKIPPED = "skipped", "Пропущено"
+    FAILED = "failed", "Не доставлено"
+
+
+class FailureWebhookEvent(TimestampedModel):
+    """Исходящее уведомление о сбое (transactional outbox).
+
+    Пишется в транзакции изменения сбоя, отправляет команда
+    dispatch_failure_webhooks (services.outbox).
+    """
+
+    kind = models.CharField(
+        max_length=16, choices=FailureWebhookKind.choices, verbose_name="Событие"
+    )
+    # без FK: событие об удалении переживает сам сбой
+    failure_id = models.BigIntegerField(verbose_name="ID сбоя")
+    payload = models.JSONField(default=dict, verbose_name="Данные")
+    status = models.CharField(
+        max_length=16,
+        choices=FailureWebhookStatus.choices,
+        default=FailureWebhookStatus.PENDING,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, default="", verbose_name="Последняя ошибка")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    class Meta:
+        db_table = "исходящие_события_сбоев"
+        verbose_name = "Уведомление о сбое"
+        verbose_name_plural = "Уведомления о сбоях"
+        indexes = [
+            models.Index(
+                fields=("next_attempt_at", "id"),
+                name="failure_webhook_due_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} #{self.failure_id}: {self.get_status_display()}"
+
+
 # ==============================
 # Questions (Викторина)
 # ==============================
@@ -677,6 +903,12 @@ class ScoreEntry(TimestampedModel):
     points = models.PositiveIntegerField(default=0, verbose_name="Очки")
     duration_seconds = models.PositiveIntegerField(default=0, verbose_name="Время (сек)")
     earned_at = models.DateTimeField(default=timezone.now, verbose_name="Дата получения")
+    is_banned = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Исключён из рейтинга",
+        help_text="Бан в этом сбое или блокировка профиля; ведётся сигналами.",
+    )
 
     class Meta:
         db_table = "очки"
@@ -689,11 +921,282 @@ class ScoreEntry(TimestampedModel):
                 name="uniq_score_per_failure",
             )
         ]
+        indexes = [
+            # порядок совпадает с сортировкой лидерборда: keyset-пагинация и подсчёт позиции;
+            # частичный — в нём только участвующие в рейтинге строки
+            models.Index(
+                fields=("failure", "-points", "earned_at", "id"),
+                name="score_failure_ranked_idx",
+                condition=models.Q(is_banned=False, points__gt=0),
+            ),
+            # догоняющая синхронизация индекса рангов в воркерах
+            models.Index(
+                fields=("failure", "updated_at"),
+                name="score_failure_updated_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.profile.user.username}: {self.points} очков"
 
 
+class ScoreEntryArchive(TimestampedModel):
+    """Очки завершённых сбоев, перенесённые из ScoreEntry командой archive_failure_scores.
+
+    id сохраняется прежним, поэтому строки архива и живой таблицы сортируются
+    вместе. Связь со сбоем без ограничения в базе: удаление сбоя не трогает архив.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="archived_scores",
+        verbose_name="Профиль",
+    )
+    failure = models.ForeignKey(
+        Failure,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="archived_scores",
+        verbose_name="Сбой",
+    )
+    points = models.PositiveIntegerField(default=0, verbose_name="Очки")
+    duration_seconds = models.PositiveIntegerField(default=0, verbose_name="Время (сек)")
+    earned_at = models.DateTimeField(verbose_name="Дата получения")
+    is_banned = models.BooleanField(default=False, verbose_name="Исключён из рейтинга")
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Перенесено в архив")
+
+    class Meta:
+        db_table = "архив_очков"
+        verbose_name = "Очки в архиве"
+        verbose_name_plural = "Архив очков"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("profile", "failure"),
+                name="uniq_archived_score_per_failure",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.failure_id}: {self.profile_id} {self.points} очков"
+
+
+class FailureStanding(TimestampedModel):
+    """Итоговая таблица завершённого сбоя, строится один раз после end_time."""
+
+    failure = models.ForeignKey(
+        Failure,
+        on_delete=models.CASCADE,
+        related_name="standings",
+        verbose_name="Сбой",
+    )
+    position = models.PositiveIntegerField(verbose_name="Место")
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="failure_standings",
+        verbose_name="Профиль",
+    )
+    points = models.PositiveIntegerField(default=0, verbose_name="Очки")
+    earned_at = models.DateTimeField(verbose_name="Дата получения")
+
+    class Meta:
+        db_table = "итоги_сбоев"
+        verbose_name = "Итоговое место"
+        verbose_name_plural = "Итоги сбоев"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("failure", "position"),
+                name="uniq_standing_position",
+            ),
+            models.UniqueConstraint(
+                fields=("failure", "profile"),
+                name="uniq_standing_profile",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.failure_id}: #{self.position} {self.profile_id}"
+
+
+class FailurePrizeTier(TimestampedModel):
+    """Строка таблицы призов сбоя: места с position_from по position_to получают amount."""
+
+    failure = models.ForeignKey(
+        Failure,
+        on_delete=models.CASCADE,
+        related_name="prize_tiers",
+        verbose_name="Сбой",
+    )
+    position_from = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)], verbose_name="С места"
+    )
+    position_to = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)], verbose_name="По место"
+    )
+    amount = models.PositiveIntegerField(verbose_name="Приз (монеты)")
+
+    class Meta:
+        db_table = "призы_сбоев"
+        verbose_name = "Приз за место"
+        verbose_name_plural = "Призы за места"
+        ordering = ("position_from",)
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(position_from__gte=1)
+                & models.Q(position_to__gte=models.F("position_from")),
+                name="prize_tier_positions_valid",
+            ),
+        ]
+
+    def clean(self) -> None:
+        super().clean()
+        if self.position_from and self.position_to and self.position_to < self.position_from:
+            raise ValidationError({"position_to": "Не может быть меньше «С места»."})
+
+    def __str__(self) -> str:
+        return f"{self.position_from}–{self.position_to}: {self.amount}"
+
+
+class FailurePrizePayout(TimestampedModel):
+    """Выплата приза за место в сбое; одна на игрока и сбой."""
+
+    failure = models.ForeignKey(
+        Failure,
+        on_delete=models.CASCADE,
+        related_name="prize_payouts",
+        verbose_name="Сбой",
+    )
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="failure_prize_payouts",
+        verbose_name="Профиль",
+    )
+    position = models.PositiveIntegerField(verbose_name="Место")
+    amount = models.PositiveIntegerField(verbose_name="Приз (монеты)")
+    balance_after = models.PositiveIntegerField(verbose_name="Баланс после выплаты")
+
+    class Meta:
+        db_table = "выплаты_призов_сбоев"
+        verbose_name = "Выплата приза"
+        verbose_name_plural = "Выплаты призов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("failure", "profile"),
+                name="uniq_prize_payout_per_profile",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.failure_id}: #{self.position} {self.profile_id} +{self.amount}"
+
+
+class SeasonScore(TimestampedModel):
+    """Итог игрока за сезон, поддерживается дельтами при улучшении результатов.
+
+    Поля points/earned_at названы как у ScoreEntry, чтобы сезонная таблица
+    ранжировалась и листалась теми же функциями, что и таблица сбоя.
+    """
+
+    season = models.ForeignKey(
+        Season,
+        on_delete=models.CASCADE,
+        related_name="scores",
+        verbose_name="Сезон",
+    )
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="season_scores",
+        verbose_name="Профиль",
+    )
+    points = models.BigIntegerField(default=0, verbose_name="Очки за сезон")
+    failures_played = models.PositiveIntegerField(default=0, verbose_name="Сыграно сбоев")
+    best_rank = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name="Лучшее место в сбое"
+    )
+    earned_at = models.DateTimeField(verbose_name="Последнее улучшение")
+
+    class Meta:
+        db_table = "очки_сезонов"
+        verbose_name = "Очки сезона"
+        verbose_name_plural = "Очки сезонов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("season", "profile"),
+                name="uniq_season_score_profile",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=("season", "-points", "earned_at", "id"),
+                name="season_score_rank_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.season_id}: {self.profile_id} {self.points}"
+
+
+class FailurePlayersSketch(TimestampedModel):
+    """HyperLogLog-скетч участников сбоя (см. services.hll).
+
+    ``period = 0`` — все начавшие сбой, иначе номер минуты (epoch // 60)
+    для окна «активны сейчас»; старые минуты удаляются при сбросе.
+    """
+
+    failure = models.ForeignKey(
+        Failure,
+        on_delete=models.CASCADE,
+        related_name="player_sketches",
+        verbose_name="Сбой",
+    )
+    period = models.PositiveBigIntegerField(default=0, verbose_name="Период")
+    registers = models.BinaryField(verbose_name="Регистры")
+
+    class Meta:
+        db_table = "скетчи_участников_сбоев"
+        verbose_name = "Скетч участников сбоя"
+        verbose_name_plural = "Скетчи участников сбоев"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("failure", "period"),
+                name="uniq_failure_players_sketch",
+            ),
+        ]
+
+
+class FailureScoreBucket(TimestampedModel):
+    """Корзина гистограммы очков сбоя (границы — services.histogram.bucket_bounds)."""
+
+    failure = models.ForeignKey(
+        Failure,
+        on_delete=models.CASCADE,
+        related_name="score_buckets",
+        verbose_name="Сбой",
+    )
+    bucket = models.PositiveSmallIntegerField(verbose_name="Корзина")
+    count = models.PositiveIntegerField(default=0, verbose_name="Участников")
+
+    class Meta:
+        db_table = "гистограммы_сбоев"
+        verbose_name = "Корзина гистограммы"
+        verbose_name_plural = "Гистограммы сбоев"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("failure", "bucket"),
+                name="uniq_failure_score_bucket",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.failure_id}: [{self.bucket}] {self.count}"
+
+
 # ==============================
 # Quiz attempts
 # ==============================
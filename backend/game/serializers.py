@@ -17,15 +17,16 @@ from .models import (
     DailyReward,
     DailyRewardClaim,
     Failure,
-    FailureBonusPurchase,
     FailureBonusType,
     QuizQuestion,
     ScoreEntry,
+    ScoreEntryArchive,
     AdsgramBlock,
     AdsgramAssignment,
     SimulationRewardClaim,
     FrontendConfig,
 )
+from .services import failure_player_counts
 
 User = get_user_model()
 
@@ -244,6 +245,8 @@ class FailureSerializer(serializers.ModelSerializer[Failure]):
     is_completed = serializers.SerializerMethodField()
     bonus_prices = serializers.SerializerMethodField()
     main_prize_image = serializers.SerializerMethodField()
+    players_started = serializers.SerializerMethodField()
+    players_active = serializers.SerializerMethodField()
 
     class Meta:
         model = Failure
@@ -264,26 +267,15 @@ class FailureSerializer(serializers.ModelSerializer[Failure]):
             "main_prize_title",
             "main_prize_image",
             "shop_enabled",
+            "players_started",
+            "players_active",
         )
 
     def get_is_active(self, obj: Failure) -> bool:
-        now = timezone.now()
-        if obj.start_time and obj.start_time > now:
-            return False
-        if obj.end_time and obj.end_time <= now:
-            return False
-        return True
+        return _failure_active(obj)
 
     def get_is_completed(self, obj: Failure) -> bool:
-        request = self.context.get("request")
-        user = getattr(request, "user", None)
-        if not user or not user.is_authenticated:
-            return False
-        try:
-            profile = user.profile
-        except UserProfile.DoesNotExist:  # type: ignore[attr-defined]
-            return False
-        return ScoreEntry.objects.filter(profile=profile, failure=obj).exists()
+        return _failure_completed(self.context.get("request"), obj)
 
     def get_bonus_prices(self, obj: Failure) -> dict[str, int]:
         return obj.bonus_prices()
@@ -292,10 +284,91 @@ class FailureSerializer(serializers.ModelSerializer[Failure]):
         request = self.context.get("request")
         return _file_to_url(request, obj.main_prize_image)
 
+    def get_players_started(self, obj: Failure) -> int:
+        # оценка HyperLogLog, погрешность ~2%
+        return failure_player_counts(obj.id)[0]
+
+    def get_players_active(self, obj: Failure) -> int:
+        return failure_player_counts(obj.id)[1]
+
+
+def _failure_active(failure: Failure) -> bool:
+    now = timezone.now()
+    if failure.start_time and failure.start_time > now:
+        return False
+    if failure.end_time and failure.end_time <= now:
+        return False
+    return True
+
+
+def _failure_completed(request: Request | None, failure: Failure) -> bool:
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return False
+    # списки сбоев приходят с аннотацией completed (services.failures_for)
+    completed = getattr(failure, "completed", None)
+    if completed is not None:
+        return bool(completed)
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:  # type: ignore[attr-defined]
+        return False
+    if ScoreEntry.objects.filter(profile=profile, failure=failure).exists():
+        return True
+    return bool(failure.scores_archived_at) and (
+        ScoreEntryArchive.objects.filter(profile=profile, failure=failure).exists()
+    )
+
+
+_PER_REQUEST_FAILURE_FIELDS = ("is_completed", "players_started", "players_active")
+
+
+class _SharedFailureSerializer(FailureSerializer):
+    """Часть FailureSerializer, одинаковая для всех пользователей."""
+
+    class Meta(FailureSerializer.Meta):
+        fields = tuple(
+            name
+            for name in FailureSerializer.Meta.fields
+            if name not in _PER_REQUEST_FAILURE_FIELDS
+        )
+
+
+_failure_payloads: dict[tuple, dict] = {}
+_FAILURE_PAYLOADS_LIMIT = 256
+
+
+def failure_payload(failure: Failure, request: Request | None) -> dict:
+    """То же, что ``FailureSerializer(failure).data``, но общая часть кэшируется в воркере.
+
+    Ключ — id, ``updated_at`` (любое сохранение сбоя), флаг активности и
+    адрес сайта для абсолютных URL; на запрос остаются только
+    ``is_completed`` и счётчики игроков.
+    """
+    is_active = _failure_active(failure)
+    base_url = request.build_absolute_uri("/") if request is not None else None
+    key = (failure.pk, failure.updated_at, is_active, base_url)
+    shared = _failure_payloads.get(key)
+    if shared is None:
+        shared = dict(_SharedFailureSerializer(failure, context={"request": request}).data)
+        if len(_failure_payloads) >= _FAILURE_PAYLOADS_LIMIT:
+            _failure_payloads.clear()
+        _failure_payloads[key] = shared
+
+    started, active = failure_player_counts(failure.pk)
+    payload = {
+        **shared,
+        "is_completed": _failure_completed(request, failure),
+        "players_started": started,
+        "players_active": active,
+    }
+    return {name: payload[name] for name in FailureSerializer.Meta.fields}
+
 
 class FailureBonusPurchaseSerializer(serializers.Serializer):
     failure_id = serializers.IntegerField()
     bonus_type = serializers.ChoiceField(choices=FailureBonusType.choices)
+    run_token = serializers.UUIDField(required=False, allow_null=True)
 
 
 # ---------- Scores ----------
@@ -357,12 +430,43 @@ class QuizResultResponseSerializer(serializers.Serializer):
 
 class FailureStartSerializer(serializers.Serializer):
     failure_id = serializers.IntegerField(required=False)
+    # талон из ответа 503: повторная попытка проходит раньше новых запросов
+    ticket = serializers.CharField(required=False, allow_blank=True, max_length=128)
+
+
+class FailureReplaySerializer(serializers.Serializer):
+    """Запись забега: моменты в миллисекундах от начала игры."""
+
+    pops = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=3_600_000), max_length=25_000
+    )
+    bombs = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=3_600_000),
+        max_length=1000,
+        required=False,
+        default=list,
+    )
+    bonuses = serializers.DictField(
+        child=serializers.IntegerField(min_value=0, max_value=3_600_000),
+        required=False,
+        default=dict,
+    )
+
+    def validate_bonuses(self, value: dict[str, int]) -> dict[str, int]:
+        unknown = set(value) - set(FailureBonusType.values)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Неизвестные бонусы: {', '.join(sorted(unknown))}."
+            )
+        return value
 
 
 class FailureCompleteSerializer(serializers.Serializer):
     failure_id = serializers.IntegerField()
     points = serializers.IntegerField(min_value=0)
     duration_seconds = serializers.IntegerField(min_value=0, max_value=3600)
+    run_token = serializers.UUIDField(required=False, allow_null=True)
+    replay = FailureReplaySerializer(required=False, allow_null=True)
 
 
 # ---------- Adsgram ----------
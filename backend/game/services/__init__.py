@@ -4,10 +4,270 @@ from .adsgram import (
     AdsgramClientProtocol,
     get_adsgram_client,
 )
+from .admission import (
+    Admission,
+    AdmissionGate,
+    AdmissionStats,
+    get_failure_start_gate,
+)
+from .archive import ARCHIVE_BATCH_SIZE, archivable_failures, archive_failure_scores
+from .bans import (
+    BULK_BAN_BATCH_SIZE,
+    BulkBanResult,
+    ban_profiles_in_failure,
+    profiles_to_ban,
+    score_is_banned,
+    sync_score_ban_flags,
+)
+from .compact import compact_leaderboard
+from .cursors import CursorError, decode_cursor, encode_cursor
+from .histogram import (
+    bucket_bounds,
+    flush_score_histograms,
+    rebuild_score_histogram,
+    record_score_in_histogram,
+    record_scores_in_histogram,
+    score_bucket,
+    score_distribution,
+)
+from .failures import (
+    FAILURE_STATES,
+    FAILURES_MAX_PAGE_SIZE,
+    FAILURES_PAGE_SIZE,
+    failures_for,
+    failures_page,
+)
+from .hll import (
+    HyperLogLog,
+    failure_player_counts,
+    preload_failure_player_counts,
+    record_failure_start,
+)
+from .leaderboard import (
+    LEADERBOARD_PAGE_SIZE,
+    LEADERBOARD_MAX_AROUND,
+    LEADERBOARD_MAX_PAGE_SIZE,
+    bump_standings_version,
+    entry_for_profile,
+    leaderboard_around,
+    leaderboard_etag,
+    leaderboard_page,
+    leaderboard_row,
+    position_of,
+    ranked_circle_scores,
+    ranked_scores,
+    ranked_scores_with_archive,
+)
+from .live import (
+    LeaderboardHub,
+    flush_leaderboard_changes,
+    get_leaderboard_hub,
+    notify_leaderboard_changed,
+)
+from .rank_index import (
+    FailureRankIndex,
+    get_rank_index,
+    indexed_page,
+    indexed_rows,
+    record_in_rank_index,
+)
+from .outbox import (
+    DispatchStats,
+    dispatch_failure_events,
+    enqueue_failure_event,
+    failure_outbox_backlog,
+    purge_failure_events,
+    suppress_failure_events,
+    webhook_session,
+)
+from .prizes import (
+    PAYOUT_BATCH_SIZE,
+    PayoutResult,
+    PrizeTier,
+    failure_prizes,
+    pay_failure_prizes,
+    prize_table,
+)
+from .referrals import (
+    change_referrals_count,
+    inviter_position,
+    inviter_row,
+    ranked_inviters,
+    recount_referrals,
+    top_inviters_page,
+)
+from .replays import (
+    REPLAY_FLAGS,
+    ReplayRun,
+    VerifyStats,
+    verify_pending_replays,
+    verify_replays,
+)
+from .runs import (
+    BONUS_BITS,
+    bonuses_from_mask,
+    buy_run_bonus,
+    close_run,
+    expire_runs,
+    find_open_run,
+    open_run,
+    purge_runs,
+    run_token_required,
+)
+from .schedule import active_failure_id, invalidate_failure_schedule
+from .score_buffer import (
+    ScoreBuffer,
+    buffer_failure_score,
+    flush_failure_scores,
+    score_write_behind_enabled,
+)
+from .scores import PendingScore, ScoreResult, record_failure_score, record_failure_scores
+from .seasons import (
+    current_season,
+    ranked_season_scores,
+    recompute_season,
+    recompute_season_profile,
+    record_season_delta,
+    refresh_best_ranks,
+    season_row,
+)
+from .standings import (
+    ensure_standings,
+    failure_has_ended,
+    freeze_standings,
+    mark_standings_stale,
+    refreeze_standings,
+    standing_for_profile,
+    standings,
+    standings_are_final,
+    standings_around,
+    standings_final_at,
+    standings_page,
+)
+from .wallet import InsufficientBalanceError, credit, debit
 
 __all__ = [
     "AdsgramIntegrationError",
     "AdsgramAssignmentPayload",
     "AdsgramClientProtocol",
     "get_adsgram_client",
+    "Admission",
+    "AdmissionGate",
+    "AdmissionStats",
+    "get_failure_start_gate",
+    "ARCHIVE_BATCH_SIZE",
+    "archivable_failures",
+    "archive_failure_scores",
+    "BULK_BAN_BATCH_SIZE",
+    "BulkBanResult",
+    "ban_profiles_in_failure",
+    "profiles_to_ban",
+    "score_is_banned",
+    "sync_score_ban_flags",
+    "compact_leaderboard",
+    "CursorError",
+    "decode_cursor",
+    "encode_cursor",
+    "bucket_bounds",
+    "flush_score_histograms",
+    "rebuild_score_histogram",
+    "record_score_in_histogram",
+    "record_scores_in_histogram",
+    "score_bucket",
+    "score_distribution",
+    "FAILURE_STATES",
+    "FAILURES_MAX_PAGE_SIZE",
+    "FAILURES_PAGE_SIZE",
+    "failures_for",
+    "failures_page",
+    "HyperLogLog",
+    "failure_player_counts",
+    "preload_failure_player_counts",
+    "record_failure_start",
+    "LEADERBOARD_PAGE_SIZE",
+    "LEADERBOARD_MAX_AROUND",
+    "LEADERBOARD_MAX_PAGE_SIZE",
+    "bump_standings_version",
+    "entry_for_profile",
+    "leaderboard_around",
+    "leaderboard_etag",
+    "leaderboard_page",
+    "leaderboard_row",
+    "position_of",
+    "ranked_circle_scores",
+    "ranked_scores",
+    "ranked_scores_with_archive",
+    "FailureRankIndex",
+    "get_rank_index",
+    "indexed_page",
+    "indexed_rows",
+    "record_in_rank_index",
+    "DispatchStats",
+    "dispatch_failure_events",
+    "enqueue_failure_event",
+    "failure_outbox_backlog",
+    "purge_failure_events",
+    "suppress_failure_events",
+    "webhook_session",
+    "PAYOUT_BATCH_SIZE",
+    "PayoutResult",
+    "PrizeTier",
+    "failure_prizes",
+    "pay_failure_prizes",
+    "prize_table",
+    "change_referrals_count",
+    "inviter_position",
+    "inviter_row",
+    "ranked_inviters",
+    "recount_referrals",
+    "top_inviters_page",
+    "REPLAY_FLAGS",
+    "ReplayRun",
+    "VerifyStats",
+    "verify_pending_replays",
+    "verify_replays",
+    "BONUS_BITS",
+    "bonuses_from_mask",
+    "buy_run_bonus",
+    "close_run",
+    "expire_runs",
+    "find_open_run",
+    "open_run",
+    "purge_runs",
+    "run_token_required",
+    "active_failure_id",
+    "invalidate_failure_schedule",
+    "ScoreBuffer",
+    "buffer_failure_score",
+    "flush_failure_scores",
+    "score_write_behind_enabled",
+    "PendingScore",
+    "ScoreResult",
+    "record_failure_score",
+    "record_failure_scores",
+    "LeaderboardHub",
+    "get_leaderboard_hub",
+    "flush_leaderboard_changes",
+    "notify_leaderboard_changed",
+    "current_season",
+    "ranked_season_scores",
+    "recompute_season",
+    "recompute_season_profile",
+    "record_season_delta",
+    "refresh_best_ranks",
+    "season_row",
+    "ensure_standings",
+    "failure_has_ended",
+    "freeze_standings",
+    "mark_standings_stale",
+    "refreeze_standings",
+    "standing_for_profile",
+    "standings",
+    "standings_are_final",
+    "standings_around",
+    "standings_final_at",
+    "standings_page",
+    "InsufficientBalanceError",
+    "credit",
+    "debit",
 ]
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Iterator
+
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+# доля бюджета, которую новые запросы не занимают, пока есть ждущие с талонами
+TICKET_RESERVE_SHARE = 0.25
+_TICKET_SALT = "failure-start-ticket"
+_LOG_INTERVAL_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class Admission:
+    """Outcome of ``AdmissionGate.admit``: either a slot or a retry hint with a ticket."""
+
+    admitted: bool
+    retry_after_ms: int = 0
+    ticket: str = ""
+
+
+@dataclass
+class AdmissionStats:
+    pid: int
+    limit: int
+    in_flight: int
+    waiting: int
+    admitted: int
+    rejected: int
+    peak_in_flight: int
+    avg_service_ms: float
+
+
+class AdmissionGate:
+    """Per-process concurrency budget in front of an endpoint.
+
+    At most ``limit`` requests run at once; the rest are turned away at once
+    with a retry delay and a signed ticket instead of queueing in the server.
+    While tickets are outstanding, a ``TICKET_RESERVE_SHARE`` of the budget is
+    kept for requests that bring one back, so clients that already waited are
+    served before newcomers. The retry delay grows with the number of waiting
+    clients per slot and the mean service time, with jitter so retries do not
+    arrive in the same instant again.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        *,
+        retry_ms: float = 500,
+        retry_max_ms: float = 5000,
+        ticket_ttl: float = 60,
+    ) -> None:
+        self.limit = limit
+        self.retry_ms = retry_ms
+        self.retry_max_ms = retry_max_ms
+        self.ticket_ttl = ticket_ttl
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._avg_ms = float(retry_ms)
+        # талоны, выданные этим воркером и ещё не вернувшиеся: id -> срок
+        self._waiting: dict[str, float] = {}
+        self._signer = signing.TimestampSigner(salt=_TICKET_SALT)
+        self._logged_at = 0.0
+
+    def _ticket_id(self, ticket: str | None) -> str | None:
+        if not ticket:
+            return None
+        try:
+            return self._signer.unsign(ticket, max_age=self.ticket_ttl)
+        except signing.BadSignature:
+            return None
+
+    def _expire(self, now: float) -> None:
+        expired = [key for key, deadline in self._waiting.items() if deadline <= now]
+        for key in expired:
+            del self._waiting[key]
+
+    def _retry_after_ms(self) -> int:
+        per_slot = len(self._waiting) / max(self.limit, 1)
+        delay = min(max(self._avg_ms * (1 + per_slot), self.retry_ms), self.retry_max_ms)
+        return int(delay * random.uniform(0.8, 1.2))
+
+    def try_admit(self, ticket: str | None = None) -> Admission:
+        """Take a slot if the budget allows; never blocks."""
+        now = time.monotonic()
+        ticket_id = self._ticket_id(ticket)
+        with self._lock:
+            self._expire(now)
+            budget = self.limit
+            if ticket_id is None and self._waiting:
+                budget -= math.ceil(self.limit * TICKET_RESERVE_SHARE)
+            if self._in_flight < budget:
+                self._in_flight += 1
+                self._peak = max(self._peak, self._in_flight)
+                self._admitted += 1
+                if ticket_id is not None:
+                    self._waiting.pop(ticket_id, None)
+                return Admission(admitted=True)
+
+            self._rejected += 1
+            if ticket_id is None:
+                ticket_id = secrets.token_urlsafe(8)
+            self._waiting[ticket_id] = now + self.ticket_ttl
+            retry_after = self._retry_after_ms()
+            should_log = now - self._logged_at >= _LOG_INTERVAL_SECONDS
+            if should_log:
+                self._logged_at = now
+                stats = self._stats()
+        if should_log:
+            logger.warning("[admission] over budget: %s", asdict(stats))
+        return Admission(
+            admitted=False, retry_after_ms=retry_after, ticket=self._signer.sign(ticket_id)
+        )
+
+    def release(self, elapsed_seconds: float) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            # скользящее среднее времени обработки для подсказки клиентам
+            self._avg_ms += (elapsed_seconds * 1000 - self._avg_ms) * 0.1
+
+    @contextmanager
+    def admit(self, ticket: str | None = None) -> Iterator[Admission]:
+        """``try_admit`` that releases the slot when the block exits."""
+        admission = self.try_admit(ticket)
+        if not admission.admitted:
+            yield admission
+            return
+        started = time.monotonic()
+        try:
+            yield admission
+        finally:
+            self.release(time.monotonic() - started)
+
+    def _stats(self) -> AdmissionStats:
+        return AdmissionStats(
+            pid=os.getpid(),
+            limit=self.limit,
+            in_flight=self._in_flight,
+            waiting=len(self._waiting),
+            admitted=self._admitted,
+            rejected=self._rejected,
+            peak_in_flight=self._peak,
+            avg_service_ms=round(self._avg_ms, 1),
+        )
+
+    def stats(self) -> AdmissionStats:
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._stats()
+
+
+_start_gate: AdmissionGate | None = None
+_start_gate_lock = threading.Lock()
+
+
+def get_failure_start_gate() -> AdmissionGate | None:
+    """Gate of ``FailureStartView`` in this worker; ``None`` when turned off."""
+    global _start_gate
+    limit = int(getattr(settings, "FAILURE_START_MAX_CONCURRENT", 8))
+    if limit <= 0:
+        return None
+    with _start_gate_lock:
+        if _start_gate is None or _start_gate.limit != limit:
+            _start_gate = AdmissionGate(
+                limit,
+                retry_ms=float(getattr(settings, "FAILURE_START_RETRY_MS", 500)),
+                retry_max_ms=float(getattr(settings, "FAILURE_START_RETRY_MAX_MS", 5000)),
+                ticket_ttl=float(getattr(settings, "FAILURE_START_TICKET_TTL_SECONDS", 60)),
+            )
+        return _start_gate
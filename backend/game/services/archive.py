@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from ..models import Failure, ScoreEntry, ScoreEntryArchive
+from .standings import ensure_standings, failure_has_ended
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 5000
+
+_COLUMNS = (
+    "id",
+    "created_at",
+    "updated_at",
+    "profile_id",
+    "failure_id",
+    "points",
+    "duration_seconds",
+    "earned_at",
+    "is_banned",
+)
+_COLUMN_LIST = ", ".join(f'"{name}"' for name in _COLUMNS)
+
+# Перенос пачки одним запросом: DELETE ... RETURNING сразу вставляется в архив.
+# Повторный перенос того же профиля (поздний результат) оставляет лучшие очки.
+_MOVE_SQL = f"""
+    WITH moved AS (
+        DELETE FROM "{ScoreEntry._meta.db_table}"
+        WHERE "id" IN (
+            SELECT "id" FROM "{ScoreEntry._meta.db_table}"
+            WHERE "failure_id" = %s
+            LIMIT %s
+        )
+        RETURNING {_COLUMN_LIST}
+    ),
+    archived AS (
+        INSERT INTO "{ScoreEntryArchive._meta.db_table}" AS archive (
+            {_COLUMN_LIST}, "archived_at"
+        )
+        SELECT {_COLUMN_LIST}, NOW() FROM moved
+        ON CONFLICT ("profile_id", "failure_id") DO UPDATE SET
+            "points" = EXCLUDED."points",
+            "duration_seconds" = EXCLUDED."duration_seconds",
+            "earned_at" = EXCLUDED."earned_at",
+            "is_banned" = EXCLUDED."is_banned",
+            "updated_at" = EXCLUDED."updated_at",
+            "archived_at" = EXCLUDED."archived_at"
+        WHERE archive."points" < EXCLUDED."points"
+    )
+    SELECT COUNT(*) FROM moved
+"""
+
+
+def archivable_failures(ended_before: datetime) -> QuerySet[Failure]:
+    """Failures ended before ``ended_before`` that still have rows in ``ScoreEntry``."""
+    return (
+        Failure.objects.filter(end_time__lte=ended_before)
+        .filter(Exists(ScoreEntry.objects.filter(failure_id=OuterRef("pk"))))
+        .order_by("end_time", "id")
+    )
+
+
+def archive_failure_scores(failure: Failure, *, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move the scores of an ended failure to ``ScoreEntryArchive``; returns rows moved.
+
+    Final standings are frozen first, so the leaderboard of the failure keeps
+    being served from ``FailureStanding``. Every batch is a short transaction
+    of its own; an interrupted run is finished by calling this again.
+    """
+    if not failure_has_ended(failure):
+        raise ValueError(f"failure {failure.pk} has not ended")
+    if not ensure_standings(failure):
+        raise ValueError(f"standings of failure {failure.pk} are not final yet")
+
+    if not failure.scores_archived_at:
+        # отметка до переноса: пересчёт итогов и гистограммы читает обе таблицы
+        archived_at = timezone.now()
+        Failure.objects.filter(pk=failure.pk).update(scores_archived_at=archived_at)
+        failure.scores_archived_at = archived_at
+
+    moved = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(_MOVE_SQL, [failure.pk, batch_size])
+            count = cursor.fetchone()[0]
+        moved += count
+        if count < batch_size:
+            break
+    logger.info("[archive] failure=%s moved %s scores", failure.pk, moved)
+    return moved
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Failure, FailureBan, ScoreEntry, ScoreEntryArchive, UserProfile
+from .histogram import rebuild_score_histogram
+from .live import notify_leaderboard_changed
+from .seasons import recompute_season
+from .standings import refreeze_standings
+
+logger = logging.getLogger(__name__)
+
+BULK_BAN_BATCH_SIZE = 5000
+
+
+@dataclass
+class BulkBanResult:
+    matched: int = 0
+    created: int = 0
+    scores_banned: int = 0
+    unknown: list[str] = field(default_factory=list)
+
+
+def score_is_banned(profile: UserProfile, failure_id: int) -> bool:
+    """Whether a score of ``profile`` in ``failure_id`` is excluded from ranking."""
+    if profile.is_banned:
+        return True
+    return FailureBan.objects.filter(profile=profile, failure_id=failure_id).exists()
+
+
+def sync_score_ban_flags(profile_id: int, failure_id: int | None = None) -> list[int]:
+    """Bring ``is_banned`` of a profile's live and archived scores in line with its bans.
+
+    Touches only rows whose flag actually changes and bumps their
+    ``updated_at`` so the worker rank indexes pick them up. Returns the ids
+    of failures whose ranking changed.
+    """
+    globally_banned = (
+        UserProfile.objects.filter(pk=profile_id).values_list("is_banned", flat=True).first()
+    )
+    banned_failures = FailureBan.objects.filter(profile_id=profile_id).values("failure_id")
+
+    changed: set[int] = set()
+    now = timezone.now()
+    for model in (ScoreEntry, ScoreEntryArchive):
+        scores = model.objects.filter(profile_id=profile_id)
+        if failure_id is not None:
+            scores = scores.filter(failure_id=failure_id)
+        if globally_banned:
+            to_ban = scores.filter(is_banned=False)
+            to_unban = scores.none()
+        else:
+            to_ban = scores.filter(is_banned=False, failure_id__in=banned_failures)
+            to_unban = scores.filter(is_banned=True).exclude(failure_id__in=banned_failures)
+
+        for qs, flag in ((to_ban, True), (to_unban, False)):
+            failure_ids = list(qs.values_list("failure_id", flat=True))
+            if failure_ids:
+                qs.update(is_banned=flag, updated_at=now)
+                changed.update(fid for fid in failure_ids if fid is not None)
+    return sorted(changed)
+
+
+def profiles_to_ban(
+    failure: Failure,
+    *,
+    usernames: Iterable[str] = (),
+    telegram_ids: Iterable[int] = (),
+    min_points: int | None = None,
+) -> tuple[set[int], list[str]]:
+    """Profile ids picked by usernames, Telegram ids or a score threshold in ``failure``.
+
+    The second item lists the usernames and Telegram ids that match no profile.
+    """
+    usernames = {name.strip() for name in usernames if name and name.strip()}
+    telegram_ids = set(telegram_ids)
+    profile_ids: set[int] = set()
+    unknown: list[str] = []
+
+    if usernames:
+        found = dict(
+            UserProfile.objects.filter(user__username__in=usernames).values_list(
+                "user__username", "id"
+            )
+        )
+        profile_ids.update(found.values())
+        unknown += sorted(usernames - found.keys())
+    if telegram_ids:
+        found = dict(
+            UserProfile.objects.filter(telegram_id__in=telegram_ids).values_list(
+                "telegram_id", "id"
+            )
+        )
+        profile_ids.update(found.values())
+        unknown += [str(telegram_id) for telegram_id in sorted(telegram_ids - found.keys())]
+    if min_points is not None:
+        for model in (ScoreEntry, ScoreEntryArchive):
+            profile_ids.update(
+                model.objects.filter(failure=failure, points__gte=min_points).values_list(
+                    "profile_id", flat=True
+                )
+            )
+    return profile_ids, unknown
+
+
+def _ranking_changed_in_bulk(failure_id: int) -> None:
+    # то же, что сигнал бана делает для одного игрока, но один раз на весь сбой
+    refreeze_standings(failure_id)
+    failure = Failure.objects.select_related("season").filter(pk=failure_id).first()
+    if failure is None:
+        return
+    rebuild_score_histogram(failure)
+    if failure.season is not None:
+        recompute_season(failure.season)
+    notify_leaderboard_changed(failure_id)
+
+
+def ban_profiles_in_failure(
+    failure: Failure,
+    profile_ids: Iterable[int],
+    *,
+    reason: str = "",
+    batch_size: int = BULK_BAN_BATCH_SIZE,
+) -> BulkBanResult:
+    """Ban many profiles in ``failure`` at once.
+
+    Bans are inserted with ``bulk_create(ignore_conflicts=True)``, so existing
+    ones are kept, and the scores of the profiles are flagged with one UPDATE
+    per batch and score table. ``bulk_create`` sends no ``post_save``: instead of
+    rebuilding rankings once per ban, standings, histogram, season totals and
+    cached leaderboards of the failure are refreshed once after commit.
+    """
+    profile_ids = sorted(set(profile_ids))
+    result = BulkBanResult(matched=len(profile_ids))
+    if not profile_ids:
+        return result
+
+    reason = reason[: FailureBan._meta.get_field("reason").max_length]
+    with transaction.atomic():
+        before = FailureBan.objects.filter(failure=failure).count()
+        FailureBan.objects.bulk_create(
+            (
+                FailureBan(failure=failure, profile_id=profile_id, reason=reason)
+                for profile_id in profile_ids
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        result.created = FailureBan.objects.filter(failure=failure).count() - before
+
+        # по списку id, а не подзапросу к банам: только что вставленных банов нет
+        # в статистике планировщика, и соединение уходит в перебор таблицы очков
+        now = timezone.now()
+        for offset in range(0, len(profile_ids), batch_size):
+            batch = profile_ids[offset : offset + batch_size]
+            for model in (ScoreEntry, ScoreEntryArchive):
+                # updated_at — чтобы индексы рангов воркеров подхватили исключение
+                result.scores_banned += model.objects.filter(
+                    failure=failure, is_banned=False, profile_id__in=batch
+                ).update(is_banned=True, updated_at=now)
+
+        if result.created or result.scores_banned:
+            failure_id = failure.pk
+            transaction.on_commit(lambda: _ranking_changed_in_bulk(failure_id))
+
+    logger.info(
+        "[bans] failure=%s bulk ban: matched=%s created=%s scores=%s",
+        failure.pk,
+        result.matched,
+        result.created,
+        result.scores_banned,
+    )
+    return result
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Failure, FailureStanding, ScoreEntry
+from .cursors import CursorError
+from .leaderboard import ranked_scores
+
+_PROFILE_FIELDS = (
+    "profile__user__username",
+    "profile__user__first_name",
+    "profile__user__last_name",
+    "profile__photo_url",
+)
+
+
+def _millis(value: datetime | None) -> int | None:
+    return int(value.timestamp() * 1000) if value else None
+
+
+def encode_since(moment: datetime) -> str:
+    return format(_millis(moment), "x")
+
+
+def decode_since(token: str) -> datetime:
+    try:
+        millis = int(token, 16)
+        return datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError) as exc:
+        raise CursorError("invalid since token") from exc
+
+
+def _profile(values: tuple[Any, ...]) -> list[str]:
+    return [value or "" for value in values]
+
+
+def compact_leaderboard(failure: Failure, since: str | None = None) -> dict[str, Any]:
+    """Leaderboard as a profile dictionary plus ``[profile_id, score, achieved_at]`` rows.
+
+    Without ``since`` the whole ranking is returned in order (position is the
+    row index + 1). With ``since`` only rows changed after that token are
+    returned: ``rows`` to upsert and re-sort on the client, ``removed`` profile
+    ids to drop, and profiles only for participants that are new to the board
+    (a row with an unknown profile id, e.g. after an unban, means "reload in
+    full"). ``achieved_at`` is in epoch milliseconds. Every answer carries the
+    token for the next poll; a token older than
+    ``LEADERBOARD_DELTA_MAX_AGE_SECONDS`` gets a full answer (``"full": true``).
+    """
+    # токен берём до чтения: всё, что закоммитят позже, попадёт в следующую дельту
+    now = timezone.now()
+    overlap = timedelta(seconds=float(getattr(settings, "RANK_INDEX_SYNC_OVERLAP_SECONDS", 5)))
+    max_age = timedelta(
+        seconds=float(getattr(settings, "LEADERBOARD_DELTA_MAX_AGE_SECONDS", 600))
+    )
+
+    since_at = decode_since(since) if since else None
+    # очки архивного сбоя уже не в ScoreEntry: отдаём зафиксированные итоги целиком
+    archived = failure.scores_archived_at is not None
+    if since_at is None or now - since_at > max_age or archived:
+        ranked = (
+            FailureStanding.objects.filter(failure=failure).order_by("position")
+            if archived
+            else ranked_scores(failure)
+        )
+        items = ranked.values_list("profile_id", "points", "earned_at", *_PROFILE_FIELDS)
+        profiles: dict[str, list[str]] = {}
+        rows: list[list[Any]] = []
+        for profile_id, points, earned_at, *profile in items:
+            profiles[str(profile_id)] = _profile(profile)
+            rows.append([profile_id, int(points), _millis(earned_at)])
+        return {
+            "since": encode_since(now),
+            "full": True,
+            "profiles": profiles,
+            "rows": rows,
+            "removed": [],
+        }
+
+    # ban changes and new results bump updated_at (see score_failure_updated_idx)
+    cutoff = since_at - overlap
+    changed = (
+        ScoreEntry.objects.filter(failure=failure, updated_at__gte=cutoff)
+        .order_by("-points", "earned_at", "id")
+        .values_list(
+            "profile_id", "points", "earned_at", "is_banned", "created_at", *_PROFILE_FIELDS
+        )
+    )
+    profiles = {}
+    rows = []
+    removed: list[int] = []
+    for profile_id, points, earned_at, is_banned, created_at, *profile in changed:
+        if is_banned or not points:
+            removed.append(profile_id)
+            continue
+        rows.append([profile_id, int(points), _millis(earned_at)])
+        if created_at >= cutoff:
+            profiles[str(profile_id)] = _profile(profile)
+    return {
+        "since": encode_since(now),
+        "full": False,
+        "profiles": profiles,
+        "rows": rows,
+        "removed": removed,
+    }
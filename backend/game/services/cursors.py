@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Any, Sequence
+
+
+class CursorError(ValueError):
+    """Raised when a pagination cursor or token cannot be decoded."""
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Pack the keyset ``values`` of the last row into an opaque URL-safe cursor."""
+    raw = json.dumps(list(values))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    """Values packed by ``encode_cursor``; the caller checks their types."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise CursorError("invalid cursor") from exc
+    if not isinstance(values, list):
+        raise CursorError("invalid cursor")
+    return values
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from django.db.models import Exists, OuterRef, Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Failure, ScoreEntry, ScoreEntryArchive
+from .cursors import CursorError, decode_cursor, encode_cursor
+
+FAILURES_PAGE_SIZE = 20
+FAILURES_MAX_PAGE_SIZE = 100
+FAILURE_STATES = ("active", "upcoming", "past")
+FAILURES_ORDERING = ("-created_at", "-id")
+
+FailureKey = tuple[datetime, int]
+
+
+def _state_filter(state: str, now: datetime) -> Q:
+    if state == "upcoming":
+        return Q(start_time__gt=now)
+    if state == "past":
+        return Q(end_time__lte=now)
+    return (Q(start_time__isnull=True) | Q(start_time__lte=now)) & (
+        Q(end_time__isnull=True) | Q(end_time__gt=now)
+    )
+
+
+def failures_for(
+    profile_id: int | None, states: list[str] | None = None, now: datetime | None = None
+) -> QuerySet[Failure]:
+    """Failures newest first, with ``completed`` of ``profile_id`` as one ``EXISTS``.
+
+    ``states`` (any of ``FAILURE_STATES``) limits the list to failures that
+    are active, upcoming or past at ``now``.
+    """
+    qs = Failure.objects.order_by(*FAILURES_ORDERING)
+    if states:
+        now = now or timezone.now()
+        condition = Q()
+        for state in states:
+            condition |= _state_filter(state, now)
+        qs = qs.filter(condition)
+    if profile_id is not None:
+        qs = qs.annotate(
+            completed=Exists(
+                ScoreEntry.objects.filter(profile_id=profile_id, failure_id=OuterRef("pk"))
+            )
+            | Exists(
+                ScoreEntryArchive.objects.filter(
+                    profile_id=profile_id, failure_id=OuterRef("pk")
+                )
+            )
+        )
+    return qs
+
+
+def _encode_cursor(failure: Failure) -> str:
+    return encode_cursor([failure.created_at.isoformat(), failure.id])
+
+
+def _decode_cursor(cursor: str) -> FailureKey:
+    values = decode_cursor(cursor)
+    try:
+        created_raw, failure_id = values
+        created_at = parse_datetime(created_raw)
+        failure_id = int(failure_id)
+    except (ValueError, TypeError) as exc:
+        raise CursorError("invalid cursor") from exc
+    if created_at is None:
+        raise CursorError("invalid cursor")
+    return created_at, failure_id
+
+
+def failures_page(
+    qs: QuerySet[Failure], *, cursor: str | None = None, limit: int
+) -> tuple[list[Failure], str | None]:
+    """Keyset page of ``qs`` (ordered by ``FAILURES_ORDERING``) after ``cursor``."""
+    if cursor:
+        created_at, failure_id = _decode_cursor(cursor)
+        qs = qs.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=failure_id)
+        )
+    failures = list(qs[: limit + 1])
+    next_cursor = _encode_cursor(failures[limit - 1]) if len(failures) > limit else None
+    return failures[:limit], next_cursor
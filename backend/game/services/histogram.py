@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from ..models import Failure, FailureScoreBucket
+from .leaderboard import ranked_scores_with_archive
+
+logger = logging.getLogger(__name__)
+
+# Log-linear buckets: values below 2**SUB_BITS are exact, above that every
+# power of two is split into 2**(SUB_BITS - 1) equal buckets (≤ 25% wide).
+SUB_BITS = 3
+_LINEAR = 1 << SUB_BITS
+_PER_OCTAVE = _LINEAR >> 1
+
+
+def score_bucket(points: int) -> int:
+    points = max(int(points), 0)
+    if points < _LINEAR:
+        return points
+    shift = points.bit_length() - SUB_BITS
+    return shift * _PER_OCTAVE + (points >> shift)
+
+
+def bucket_bounds(bucket: int) -> tuple[int, int]:
+    """Inclusive ``(low, high)`` range of points that fall into ``bucket``."""
+    if bucket < _LINEAR:
+        return bucket, bucket
+    shift = bucket // _PER_OCTAVE - 1
+    mantissa = bucket % _PER_OCTAVE + _PER_OCTAVE
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+# запись идёт после COMMIT результата, сбой к этому времени может быть удалён
+_UPSERT_SQL = f"""
+    INSERT INTO "{FailureScoreBucket._meta.db_table}"
+        ("failure_id", "bucket", "count", "created_at", "updated_at")
+    SELECT %s, %s, GREATEST(%s, 0), NOW(), NOW()
+    WHERE EXISTS (SELECT 1 FROM "{Failure._meta.db_table}" WHERE "id" = %s)
+    ON CONFLICT ("failure_id", "bucket")
+    DO UPDATE SET
+        "count" = GREATEST("{FailureScoreBucket._meta.db_table}"."count" + %s, 0),
+        "updated_at" = NOW()
+"""
+
+
+def _bucket_changes(moves: list[tuple[int, int, int]]) -> Counter[tuple[int, int]]:
+    changes: Counter[tuple[int, int]] = Counter()
+    for failure_id, previous_points, points in moves:
+        old = score_bucket(previous_points) if previous_points > 0 else None
+        new = score_bucket(points) if points > 0 else None
+        if old == new:
+            continue
+        if old is not None:
+            changes[(failure_id, old)] -= 1
+        if new is not None:
+            changes[(failure_id, new)] += 1
+    return changes
+
+
+def _write_bucket_changes(changes: Counter[tuple[int, int]]) -> None:
+    # фиксированный порядок корзин — без взаимных блокировок между воркерами
+    params = [
+        (failure_id, bucket, delta, failure_id, delta)
+        for (failure_id, bucket), delta in sorted(changes.items())
+        if delta
+    ]
+    if not params:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(_UPSERT_SQL, params)
+
+
+class HistogramBuffer:
+    """Per-process buffer of bucket deltas, written every ``SCORE_HISTOGRAM_FLUSH_SECONDS``.
+
+    The bucket rows of a failure are shared by all of its players; writing
+    them in the score transaction held their locks until COMMIT of every
+    completion. Deltas are summed here instead and a background thread writes
+    each touched bucket once per flush, outside any request. A crashed worker
+    loses at most one interval of deltas; ``rebuild_score_histograms`` recounts.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Counter[tuple[int, int]] = Counter()
+        self._pid: int | None = None
+
+    def add(self, changes: Counter[tuple[int, int]]) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._pending.update(changes)
+
+    def flush(self) -> int:
+        """Write the buffered deltas; returns the number of bucket rows touched."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, Counter()
+            batch = Counter({key: delta for key, delta in batch.items() if delta})
+            if not batch:
+                return 0
+            try:
+                _write_bucket_changes(batch)
+            except Exception as exc:  # pragma: no cover - DB failure path
+                logger.warning("[histogram] flush of %s buckets failed: %s", len(batch), exc)
+                with self._lock:
+                    self._pending.update(batch)
+                return 0
+            return len(batch)
+
+    def _ensure_started(self) -> None:
+        # после fork поток родителя в дочернем процессе не существует
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._pending = Counter()
+        threading.Thread(target=self._run, name="histogram-buffer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run(self) -> None:
+        every = float(getattr(settings, "SCORE_HISTOGRAM_FLUSH_SECONDS", 1))
+        while True:
+            time.sleep(every)
+            close_old_connections()
+            self.flush()
+
+
+_buffer = HistogramBuffer()
+
+
+def record_score_in_histogram(failure_id: int, previous_points: int, points: int) -> None:
+    """Move one participant from the bucket of ``previous_points`` to ``points``.
+
+    A zero score is not ranked and has no bucket.
+    """
+    record_scores_in_histogram([(failure_id, previous_points, points)])
+
+
+def record_scores_in_histogram(moves: list[tuple[int, int, int]]) -> None:
+    """Queue several ``(failure_id, previous_points, points)`` moves for the next flush.
+
+    Call it after the scores are committed (``transaction.on_commit``): the
+    buckets are written later by the buffer and never roll back.
+    """
+    changes = _bucket_changes(moves)
+    if changes:
+        _buffer.add(changes)
+
+
+def flush_score_histograms() -> int:
+    return _buffer.flush()
+
+
+def rebuild_score_histogram(failure: Failure) -> int:
+    """Recount the histogram of ``failure`` from ranked scores; returns participants.
+
+    Deltas still buffered in workers for scores already counted here are
+    applied on top, so a rebuild under load can be off by one flush interval.
+    """
+    counts = Counter(
+        score_bucket(points)
+        for _, points, _, _ in ranked_scores_with_archive(failure)
+        .order_by()
+        .iterator(chunk_size=5000)
+    )
+    with transaction.atomic():
+        FailureScoreBucket.objects.filter(failure=failure).delete()
+        FailureScoreBucket.objects.bulk_create(
+            FailureScoreBucket(failure=failure, bucket=bucket, count=count)
+            for bucket, count in sorted(counts.items())
+        )
+    total = sum(counts.values())
+    logger.info("[histogram] rebuilt failure=%s participants=%s", failure.pk, total)
+    return total
+
+
+def score_distribution(failure: Failure, points: int | None = None) -> dict[str, Any]:
+    """Histogram of ``failure`` and, for ``points``, the share of weaker results.
+
+    Reads only the bucket rows; inside the bucket of ``points`` results are
+    assumed to be spread evenly, so the percentile is an estimate.
+    """
+    rows = list(
+        FailureScoreBucket.objects.filter(failure=failure, count__gt=0)
+        .order_by("bucket")
+        .values_list("bucket", "count")
+    )
+    total = sum(count for _, count in rows)
+    buckets = []
+    for bucket, count in rows:
+        low, high = bucket_bounds(bucket)
+        buckets.append({"min": low, "max": high, "count": count})
+
+    percentile = None
+    if points is not None and points > 0 and total:
+        target = score_bucket(points)
+        below = 0.0
+        for bucket, count in rows:
+            if bucket < target:
+                below += count
+            elif bucket == target:
+                low, high = bucket_bounds(bucket)
+                below += count * (points - low) / (high - low + 1)
+        percentile = round(100 * below / total, 1)
+
+    return {"total": total, "buckets": buckets, "percentile": percentile}
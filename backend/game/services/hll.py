@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import FailurePlayersSketch
+
+logger = logging.getLogger(__name__)
+
+# 2**12 one-byte registers = 4 KB, standard error 1.04 / sqrt(4096) ≈ 1.6%.
+TOTAL_PRECISION = 12
+# one sketch per minute of the "active now" window: 1 KB each, ≈ 3.3%.
+WINDOW_PRECISION = 10
+WINDOW_BUCKET_SECONDS = 60
+TOTAL_PERIOD = 0
+_WRITE_ATTEMPTS = 5
+
+_HASH_BITS = 64
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(_HASH_BITS + 1)]
+
+
+def _hash(value: int) -> int:
+    digest = hashlib.blake2b(str(value).encode("ascii"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HyperLogLog:
+    """Distinct-count sketch of fixed size ``2 ** precision`` bytes.
+
+    Adding the same value twice changes nothing and two sketches merge by
+    taking the register maximum, so copies kept by different workers (and the
+    one in the database) can be combined in any order.
+    """
+
+    __slots__ = ("precision", "registers", "_estimate")
+
+    def __init__(self, precision: int, registers: bytes | None = None) -> None:
+        self.precision = precision
+        size = 1 << precision
+        if registers is not None and len(registers) != size:
+            logger.warning(
+                "[hll] dropping sketch of %s bytes, expected %s", len(registers), size
+            )
+            registers = None
+        self.registers = bytearray(registers or size)
+        self._estimate: int | None = None
+
+    def add(self, value: int) -> bool:
+        hashed = _hash(value)
+        index = hashed & ((1 << self.precision) - 1)
+        rest_bits = _HASH_BITS - self.precision
+        rank = rest_bits - (hashed >> self.precision).bit_length() + 1
+        if rank <= self.registers[index]:
+            return False
+        self.registers[index] = rank
+        self._estimate = None
+        return True
+
+    def merge(self, other: HyperLogLog) -> bool:
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        merged = bytearray(map(max, self.registers, other.registers))
+        if merged == self.registers:
+            return False
+        self.registers = merged
+        self._estimate = None
+        return True
+
+    def count(self) -> int:
+        if self._estimate is None:
+            size = len(self.registers)
+            alpha = 0.7213 / (1 + 1.079 / size)
+            raw = alpha * size * size / sum(_INVERSE_POWERS[r] for r in self.registers)
+            zeros = self.registers.count(0)
+            if raw <= 2.5 * size and zeros:
+                # малые значения точнее считает linear counting
+                raw = size * math.log(size / zeros)
+            self._estimate = int(round(raw))
+        return self._estimate
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    @classmethod
+    def union(cls, precision: int, sketches: list[HyperLogLog]) -> HyperLogLog:
+        result = cls(precision)
+        if len(sketches) == 1:
+            result.registers = bytearray(sketches[0].registers)
+        elif sketches:
+            result.registers = bytearray(map(max, *(s.registers for s in sketches)))
+        return result
+
+
+def _window_buckets() -> int:
+    window = float(getattr(settings, "FAILURE_ACTIVE_WINDOW_SECONDS", 300))
+    return max(1, math.ceil(window / WINDOW_BUCKET_SECONDS))
+
+
+def _minute(epoch: float) -> int:
+    return int(epoch // WINDOW_BUCKET_SECONDS)
+
+
+def _window_start(minute: int) -> int:
+    """First bucket of the active window ending with the current ``minute``.
+
+    The window holds ``_window_buckets()`` buckets including the current,
+    partly filled one, so it never spans more than the configured window.
+    """
+    return minute - _window_buckets() + 1
+
+
+class FailurePlayerSketches:
+    """Per-process sketches of one failure: all starters and starters per minute.
+
+    Starts are added in memory; every ``FAILURE_SKETCH_SYNC_SECONDS`` the
+    local copy is merged into the ``FailurePlayersSketch`` rows and the rows
+    (with the starts of every other worker) are merged back. Rows are written
+    with compare-and-set updates, so a sync never holds a row lock.
+    """
+
+    def __init__(self, failure_id: int) -> None:
+        self.failure_id = failure_id
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._total = HyperLogLog(TOTAL_PRECISION)
+        self._minutes: dict[int, HyperLogLog] = {}
+        self._dirty: set[int] = set()
+        self._synced_at = 0.0
+        self._active: tuple[int, int] | None = None
+
+    def add(self, profile_id: int, now: float | None = None) -> None:
+        minute = _minute(now if now is not None else time.time())
+        with self._lock:
+            if self._total.add(profile_id):
+                self._dirty.add(TOTAL_PERIOD)
+            sketch = self._minutes.get(minute)
+            if sketch is None:
+                sketch = self._minutes[minute] = HyperLogLog(WINDOW_PRECISION)
+            if sketch.add(profile_id):
+                self._dirty.add(minute)
+                self._active = None
+
+    def counts(self, now: float | None = None) -> tuple[int, int]:
+        """``(started, active)``: distinct starters overall and within the window."""
+        minute = _minute(now if now is not None else time.time())
+        first = _window_start(minute)
+        with self._lock:
+            started = self._total.count()
+            if self._active is None or self._active[0] != minute:
+                recent = [s for m, s in self._minutes.items() if first <= m <= minute]
+                self._active = (
+                    minute,
+                    HyperLogLog.union(WINDOW_PRECISION, recent).count() if recent else 0,
+                )
+            return started, self._active[1]
+
+    def sync_due(self) -> bool:
+        every = float(getattr(settings, "FAILURE_SKETCH_SYNC_SECONDS", 10))
+        return time.monotonic() - self._synced_at >= every
+
+    def sync(self, force: bool = False) -> None:
+        with self._sync_lock:
+            if not force and not self.sync_due():
+                return
+            try:
+                self._sync()
+            except Exception as exc:  # pragma: no cover - DB failure path
+                logger.warning("[hll] sync failed failure=%s: %s", self.failure_id, exc)
+            # и при ошибке ждём интервал, чтобы не долбить базу на каждом чтении
+            self._synced_at = time.monotonic()
+
+    def _sync(self) -> None:
+        first = _window_start(_minute(time.time()))
+        with self._lock:
+            for minute in [m for m in self._minutes if m < first]:
+                del self._minutes[minute]
+            self._dirty = {p for p in self._dirty if p == TOTAL_PERIOD or p >= first}
+            dirty, self._dirty = self._dirty, set()
+            outgoing = {period: self._sketch(period).to_bytes() for period in dirty}
+
+        try:
+            stored = self._exchange(outgoing, first)
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+            raise
+
+        self.merge_stored(stored, first)
+
+    def has_local_changes(self) -> bool:
+        with self._lock:
+            return bool(self._dirty)
+
+    def merge_stored(self, stored: dict[int, bytes], first: int) -> None:
+        """Merge registers read from ``FailurePlayersSketch`` rows into the local copy."""
+        with self._lock:
+            for period, registers in stored.items():
+                if period != TOTAL_PERIOD and period < first:
+                    continue
+                precision = TOTAL_PRECISION if period == TOTAL_PERIOD else WINDOW_PRECISION
+                current = self._sketch(period)
+                if current.merge(HyperLogLog(precision, registers)) and period != TOTAL_PERIOD:
+                    self._active = None
+
+    def mark_synced(self) -> None:
+        self._synced_at = time.monotonic()
+
+    def _sketch(self, period: int) -> HyperLogLog:
+        if period == TOTAL_PERIOD:
+            return self._total
+        sketch = self._minutes.get(period)
+        if sketch is None:
+            sketch = self._minutes[period] = HyperLogLog(WINDOW_PRECISION)
+        return sketch
+
+    def _exchange(self, outgoing: dict[int, bytes], first: int) -> dict[int, bytes]:
+        rows = FailurePlayersSketch.objects.filter(failure_id=self.failure_id)
+        if outgoing:
+            # новые строки сразу с нашими регистрами
+            FailurePlayersSketch.objects.bulk_create(
+                [
+                    FailurePlayersSketch(
+                        failure_id=self.failure_id, period=period, registers=registers
+                    )
+                    for period, registers in outgoing.items()
+                ],
+                ignore_conflicts=True,
+            )
+        stored = {
+            period: bytes(registers)
+            for period, registers in rows.filter(
+                Q(period=TOTAL_PERIOD) | Q(period__gte=first)
+            ).values_list("period", "registers")
+        }
+        failed = [
+            period
+            for period, registers in outgoing.items()
+            if not self._write_back(rows, period, registers, stored)
+        ]
+        if failed:
+            with self._lock:
+                self._dirty.update(failed)
+        rows.filter(period__gt=TOTAL_PERIOD, period__lt=first).delete()
+        return stored
+
+    @staticmethod
+    def _write_back(rows, period: int, registers: bytes, stored: dict[int, bytes]) -> bool:
+        """Merge ``registers`` into the stored row with compare-and-set, no row locks."""
+        precision = TOTAL_PRECISION if period == TOTAL_PERIOD else WINDOW_PRECISION
+        mine = HyperLogLog(precision, registers)
+        for _ in range(_WRITE_ATTEMPTS):
+            current = stored.get(period)
+            if current is None:
+                return True
+            merged = HyperLogLog(precision, current)
+            if not merged.merge(mine):
+                return True
+            if rows.filter(period=period, registers=current).update(
+                registers=merged.to_bytes(), updated_at=timezone.now()
+            ):
+                stored[period] = merged.to_bytes()
+                return True
+            # строку успел обновить другой воркер — перечитываем и сливаем ещё раз
+            latest = rows.filter(period=period).values_list("registers", flat=True).first()
+            if latest is None:
+                stored.pop(period, None)
+                return True
+            stored[period] = bytes(latest)
+        return False
+
+
+# последние запрошенные сбои: список сбоев не должен держать в воркере
+# скетч каждого сбоя, который когда-либо попадал на страницу
+_sketches: OrderedDict[int, FailurePlayerSketches] = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def _get_sketches(failure_id: int) -> FailurePlayerSketches:
+    limit = max(int(getattr(settings, "FAILURE_SKETCH_CACHE_SIZE", 256)), 1)
+    evicted = []
+    with _registry_lock:
+        sketches = _sketches.get(failure_id)
+        if sketches is None:
+            sketches = _sketches[failure_id] = FailurePlayerSketches(failure_id)
+        _sketches.move_to_end(failure_id)
+        while len(_sketches) > limit:
+            evicted.append(_sketches.popitem(last=False)[1])
+    for old in evicted:
+        # несинхронизированные старты вытесненного скетча дописываем в базу
+        if old.has_local_changes() and not connection.in_atomic_block:
+            old.sync(force=True)
+    return sketches
+
+
+def record_failure_start(failure_id: int, profile_id: int) -> None:
+    """Count ``profile_id`` as a starter of ``failure_id``; call after commit."""
+    sketches = _get_sketches(failure_id)
+    sketches.add(profile_id)
+    if sketches.sync_due():
+        sketches.sync()
+
+
+def preload_failure_player_counts(failure_ids: list[int]) -> None:
+    """Sync the sketches of many failures at once (for lists of failures).
+
+    Failures started on this worker since the last sync write their own rows;
+    the rest, usually every failure but the active one, are refreshed with a
+    single read instead of one query per failure.
+    """
+    if connection.in_atomic_block:
+        return
+    pending = []
+    for failure_id in failure_ids:
+        sketches = _get_sketches(failure_id)
+        if not sketches.sync_due():
+            continue
+        if sketches.has_local_changes():
+            sketches.sync()
+        else:
+            pending.append(sketches)
+    if not pending:
+        return
+
+    first = _window_start(_minute(time.time()))
+    stored: dict[int, dict[int, bytes]] = {sketches.failure_id: {} for sketches in pending}
+    try:
+        rows = FailurePlayersSketch.objects.filter(
+            Q(period=TOTAL_PERIOD) | Q(period__gte=first),
+            failure_id__in=list(stored),
+        ).values_list("failure_id", "period", "registers")
+        for failure_id, period, registers in rows:
+            stored[failure_id][period] = bytes(registers)
+    except Exception as exc:  # pragma: no cover - DB failure path
+        logger.warning("[hll] preload failed: %s", exc)
+    for sketches in pending:
+        sketches.merge_stored(stored[sketches.failure_id], first)
+        sketches.mark_synced()
+
+
+def failure_player_counts(failure_id: int) -> tuple[int, int]:
+    """Approximate ``(started, active)`` player counts of ``failure_id``."""
+    sketches = _get_sketches(failure_id)
+    # внутри чужой транзакции не берём блокировки строк скетча — отдаём локальное
+    if sketches.sync_due() and not connection.in_atomic_block:
+        sketches.sync()
+    return sketches.counts()
+
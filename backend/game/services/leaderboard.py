@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Callable
+
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Failure, ScoreEntry, ScoreEntryArchive, UserProfile
+from .cursors import CursorError, decode_cursor, encode_cursor
+from .hll import failure_player_counts
+
+LeaderboardRow = dict[str, Any]
+ScoreKey = tuple[int, datetime, int]
+RowBuilder = Callable[[Any, int], LeaderboardRow]
+
+LEADERBOARD_PAGE_SIZE = 50
+LEADERBOARD_MAX_PAGE_SIZE = 200
+LEADERBOARD_MAX_AROUND = 50
+
+# (-points, earned_at, id) — тот же порядок, что и в индексе score_failure_ranked_idx
+RANK_ORDERING = ("-points", "earned_at", "id")
+
+
+def bump_standings_version(failure_id: int) -> None:
+    """Invalidate cached leaderboards of ``failure_id`` (their ETag changes)."""
+    Failure.objects.filter(pk=failure_id).update(
+        standings_version=F("standings_version") + 1
+    )
+
+
+def _count_bucket(count: int) -> int:
+    """``count`` rounded down to two significant digits (HLL counts are ~2% off anyway)."""
+    if count < 100:
+        return count
+    step = 10 ** (len(str(count)) - 2)
+    return count // step * step
+
+
+def leaderboard_etag(failure: Failure, profile_id: int) -> str:
+    """ETag of the leaderboard of ``failure`` as seen by ``profile_id``.
+
+    Besides the standings version it covers edits of the failure itself, its
+    active flag and the player counters, all of which are part of the
+    response. The counters change with every start, so they enter rounded to
+    two significant digits: polling still gets 304s between visible changes.
+    """
+    now = timezone.now()
+    active = not (
+        (failure.start_time and failure.start_time > now)
+        or (failure.end_time and failure.end_time <= now)
+    )
+    updated = int(failure.updated_at.timestamp() * 1_000_000) if failure.updated_at else 0
+    started, playing = failure_player_counts(failure.id)
+    players = f"{_count_bucket(started)}.{_count_bucket(playing)}"
+    return (
+        f'"lb-{failure.id}-{failure.standings_version}-{updated}-{int(active)}-{players}'
+        f'-{profile_id}"'
+    )
+
+
+def ranked_scores(failure: Failure) -> QuerySet[ScoreEntry]:
+    """Scores that take part in the ranking of ``failure``, best first."""
+    # условие совпадает с частичным индексом score_failure_ranked_idx
+    return ScoreEntry.objects.filter(failure=failure, points__gt=0, is_banned=False).order_by(
+        *RANK_ORDERING
+    )
+
+
+def ranked_scores_with_archive(failure: Failure) -> QuerySet:
+    """``(profile_id, points, earned_at, id)`` of ``ranked_scores`` plus archived rows.
+
+    For rebuilding final standings and histograms: once a failure's scores
+    were moved to ``ScoreEntryArchive`` the live table no longer holds them.
+    """
+    fields = ("profile_id", "points", "earned_at", "id")
+    live = ranked_scores(failure).values_list(*fields)
+    if not failure.scores_archived_at:
+        return live
+    archived = ScoreEntryArchive.objects.filter(
+        failure=failure, points__gt=0, is_banned=False
+    ).values_list(*fields)
+    return live.order_by().union(archived, all=True).order_by(*RANK_ORDERING)
+
+
+def ranked_circle_scores(failure: Failure, profile: UserProfile) -> QuerySet[ScoreEntry]:
+    """Ranked scores of the referral circle: ``profile``, its referrer and its referrals.
+
+    The circle is resolved as a subquery over the referred_by index and the
+    scores are joined via ``uniq_score_per_failure``, so the cost follows the
+    circle size rather than the number of participants.
+    """
+    members = Q(referred_by_id=profile.id) | Q(pk=profile.id)
+    if profile.referred_by_id:
+        members |= Q(pk=profile.referred_by_id)
+    circle = UserProfile.objects.filter(members).values("id")
+    return ranked_scores(failure).filter(profile_id__in=circle)
+
+
+def score_key(entry: ScoreEntry) -> ScoreKey:
+    return int(entry.points or 0), entry.earned_at, entry.id
+
+
+def leaderboard_row(entry: ScoreEntry, position: int) -> LeaderboardRow:
+    profile = entry.profile
+    return {
+        "position": position,
+        "username": profile.user.username,
+        "first_name": profile.user.first_name or "",
+        "last_name": profile.user.last_name or "",
+        "photo_url": profile.photo_url or "",
+        "score": int(entry.points or 0),
+        "duration_seconds": 0,  # legacy поле, больше не используем
+        "achieved_at": entry.earned_at.isoformat() if entry.earned_at else None,
+    }
+
+
+def encode_score_cursor(entry: ScoreEntry, position: int) -> str:
+    points, earned_at, entry_id = score_key(entry)
+    return encode_cursor([points, earned_at.isoformat(), entry_id, position])
+
+
+def decode_score_cursor(cursor: str) -> tuple[ScoreKey, int]:
+    values = decode_cursor(cursor)
+    try:
+        points, earned_raw, entry_id, position = values
+        earned_at = parse_datetime(earned_raw)
+        key = (int(points), earned_at, int(entry_id))
+        position = int(position)
+    except (ValueError, TypeError) as exc:
+        raise CursorError("invalid cursor") from exc
+    if earned_at is None or position < 0:
+        raise CursorError("invalid cursor")
+    return key, position
+
+
+def ranked_after(key: ScoreKey) -> Q:
+    """Rows that come strictly after ``key`` in leaderboard order."""
+    points, earned_at, entry_id = key
+    return (
+        Q(points__lt=points)
+        | Q(points=points, earned_at__gt=earned_at)
+        | Q(points=points, earned_at=earned_at, id__gt=entry_id)
+    )
+
+
+def ranked_before(key: ScoreKey) -> Q:
+    """Rows that come strictly before ``key`` in leaderboard order."""
+    points, earned_at, entry_id = key
+    return (
+        Q(points__gt=points)
+        | Q(points=points, earned_at__lt=earned_at)
+        | Q(points=points, earned_at=earned_at, id__lt=entry_id)
+    )
+
+
+def position_of(ranked: QuerySet[ScoreEntry], entry: ScoreEntry) -> int:
+    """1-based place of ``entry`` computed with a single COUNT over the rank index."""
+    return ranked.filter(ranked_before(score_key(entry))).order_by().count() + 1
+
+
+def entry_for_profile(
+    ranked: QuerySet[ScoreEntry], profile: UserProfile
+) -> ScoreEntry | None:
+    return ranked.filter(profile=profile).select_related("profile__user").first()
+
+
+def leaderboard_page(
+    ranked: QuerySet[ScoreEntry],
+    *,
+    cursor: str | None = None,
+    limit: int = LEADERBOARD_PAGE_SIZE,
+    row: RowBuilder = leaderboard_row,
+) -> tuple[list[LeaderboardRow], str | None]:
+    """Keyset page of ``limit`` rows after ``cursor`` and the cursor for the next page.
+
+    Works for any queryset ordered by ``RANK_ORDERING`` with ``points``,
+    ``earned_at`` and ``profile`` fields.
+    """
+    qs = ranked.select_related("profile__user")
+    position = 0
+    if cursor:
+        key, position = decode_score_cursor(cursor)
+        qs = qs.filter(ranked_after(key))
+
+    entries = list(qs[: limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    rows = [row(entry, position + offset) for offset, entry in enumerate(entries, start=1)]
+    next_cursor = None
+    if has_more and entries:
+        next_cursor = encode_score_cursor(entries[-1], position + len(entries))
+    return rows, next_cursor
+
+
+def leaderboard_around(
+    ranked: QuerySet[ScoreEntry],
+    entry: ScoreEntry,
+    position: int,
+    size: int,
+    row: RowBuilder = leaderboard_row,
+) -> list[LeaderboardRow]:
+    """``size`` rows above and below ``entry`` (including the entry itself)."""
+    key = score_key(entry)
+    qs = ranked.select_related("profile__user")
+
+    above = list(
+        qs.filter(ranked_before(key)).order_by("points", "-earned_at", "-id")[:size]
+    )
+    below = list(qs.filter(ranked_after(key))[:size])
+
+    rows = [
+        row(item, position - offset)
+        for offset, item in reversed(list(enumerate(above, start=1)))
+    ]
+    rows.append(row(entry, position))
+    rows.extend(row(item, position + offset) for offset, item in enumerate(below, start=1))
+    return rows
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from ..models import Failure
+from .leaderboard import bump_standings_version
+from .rank_index import get_rank_index, indexed_rows
+
+logger = logging.getLogger(__name__)
+
+LIVE_CHANNEL = "leaderboard_updates"
+# по имени приложения пишущие воркеры видят, слушает ли канал хоть один хаб
+LIVE_APPLICATION_NAME = "cat_game_leaderboard_stream"
+# NOTIFY берёт глобальную блокировку очереди уведомлений до COMMIT: без слушателей
+# не отправляем его вовсе
+_NOTIFY_SQL = """
+    SELECT pg_notify(%s, %s)
+    WHERE EXISTS (SELECT 1 FROM pg_stat_activity WHERE "application_name" = %s)
+"""
+# полезная нагрузка NOTIFY ограничена 8000 байтами
+_NOTIFY_BATCH = 500
+
+
+def _announce(failure_ids: list[int]) -> None:
+    # версия таблицы — по строке на сбой и по отдельному запросу: воркеры не
+    # держат блокировки нескольких строк сбоев одновременно
+    for failure_id in failure_ids:
+        bump_standings_version(failure_id)
+    with connection.cursor() as cursor:
+        for offset in range(0, len(failure_ids), _NOTIFY_BATCH):
+            payload = ",".join(map(str, failure_ids[offset : offset + _NOTIFY_BATCH]))
+            cursor.execute(_NOTIFY_SQL, [LIVE_CHANNEL, payload, LIVE_APPLICATION_NAME])
+
+
+class LeaderboardChangeBuffer:
+    """Per-process set of failures whose leaderboards moved, announced once per tick.
+
+    A version bump and a NOTIFY per completion queued all finishers on the
+    shared failure row and on the notify queue lock. Changed failures are
+    collected here instead; every ``LEADERBOARD_STREAM_TICK_SECONDS`` a
+    background thread bumps ``standings_version`` of each of them once (the
+    leaderboard ETag) and sends one NOTIFY for all of them, none while no
+    stream hub is listening.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty: set[int] = set()
+        self._pid: int | None = None
+
+    def add(self, failure_id: int) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._dirty.add(failure_id)
+
+    def flush(self) -> int:
+        """Announce the collected failures; returns how many there were."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._dirty = self._dirty, set()
+            if not batch:
+                return 0
+            try:
+                _announce(sorted(batch))
+            except Exception as exc:  # pragma: no cover - DB failure path
+                logger.warning("[live] notify of %s failures failed: %s", len(batch), exc)
+                with self._lock:
+                    self._dirty.update(batch)
+                return 0
+            return len(batch)
+
+    def _ensure_started(self) -> None:
+        # после fork поток родителя в дочернем процессе не существует
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._dirty = set()
+        threading.Thread(target=self._run, name="leaderboard-changes", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run(self) -> None:
+        tick = float(getattr(settings, "LEADERBOARD_STREAM_TICK_SECONDS", 1))
+        while True:
+            time.sleep(tick)
+            close_old_connections()
+            self.flush()
+
+
+_changes = LeaderboardChangeBuffer()
+
+
+def notify_leaderboard_changed(failure_id: int) -> None:
+    """Queue a change of ``failure_id``: new ETag and stream update with the next tick.
+
+    Called after commit; the write goes out from the background thread of
+    this worker, so a failed one never breaks the request that wrote the score.
+    """
+    _changes.add(failure_id)
+
+
+def flush_leaderboard_changes() -> int:
+    return _changes.flush()
+
+
+def _listen_conninfo() -> str:
+    db = settings.DATABASES["default"]
+    return make_conninfo(
+        dbname=db.get("NAME") or "",
+        user=db.get("USER") or "",
+        password=db.get("PASSWORD") or "",
+        host=db.get("HOST") or "",
+        port=str(db.get("PORT") or ""),
+        application_name=LIVE_APPLICATION_NAME,
+    )
+
+
+@dataclass(eq=False)
+class Subscription:
+    """One open stream; keeps only the latest undelivered update."""
+
+    failure_id: int
+    profile_id: int
+    end_time: datetime | None
+    position: int | None = None
+    top_version: int = 0
+    _pending: dict[str, Any] | None = None
+    _event: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def push(self, update: dict[str, Any]) -> None:
+        # медленный клиент получает только последнее состояние
+        self._pending = {**(self._pending or {}), **update}
+        self._event.set()
+
+    async def next_update(self, timeout: float) -> dict[str, Any] | None:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._event.clear()
+        update, self._pending = self._pending, None
+        return update
+
+    def has_ended(self) -> bool:
+        return bool(self.end_time and self.end_time <= timezone.now())
+
+
+@dataclass
+class _FailureState:
+    subscribers: set[Subscription] = field(default_factory=set)
+    top: list[dict[str, Any]] = field(default_factory=list)
+    top_version: int = 0
+
+
+def leaderboard_snapshot(failure_id: int, profile_ids: list[int]) -> dict[str, Any] | None:
+    """Top rows and positions of ``profile_ids`` read from the rank index.
+
+    Runs in a worker thread; ``None`` when the failure is gone or has ended.
+    """
+    close_old_connections()
+    try:
+        failure = Failure.objects.filter(pk=failure_id).first()
+        if failure is None:
+            return None
+        index = get_rank_index(failure)
+        if index is None:
+            return None
+        index.sync(force=True)
+        top_size = int(getattr(settings, "LEADERBOARD_STREAM_TOP", 10))
+        return {
+            "top": indexed_rows(index.top(top_size)),
+            "positions": {pid: index.rank_of_profile(pid) for pid in profile_ids},
+            "total": len(index),
+        }
+    finally:
+        close_old_connections()
+
+
+class LeaderboardHub:
+    """Per-process fan-out of leaderboard changes to SSE subscribers.
+
+    A single LISTEN connection marks failures as dirty; every
+    ``LEADERBOARD_STREAM_TICK_SECONDS`` the dirty failures are re-read once
+    and the result is pushed to all their subscribers, so a burst of
+    completions turns into one update per tick. The connection is held only
+    while the hub has subscribers.
+    """
+
+    def __init__(self) -> None:
+        self._failures: dict[int, _FailureState] = {}
+        self._dirty: set[int] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def _ensure_started(self) -> None:
+        if self._tasks and not any(task.done() for task in self._tasks):
+            return
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._tick()),
+        ]
+
+    async def subscribe(self, failure: Failure, profile_id: int) -> Subscription:
+        self._ensure_started()
+        subscription = Subscription(
+            failure_id=failure.id, profile_id=profile_id, end_time=failure.end_time
+        )
+        state = self._failures.setdefault(failure.id, _FailureState())
+        state.subscribers.add(subscription)
+
+        try:
+            snapshot = await sync_to_async(leaderboard_snapshot, thread_sensitive=False)(
+                failure.id, [profile_id]
+            )
+        except BaseException:
+            # подписка ещё не отдана потоку, и его finally её не уберёт
+            self.unsubscribe(subscription)
+            raise
+        if snapshot is not None:
+            if not state.top_version or snapshot["top"] != state.top:
+                state.top = snapshot["top"]
+                state.top_version += 1
+            subscription.position = snapshot["positions"].get(profile_id)
+            subscription.top_version = state.top_version
+            subscription.push(
+                {
+                    "top": state.top,
+                    "position": subscription.position,
+                    "total": snapshot["total"],
+                }
+            )
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        state = self._failures.get(subscription.failure_id)
+        if state is None:
+            return
+        state.subscribers.discard(subscription)
+        if not state.subscribers:
+            del self._failures[subscription.failure_id]
+            self._dirty.discard(subscription.failure_id)
+        if not self._failures:
+            # без подписчиков канал не слушаем: пишущие воркеры перестают слать NOTIFY
+            for task in self._tasks:
+                task.cancel()
+            self._tasks = []
+
+    async def _listen(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    _listen_conninfo(), autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {LIVE_CHANNEL}")
+                    delay = 1.0
+                    logger.info("[live] listening on %s", LIVE_CHANNEL)
+                    async for notify in conn.notifies():
+                        for raw_id in notify.payload.split(","):
+                            try:
+                                failure_id = int(raw_id)
+                            except ValueError:
+                                continue
+                            if failure_id in self._failures:
+                                self._dirty.add(failure_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # pragma: no cover - DB failure path
+                logger.warning("[live] listener dropped: %s", exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _tick(self) -> None:
+        tick = float(getattr(settings, "LEADERBOARD_STREAM_TICK_SECONDS", 1))
+        while True:
+            await asyncio.sleep(tick)
+            dirty, self._dirty = self._dirty, set()
+            for failure_id in dirty:
+                try:
+                    await self._broadcast(failure_id)
+                except Exception as exc:  # pragma: no cover - DB failure path
+                    logger.warning("[live] broadcast failed failure=%s: %s", failure_id, exc)
+
+    async def _broadcast(self, failure_id: int) -> None:
+        state = self._failures.get(failure_id)
+        if state is None:
+            return
+        subscribers = list(state.subscribers)
+        profile_ids = sorted({sub.profile_id for sub in subscribers})
+        snapshot = await sync_to_async(leaderboard_snapshot, thread_sensitive=False)(
+            failure_id, profile_ids
+        )
+        if snapshot is None:
+            return
+
+        if snapshot["top"] != state.top:
+            state.top = snapshot["top"]
+            state.top_version += 1
+
+        for subscription in subscribers:
+            update: dict[str, Any] = {}
+            if subscription.top_version != state.top_version:
+                update["top"] = state.top
+                subscription.top_version = state.top_version
+            position = snapshot["positions"].get(subscription.profile_id)
+            if position != subscription.position:
+                update["position"] = position
+                subscription.position = position
+            if update:
+                update["total"] = snapshot["total"]
+                subscription.push(update)
+
+
+_hubs: dict[int, LeaderboardHub] = {}
+
+
+def get_leaderboard_hub() -> LeaderboardHub:
+    """Hub bound to the running event loop (one per ASGI worker)."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(id(loop))
+    if hub is None:
+        hub = _hubs[id(loop)] = LeaderboardHub()
+    return hub
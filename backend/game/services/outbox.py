@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import logging
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from ..models import FailureWebhookEvent, FailureWebhookKind, FailureWebhookStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class _Hook:
+    name: str
+    url_setting: str
+    secret_setting: str
+    timeout_setting: str
+
+    @property
+    def url(self) -> str:
+        return getattr(settings, self.url_setting, "")
+
+    @property
+    def timeout(self) -> float:
+        return float(getattr(settings, self.timeout_setting, 10))
+
+
+_HOOKS = {
+    FailureWebhookKind.CREATED: _Hook(
+        "create", "FAILURE_CREATE_URL", "FAILURE_CREATE_SECRET", "FAILURE_CREATE_TIMEOUT"
+    ),
+    FailureWebhookKind.DELETED: _Hook(
+        "delete", "FAILURE_DELETE_URL", "FAILURE_DELETE_SECRET", "FAILURE_DELETE_TIMEOUT"
+    ),
+}
+
+
+@dataclass
+class DispatchStats:
+    claimed: int = 0
+    sent: int = 0
+    skipped: int = 0
+    retried: int = 0
+    failed: int = 0
+
+
+_suppressed: ContextVar[bool] = ContextVar("failure_events_suppressed", default=False)
+
+
+@contextmanager
+def suppress_failure_events() -> Iterator[None]:
+    """Create or delete failures without queueing webhooks (load-test commands)."""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def enqueue_failure_event(
+    kind: str, failure_id: int, payload: dict[str, Any]
+) -> FailureWebhookEvent | None:
+    """Queue a webhook in the current transaction; ``None`` if its URL is not set.
+
+    The secret is added on sending and never stored. Nothing is queued inside
+    ``suppress_failure_events``.
+    """
+    hook = _HOOKS[FailureWebhookKind(kind)]
+    if _suppressed.get():
+        logger.info("[failures] %s hook suppressed for failure=%s", hook.name, failure_id)
+        return None
+    if not hook.url:
+        logger.info("[failures] %s hook skipped: %s not set", hook.name, hook.url_setting)
+        return None
+    return FailureWebhookEvent.objects.create(kind=kind, failure_id=failure_id, payload=payload)
+
+
+def webhook_session() -> requests.Session:
+    """HTTP session reused for a whole dispatcher run (keep-alive to the webhook host)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _claim(batch_size: int, now: datetime) -> list[FailureWebhookEvent]:
+    """Take due events; other dispatchers skip them until the lease runs out."""
+    lease = batch_size * max(hook.timeout for hook in _HOOKS.values()) + 30
+    with transaction.atomic():
+        events = list(
+            FailureWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=FailureWebhookStatus.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if events:
+            FailureWebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(
+                next_attempt_at=now + timedelta(seconds=lease), updated_at=now
+            )
+    return events
+
+
+def _coalesce(
+    events: list[FailureWebhookEvent],
+) -> tuple[list[FailureWebhookEvent], list[FailureWebhookEvent]]:
+    """Split a batch into events to send and events made pointless by later ones.
+
+    Of several events of one kind for a failure only the newest is sent; a
+    failure created and deleted before its creation was ever attempted is not
+    announced at all.
+    """
+    by_failure: dict[int, list[FailureWebhookEvent]] = defaultdict(list)
+    for event in sorted(events, key=lambda e: e.pk):
+        by_failure[event.failure_id].append(event)
+
+    to_send: list[FailureWebhookEvent] = []
+    skipped: list[FailureWebhookEvent] = []
+    for failure_events in by_failure.values():
+        latest: dict[str, FailureWebhookEvent] = {}
+        for event in failure_events:
+            if event.kind in latest:
+                skipped.append(latest[event.kind])
+            latest[event.kind] = event
+        created = latest.get(FailureWebhookKind.CREATED)
+        deleted = latest.get(FailureWebhookKind.DELETED)
+        if created and deleted and created.pk < deleted.pk and not created.attempts:
+            skipped.extend((created, deleted))
+            continue
+        to_send.extend(latest.values())
+    to_send.sort(key=lambda e: e.pk)
+    return to_send, skipped
+
+
+def _retry_delay(attempts: int) -> float:
+    base = float(getattr(settings, "FAILURE_OUTBOX_RETRY_BASE_SECONDS", 5))
+    ceiling = float(getattr(settings, "FAILURE_OUTBOX_RETRY_MAX_SECONDS", 600))
+    # экспонента с джиттером: после сбоя получателя воркеры не приходят одновременно
+    return min(base * 2 ** (attempts - 1), ceiling) * random.uniform(0.5, 1.0)
+
+
+def _send(session: requests.Session, event: FailureWebhookEvent) -> None:
+    hook = _HOOKS[FailureWebhookKind(event.kind)]
+    if not hook.url:
+        raise RuntimeError(f"{hook.url_setting} not set")
+    response = session.post(
+        hook.url,
+        json={"secret": getattr(settings, hook.secret_setting, ""), **event.payload},
+        timeout=hook.timeout,
+    )
+    response.raise_for_status()
+
+
+def dispatch_failure_events(
+    *, batch_size: int = 100, session: requests.Session | None = None
+) -> DispatchStats:
+    """Send one batch of due webhooks and record the outcome of each."""
+    now = timezone.now()
+    events = _claim(batch_size, now)
+    stats = DispatchStats(claimed=len(events))
+    if not events:
+        return stats
+
+    to_send, skipped = _coalesce(events)
+    session = session or webhook_session()
+    max_attempts = int(getattr(settings, "FAILURE_OUTBOX_MAX_ATTEMPTS", 10))
+    sent_ids: list[int] = []
+    retries: list[FailureWebhookEvent] = []
+    for event in to_send:
+        try:
+            _send(session, event)
+        except Exception as exc:  # pragma: no cover - network failure path
+            hook_name = _HOOKS[FailureWebhookKind(event.kind)].name
+            event.attempts += 1
+            event.last_error = str(exc)[:1000]
+            event.updated_at = timezone.now()
+            if event.attempts >= max_attempts:
+                event.status = FailureWebhookStatus.FAILED
+                logger.error(
+                    "[failures] %s hook for failure=%s given up after %s attempts: %s",
+                    hook_name,
+                    event.failure_id,
+                    event.attempts,
+                    exc,
+                )
+            else:
+                event.next_attempt_at = event.updated_at + timedelta(
+                    seconds=_retry_delay(event.attempts)
+                )
+                logger.warning(
+                    "[failures] %s hook for failure=%s failed (attempt %s): %s",
+                    hook_name,
+                    event.failure_id,
+                    event.attempts,
+                    exc,
+                )
+            retries.append(event)
+        else:
+            sent_ids.append(event.pk)
+
+    finished = timezone.now()
+    if sent_ids:
+        FailureWebhookEvent.objects.filter(pk__in=sent_ids).update(
+            status=FailureWebhookStatus.SENT,
+            attempts=F("attempts") + 1,
+            sent_at=finished,
+            last_error="",
+            updated_at=finished,
+        )
+    if skipped:
+        FailureWebhookEvent.objects.filter(pk__in=[e.pk for e in skipped]).update(
+            status=FailureWebhookStatus.SKIPPED, updated_at=finished
+        )
+    if retries:
+        FailureWebhookEvent.objects.bulk_update(
+            retries, ["attempts", "status", "next_attempt_at", "last_error", "updated_at"]
+        )
+
+    stats.sent = len(sent_ids)
+    stats.skipped = len(skipped)
+    stats.failed = sum(1 for e in retries if e.status == FailureWebhookStatus.FAILED)
+    stats.retried = len(retries) - stats.failed
+    return stats
+
+
+def failure_outbox_backlog(now: datetime | None = None) -> dict[str, Any]:
+    """Backlog metrics: pending and due events, age of the oldest one, given up."""
+    now = now or timezone.now()
+    pending = Q(status=FailureWebhookStatus.PENDING)
+    totals = FailureWebhookEvent.objects.aggregate(
+        pending=Count("id", filter=pending),
+        due=Count("id", filter=pending & Q(next_attempt_at__lte=now)),
+        failed=Count("id", filter=Q(status=FailureWebhookStatus.FAILED)),
+        oldest=Min("created_at", filter=pending),
+    )
+    oldest = totals.pop("oldest")
+    totals["oldest_pending_seconds"] = (
+        round((now - oldest).total_seconds(), 1) if oldest is not None else 0.0
+    )
+    return totals
+
+
+def purge_failure_events(before: datetime) -> int:
+    """Delete delivered and coalesced events last touched before ``before``."""
+    deleted, _ = FailureWebhookEvent.objects.filter(
+        status__in=(FailureWebhookStatus.SENT, FailureWebhookStatus.SKIPPED),
+        updated_at__lt=before,
+    ).delete()
+    if deleted:
+        logger.info("[failures] purged %s webhook events", deleted)
+    return deleted
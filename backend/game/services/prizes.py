@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import bisect
+import logging
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Failure, FailurePrizePayout, FailurePrizeTier, FailureStanding, UserProfile
+from .standings import ensure_standings
+
+logger = logging.getLogger(__name__)
+
+PAYOUT_BATCH_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class PrizeTier:
+    position_from: int
+    position_to: int
+    amount: int
+
+
+@dataclass
+class PayoutResult:
+    winners: int = 0
+    total: int = 0
+    already_paid: bool = False
+
+
+# Начисление пачки одним запросом: UPDATE ... FROM по набору (id, место, приз)
+# возвращает новые балансы, и они тем же запросом пишутся в журнал выплат.
+# Набор передаётся тремя массивами через unnest, а не VALUES с тысячами
+# параметров: разбор и привязка такого запроса дороже самого обновления.
+_PAYOUT_SQL = f"""
+    WITH prizes ("profile_id", "position", "amount") AS (
+        SELECT * FROM unnest(%s::bigint[], %s::integer[], %s::integer[])
+    ),
+    credited AS (
+        UPDATE "{UserProfile._meta.db_table}" AS profile
+        SET "balance" = profile."balance" + prizes."amount", "updated_at" = %s
+        FROM prizes
+        WHERE profile."id" = prizes."profile_id"
+        RETURNING profile."id", prizes."position", prizes."amount", profile."balance"
+    )
+    INSERT INTO "{FailurePrizePayout._meta.db_table}" (
+        "created_at", "updated_at", "failure_id", "profile_id",
+        "position", "amount", "balance_after"
+    )
+    SELECT %s, %s, %s, "id", "position", "amount", "balance" FROM credited
+"""
+
+
+def prize_table(failure: Failure) -> list[PrizeTier]:
+    """Prize tiers of ``failure`` by position; without tiers ``reward`` goes to the winner."""
+    tiers = [
+        PrizeTier(tier.position_from, tier.position_to, tier.amount)
+        for tier in FailurePrizeTier.objects.filter(failure=failure, amount__gt=0).order_by(
+            "position_from", "id"
+        )
+    ]
+    if not tiers and failure.reward:
+        tiers = [PrizeTier(1, 1, failure.reward)]
+    return tiers
+
+
+def failure_prizes(failure: Failure, tiers: list[PrizeTier]) -> list[tuple[int, int, int]]:
+    """``(profile_id, position, amount)`` for every prize-winning place of the frozen standings.
+
+    Where tiers overlap, the one starting first wins.
+    """
+    if not tiers:
+        return []
+    starts = [tier.position_from for tier in tiers]
+    last = max(tier.position_to for tier in tiers)
+    prizes = []
+    rows = (
+        FailureStanding.objects.filter(failure=failure, position__lte=last)
+        .order_by("position")
+        .values_list("profile_id", "position")
+    )
+    for profile_id, position in rows.iterator(chunk_size=PAYOUT_BATCH_SIZE):
+        index = bisect.bisect_right(starts, position)
+        amount = next(
+            (tier.amount for tier in tiers[:index] if position <= tier.position_to), 0
+        )
+        if amount:
+            prizes.append((profile_id, position, amount))
+    return prizes
+
+
+def pay_failure_prizes(failure: Failure, *, batch_size: int = PAYOUT_BATCH_SIZE) -> PayoutResult:
+    """Credit the prize table of an ended failure to its final standings, once.
+
+    Standings are frozen first if needed; until every run of the failure has
+    expired (``standings_are_final``) this raises ``ValueError``. Balances are
+    credited per batch with one set-based ``UPDATE ... FROM`` that also writes
+    ``FailurePrizePayout`` rows; the whole payout is one transaction under a
+    lock of the failure, and ``prizes_paid_at`` makes a repeated call a no-op.
+    """
+    if not ensure_standings(failure):
+        raise ValueError(f"standings of failure {failure.pk} are not final yet")
+
+    with transaction.atomic():
+        locked = Failure.objects.select_for_update().get(pk=failure.pk)
+        if locked.prizes_paid_at:
+            failure.prizes_paid_at = locked.prizes_paid_at
+            return PayoutResult(already_paid=True)
+
+        prizes = failure_prizes(locked, prize_table(locked))
+        # профили блокируются по возрастанию id, чтобы не ловить взаимные блокировки
+        prizes.sort()
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            for offset in range(0, len(prizes), batch_size):
+                profile_ids, positions, amounts = zip(*prizes[offset : offset + batch_size])
+                cursor.execute(
+                    _PAYOUT_SQL,
+                    [list(profile_ids), list(positions), list(amounts), now, now, now, locked.pk],
+                )
+        Failure.objects.filter(pk=locked.pk).update(prizes_paid_at=now)
+
+    failure.prizes_paid_at = now
+    result = PayoutResult(winners=len(prizes), total=sum(amount for _, _, amount in prizes))
+    logger.info(
+        "[prizes] failure=%s paid %s coins to %s winners",
+        failure.pk,
+        result.total,
+        result.winners,
+    )
+    return result
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Failure, ScoreEntry
+from .leaderboard import (
+    LeaderboardRow,
+    decode_score_cursor,
+    encode_score_cursor,
+    leaderboard_row,
+    ranked_scores,
+)
+
+logger = logging.getLogger(__name__)
+
+# (-points, earned_at, entry_id) — сортировка по возрастанию совпадает с порядком лидерборда
+RankKey = tuple[int, datetime, int]
+
+_MAX_LEVELS = 24
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Any, levels: int) -> None:
+        self.key = key
+        self.next: list[_Node | None] = [None] * levels
+        self.width: list[int] = [0] * levels
+
+
+class IndexableSkipList:
+    """Sorted container with O(log n) insert, remove, rank and positional access.
+
+    Positions are 1-based, like leaderboard places.
+    """
+
+    def __init__(self) -> None:
+        self._head = _Node(None, _MAX_LEVELS)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _random_level() -> int:
+        level = 1
+        while level < _MAX_LEVELS and random.getrandbits(1):
+            level += 1
+        return level
+
+    def _chain(self, key: Any) -> tuple[list[_Node], list[int]]:
+        chain: list[_Node] = [self._head] * _MAX_LEVELS
+        positions = [0] * _MAX_LEVELS
+        node, position = self._head, 0
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, key: Any) -> None:
+        chain, positions = self._chain(key)
+        levels = self._random_level()
+        node = _Node(key, levels)
+        new_position = positions[0] + 1
+        for level in range(levels):
+            prev = chain[level]
+            node.next[level] = prev.next[level]
+            if prev.next[level] is not None:
+                node.width[level] = prev.width[level] - (new_position - positions[level]) + 1
+            prev.next[level] = node
+            prev.width[level] = new_position - positions[level]
+        for level in range(levels, _MAX_LEVELS):
+            if chain[level].next[level] is not None:
+                chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key: Any) -> bool:
+        chain, _ = self._chain(key)
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            return False
+        for level in range(_MAX_LEVELS):
+            prev = chain[level]
+            if prev.next[level] is target:
+                prev.width[level] += target.width[level] - 1
+                prev.next[level] = target.next[level]
+            elif prev.next[level] is not None:
+                prev.width[level] -= 1
+        self._size -= 1
+        return True
+
+    def count_before(self, key: Any) -> int:
+        """Number of stored keys strictly less than ``key``."""
+        _, positions = self._chain(key)
+        return positions[0]
+
+    def rank(self, key: Any) -> int | None:
+        """1-based position of ``key`` or ``None`` if it is absent."""
+        chain, positions = self._chain(key)
+        candidate = chain[0].next[0]
+        if candidate is None or candidate.key != key:
+            return None
+        return positions[0] + 1
+
+    def _node_at(self, position: int) -> _Node | None:
+        if position < 1 or position > self._size:
+            return None
+        node, current = self._head, 0
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and current + node.width[level] <= position:
+                current += node.width[level]
+                node = node.next[level]
+        return node
+
+    def slice(self, start: int, count: int) -> list[Any]:
+        """Up to ``count`` keys starting at 1-based ``start``."""
+        start = max(start, 1)
+        node = self._node_at(start)
+        keys: list[Any] = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class FailureRankIndex:
+    """Ranked view of one failure's scores kept in worker memory.
+
+    The index is built from ``ranked_scores`` and then catches up with rows
+    written by other workers: every ``RANK_INDEX_SYNC_SECONDS`` it re-reads
+    scores updated since the last sync (ban changes bump ``updated_at`` too)
+    and rebuilds completely every ``RANK_INDEX_REBUILD_SECONDS``.
+    """
+
+    def __init__(self, failure: Failure) -> None:
+        self.failure_id = failure.id
+        self.end_time = failure.end_time
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._ranks = IndexableSkipList()
+        self._keys_by_profile: dict[int, RankKey] = {}
+        self._synced_until: datetime | None = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+
+    # --- consistency with the DB ---
+
+    _FIELDS = ("id", "profile_id", "points", "earned_at", "updated_at", "is_banned")
+
+    def rebuild(self) -> None:
+        rows = list(
+            ranked_scores(Failure(id=self.failure_id)).order_by().values_list(*self._FIELDS)
+        )
+        with self._lock:
+            self._ranks = IndexableSkipList()
+            self._keys_by_profile.clear()
+            self._synced_until = None
+            self._apply_rows(rows)
+            self._built_at = self._checked_at = time.monotonic()
+        logger.info(
+            "[rank-index] rebuilt failure=%s entries=%s", self.failure_id, len(rows)
+        )
+
+    def sync(self, *, force: bool = False) -> None:
+        sync_every = float(getattr(settings, "RANK_INDEX_SYNC_SECONDS", 2))
+        rebuild_every = float(getattr(settings, "RANK_INDEX_REBUILD_SECONDS", 300))
+        overlap = timedelta(
+            seconds=float(getattr(settings, "RANK_INDEX_SYNC_OVERLAP_SECONDS", 5))
+        )
+
+        with self._sync_lock:
+            now = time.monotonic()
+            if not force and self._built_at and now - self._checked_at < sync_every:
+                return
+            self._checked_at = now
+
+            if not self._built_at or now - self._built_at >= rebuild_every:
+                self.rebuild()
+                return
+
+            # все строки сбоя, а не только ranked_scores: забаненные и обнулённые
+            # должны уйти из индекса
+            qs = ScoreEntry.objects.filter(failure_id=self.failure_id).values_list(*self._FIELDS)
+            if self._synced_until is not None:
+                qs = qs.filter(updated_at__gte=self._synced_until - overlap)
+            rows = list(qs.order_by())
+            with self._lock:
+                self._apply_rows(rows)
+
+    def _apply_rows(
+        self, rows: Iterable[tuple[int, int, int, datetime, datetime, bool]]
+    ) -> None:
+        for entry_id, profile_id, points, earned_at, updated_at, is_banned in rows:
+            self._apply(entry_id, profile_id, 0 if is_banned else points, earned_at)
+            if updated_at and (self._synced_until is None or updated_at > self._synced_until):
+                self._synced_until = updated_at
+
+    def _apply(self, entry_id: int, profile_id: int, points: int, earned_at: datetime) -> None:
+        previous = self._keys_by_profile.pop(profile_id, None)
+        if previous is not None:
+            self._ranks.remove(previous)
+        if int(points or 0) <= 0:
+            return
+        key: RankKey = (-int(points), earned_at, entry_id)
+        self._ranks.insert(key)
+        self._keys_by_profile[profile_id] = key
+
+    def apply(self, entry_id: int, profile_id: int, points: int, earned_at: datetime) -> None:
+        """Record a committed score written by this worker."""
+        with self._lock:
+            self._apply(entry_id, profile_id, points, earned_at)
+
+    # --- queries ---
+
+    def __len__(self) -> int:
+        return len(self._ranks)
+
+    def rank_of_profile(self, profile_id: int) -> int | None:
+        with self._lock:
+            key = self._keys_by_profile.get(profile_id)
+            return self._ranks.rank(key) if key is not None else None
+
+    def position_for(self, points: int, earned_at: datetime, entry_id: int) -> int:
+        """Place a score would take, whether or not it is already indexed."""
+        with self._lock:
+            return self._ranks.count_before((-int(points), earned_at, entry_id)) + 1
+
+    def entries(self, start: int, count: int) -> list[tuple[int, int]]:
+        """``(position, entry_id)`` for up to ``count`` rows from 1-based ``start``."""
+        start = max(start, 1)
+        with self._lock:
+            keys = self._ranks.slice(start, count)
+        return [(start + offset, key[2]) for offset, key in enumerate(keys)]
+
+    def entries_after(self, key: RankKey, count: int) -> list[int]:
+        """Entry ids of up to ``count`` rows strictly after ``key`` in leaderboard order."""
+        with self._lock:
+            start = self._ranks.count_before(key) + 1
+            keys = self._ranks.slice(start, count + 1)
+        return [entry_key[2] for entry_key in keys if entry_key != key][:count]
+
+    def top(self, count: int) -> list[tuple[int, int]]:
+        return self.entries(1, count)
+
+    def around(self, position: int, size: int) -> list[tuple[int, int]]:
+        start = max(position - size, 1)
+        return self.entries(start, position + size - start + 1)
+
+
+def indexed_rows(pairs: list[tuple[int, int]]) -> list[LeaderboardRow]:
+    """Leaderboard rows for ``(position, entry_id)`` pairs in one query."""
+    entries = ScoreEntry.objects.select_related("profile__user").in_bulk(
+        [entry_id for _, entry_id in pairs]
+    )
+    return [
+        leaderboard_row(entries[entry_id], position)
+        for position, entry_id in pairs
+        if entry_id in entries
+    ]
+
+
+def indexed_page(
+    index: FailureRankIndex, *, cursor: str | None, limit: int
+) -> tuple[list[LeaderboardRow], str | None]:
+    """Same contract as ``leaderboard_page``: seeks by the cursor key, not by offset.
+
+    Rows are numbered on from the position stored in the cursor, so scores that
+    move between two page fetches neither repeat nor skip rows.
+    """
+    if cursor:
+        (points, earned_at, entry_id), position = decode_score_cursor(cursor)
+        entry_ids = index.entries_after((-points, earned_at, entry_id), limit + 1)
+    else:
+        position = 0
+        entry_ids = [entry_id for _, entry_id in index.entries(1, limit + 1)]
+    pairs = [(position + offset, entry_id) for offset, entry_id in enumerate(entry_ids, start=1)]
+    has_more = len(pairs) > limit
+    pairs = pairs[:limit]
+    entries = ScoreEntry.objects.select_related("profile__user").in_bulk(
+        [entry_id for _, entry_id in pairs]
+    )
+    rows: list[LeaderboardRow] = []
+    last: tuple[ScoreEntry, int] | None = None
+    for row_position, entry_id in pairs:
+        entry = entries.get(entry_id)
+        if entry is None:
+            continue
+        rows.append(leaderboard_row(entry, row_position))
+        last = (entry, row_position)
+    next_cursor = encode_score_cursor(*last) if has_more and last else None
+    return rows, next_cursor
+
+
+_indexes: dict[int, FailureRankIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def _is_live(failure: Failure, now: datetime) -> bool:
+    return not failure.end_time or failure.end_time > now
+
+
+def get_rank_index(failure: Failure) -> FailureRankIndex | None:
+    """Synced index for an active failure, ``None`` once the failure has ended."""
+    now = timezone.now()
+    with _registry_lock:
+        for failure_id, index in list(_indexes.items()):
+            if index.end_time and index.end_time <= now:
+                del _indexes[failure_id]
+        if not _is_live(failure, now):
+            return None
+        index = _indexes.get(failure.id)
+        if index is None or index.end_time != failure.end_time:
+            index = _indexes[failure.id] = FailureRankIndex(failure)
+
+    index.sync()
+    return index
+
+
+def record_in_rank_index(
+    failure: Failure, entry_id: int, profile_id: int, points: int, earned_at: datetime
+) -> None:
+    with _registry_lock:
+        index = _indexes.get(failure.id)
+    if index is not None:
+        index.apply(entry_id, profile_id, points, earned_at)
+
+
+def reset_rank_indexes() -> None:
+    with _registry_lock:
+        _indexes.clear()
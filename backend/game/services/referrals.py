@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from django.db import connection
+from django.db.models import F, Q, QuerySet
+
+from ..models import UserProfile
+from .cursors import CursorError, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+INVITERS_ORDERING = ("-referrals_count", "id")
+
+InviterKey = tuple[int, int]
+
+
+def ranked_inviters() -> QuerySet[UserProfile]:
+    """Profiles with at least one referral, best inviters first (``profile_top_inviters_idx``)."""
+    return UserProfile.objects.filter(is_banned=False, referrals_count__gt=0).order_by(
+        *INVITERS_ORDERING
+    )
+
+
+def change_referrals_count(profile_id: int | None, delta: int) -> None:
+    """Atomically move the referral counter of ``profile_id`` by ``delta``."""
+    if not profile_id or not delta:
+        return
+    qs = UserProfile.objects.filter(pk=profile_id)
+    if delta < 0:
+        # счётчик беззнаковый: не уходим ниже нуля при рассинхронизации
+        qs = qs.filter(referrals_count__gte=-delta)
+    qs.update(referrals_count=F("referrals_count") + delta)
+
+
+def inviter_row(profile: UserProfile, position: int) -> dict[str, Any]:
+    return {
+        "position": position,
+        "username": profile.user.username,
+        "first_name": profile.user.first_name or "",
+        "last_name": profile.user.last_name or "",
+        "photo_url": profile.photo_url or "",
+        "referrals_count": int(profile.referrals_count),
+    }
+
+
+def _inviter_key(profile: UserProfile) -> InviterKey:
+    return int(profile.referrals_count), int(profile.id)
+
+
+def _inviters_before(key: InviterKey) -> Q:
+    count, profile_id = key
+    return Q(referrals_count__gt=count) | Q(referrals_count=count, id__lt=profile_id)
+
+
+def _inviters_after(key: InviterKey) -> Q:
+    count, profile_id = key
+    return Q(referrals_count__lt=count) | Q(referrals_count=count, id__gt=profile_id)
+
+
+def _encode_cursor(profile: UserProfile, position: int) -> str:
+    return encode_cursor([*_inviter_key(profile), position])
+
+
+def _decode_cursor(cursor: str) -> tuple[InviterKey, int]:
+    values = decode_cursor(cursor)
+    try:
+        count, profile_id, position = values
+        key = (int(count), int(profile_id))
+        position = int(position)
+    except (ValueError, TypeError) as exc:
+        raise CursorError("invalid cursor") from exc
+    if position < 0:
+        raise CursorError("invalid cursor")
+    return key, position
+
+
+def top_inviters_page(
+    *, cursor: str | None = None, limit: int
+) -> tuple[list[dict[str, Any]], str | None]:
+    """Keyset page of inviters after ``cursor`` and the cursor for the next page."""
+    qs = ranked_inviters().select_related("user")
+    position = 0
+    if cursor:
+        key, position = _decode_cursor(cursor)
+        qs = qs.filter(_inviters_after(key))
+
+    profiles = list(qs[: limit + 1])
+    has_more = len(profiles) > limit
+    profiles = profiles[:limit]
+
+    rows = [inviter_row(p, position + offset) for offset, p in enumerate(profiles, start=1)]
+    next_cursor = None
+    if has_more and profiles:
+        next_cursor = _encode_cursor(profiles[-1], position + len(profiles))
+    return rows, next_cursor
+
+
+def inviter_position(profile: UserProfile) -> int | None:
+    """1-based place of ``profile`` among inviters; ``None`` if it has no referrals."""
+    if profile.is_banned or profile.referrals_count <= 0:
+        return None
+    return ranked_inviters().filter(_inviters_before(_inviter_key(profile))).order_by().count() + 1
+
+
+_RECOUNT_SQL = f"""
+    UPDATE "{UserProfile._meta.db_table}" AS profile
+    SET "referrals_count" = COALESCE(invited.total, 0)
+    FROM "{UserProfile._meta.db_table}" AS target
+    LEFT JOIN (
+        SELECT "referred_by_id", COUNT(*) AS total
+        FROM "{UserProfile._meta.db_table}"
+        WHERE "referred_by_id" IS NOT NULL
+        GROUP BY "referred_by_id"
+    ) AS invited ON invited."referred_by_id" = target."id"
+    WHERE profile."id" = target."id"
+      AND profile."referrals_count" <> COALESCE(invited.total, 0)
+"""
+
+
+def recount_referrals() -> int:
+    """Rebuild every referral counter from ``referred_by``; returns fixed rows."""
+    with connection.cursor() as cursor:
+        cursor.execute(_RECOUNT_SQL)
+        fixed = cursor.rowcount
+    logger.info("[referrals] recounted, fixed=%s", fixed)
+    return fixed
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import itertools
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Failure, FailureRun, FailureRunReplayStatus
+from .bans import ban_profiles_in_failure
+from .runs import BONUS_BITS
+
+logger = logging.getLogger(__name__)
+
+# правила игры фронтенда (pages/Failure.tsx, components/failure/droplets)
+SPAWN_INTERVAL_MS = 500 / 3
+MAX_DROPS_ON_SCREEN = 48
+MULTIPLIER_WINDOW_MS = 10_000
+MULTIPLIERS = {"x2": 2, "x5": 5, "x10": 10}
+
+FLAG_SCORE = "score"
+FLAG_BUDGET = "budget"
+FLAG_TAP_RATE = "tap_rate"
+FLAG_TIMING = "timing"
+FLAG_BOMBS = "bombs"
+FLAG_BONUS = "bonus"
+FLAG_DURATION = "duration"
+REPLAY_FLAGS = (
+    FLAG_SCORE,
+    FLAG_BUDGET,
+    FLAG_TAP_RATE,
+    FLAG_TIMING,
+    FLAG_BOMBS,
+    FLAG_BONUS,
+    FLAG_DURATION,
+)
+
+_BONUSES = tuple(BONUS_BITS)
+_BONUS_INDEX = {bonus: index for index, bonus in enumerate(_BONUSES)}
+_BONUS_BIT_VALUES = np.array([BONUS_BITS[bonus] for bonus in _BONUSES], dtype=np.int64)
+_MULTIPLIER_COLUMNS = np.array([_BONUS_INDEX[bonus] for bonus in MULTIPLIERS])
+_MULTIPLIER_VALUES = np.array(list(MULTIPLIERS.values()), dtype=np.int64)
+_NO_BOMBS_COLUMN = _BONUS_INDEX["no_bombs"]
+
+
+@dataclass(frozen=True)
+class ReplayRun:
+    """What the verifier needs of one completed run."""
+
+    run_id: int
+    points: int
+    duration_seconds: int
+    failure_duration_seconds: int
+    bombs_max: int
+    bonuses: int
+    replay: dict | None
+
+
+@dataclass
+class VerifyStats:
+    checked: int = 0
+    passed: int = 0
+    flagged: int = 0
+    banned: int = 0
+
+
+def _events(runs: list[ReplayRun], key: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Times of ``replay[key]`` of all runs in one array, their run index and counts."""
+    lists = [(run.replay or {}).get(key) or () for run in runs]
+    counts = np.fromiter((len(items) for items in lists), dtype=np.int64, count=len(lists))
+    times = np.fromiter(
+        itertools.chain.from_iterable(lists), dtype=np.int64, count=int(counts.sum())
+    )
+    return times, np.repeat(np.arange(len(runs)), counts), counts
+
+
+def _any_per_run(owners: np.ndarray, mask: np.ndarray, size: int) -> np.ndarray:
+    return np.bincount(owners[mask], minlength=size) > 0
+
+
+def verify_replays(
+    runs: list[ReplayRun], *, max_taps_per_second: int, tolerance_ms: float
+) -> list[tuple[str, ...]]:
+    """Replay a batch of runs at once; the ``REPLAY_FLAGS`` each run violates.
+
+    Events of all runs are flattened into single arrays tagged with the run
+    index, so every check is a handful of NumPy operations over the batch.
+    The score is rebuilt the way the client counts it: every pop adds the
+    multiplier active at that moment and a bomb resets the score to zero.
+    Timer edges of the client are not exact, so a pop within
+    ``tolerance_ms`` of a multiplier window counts either way. Runs without
+    a replay only get the checks that need no events.
+    """
+    size = len(runs)
+    if not size:
+        return []
+    flags = np.zeros((size, len(REPLAY_FLAGS)), dtype=bool)
+    column = {flag: index for index, flag in enumerate(REPLAY_FLAGS)}
+
+    points = np.array([run.points for run in runs], dtype=np.int64)
+    claimed = np.array([run.duration_seconds for run in runs], dtype=np.int64)
+    duration = np.array([run.failure_duration_seconds for run in runs], dtype=np.int64)
+    bombs_max = np.array([run.bombs_max for run in runs], dtype=np.int64)
+    masks = np.array([run.bonuses for run in runs], dtype=np.int64)
+    has_replay = np.array([run.replay is not None for run in runs], dtype=bool)
+    limit_ms = duration * 1000 + tolerance_ms
+
+    bought = (masks[:, None] & _BONUS_BIT_VALUES[None, :]) != 0
+    activation = np.full((size, len(_BONUSES)), np.inf)
+    for index, run in enumerate(runs):
+        for bonus, moment in ((run.replay or {}).get("bonuses") or {}).items():
+            activation[index, _BONUS_INDEX[bonus]] = moment
+    used = np.isfinite(activation)
+
+    # без записи: больше очков, чем капель за сбой с учётом купленных множителей
+    # (за окно множителя можно лопнуть и капли, накопившиеся на экране до него)
+    spawns = np.floor(duration * 1000 / SPAWN_INTERVAL_MS) + 1
+    window_spawns = np.floor(MULTIPLIER_WINDOW_MS / SPAWN_INTERVAL_MS) + 1 + MAX_DROPS_ON_SCREEN
+    bonus_points = (bought[:, _MULTIPLIER_COLUMNS] * (_MULTIPLIER_VALUES - 1)).sum(axis=1)
+    flags[:, column[FLAG_BUDGET]] = points > spawns + window_spawns * bonus_points
+    flags[:, column[FLAG_DURATION]] = claimed > duration
+    flags[:, column[FLAG_BONUS]] = (used & ~bought).any(axis=1)
+
+    pops, pop_run, pop_counts = _events(runs, "pops")
+    bombs, bomb_run, bomb_counts = _events(runs, "bombs")
+    flags[:, column[FLAG_BUDGET]] |= pop_counts > spawns
+
+    late_bonus = used & (activation > limit_ms[:, None])
+    timing = late_bonus.any(axis=1)
+    timing |= _any_per_run(pop_run, (pops < 0) | (pops > limit_ms[pop_run]), size)
+    timing |= _any_per_run(bomb_run, (bombs < 0) | (bombs > limit_ms[bomb_run]), size)
+    same_run = pop_run[1:] == pop_run[:-1]
+    timing |= _any_per_run(pop_run[1:], same_run & (np.diff(pops) < 0), size)
+    flags[:, column[FLAG_TIMING]] = timing
+
+    last_bomb = np.full(size, -np.inf)
+    np.maximum.at(last_bomb, bomb_run, bombs)
+    flags[:, column[FLAG_BOMBS]] = (bomb_counts > bombs_max) | (
+        last_bomb > activation[:, _NO_BOMBS_COLUMN] + tolerance_ms
+    )
+
+    if pops.size:
+        run_starts = activation[:, _MULTIPLIER_COLUMNS]
+        # окно множителя кончается через 10 с или при включении следующего
+        following = np.where(
+            run_starts[:, None, :] > run_starts[:, :, None], run_starts[:, None, :], np.inf
+        ).min(axis=2)
+        run_ends = np.minimum(run_starts + MULTIPLIER_WINDOW_MS, following)
+
+        moments = pops.astype(np.float64)[:, None]
+        starts = run_starts[pop_run]
+        ends = run_ends[pop_run]
+        # новый множитель отменяет предыдущий: действует последний включённый
+        started = starts <= moments
+        latest = np.where(started, starts, -np.inf).argmax(axis=1)
+        latest_start = starts[np.arange(pops.size), latest][:, None]
+        surely_on = (
+            started.any(axis=1)[:, None]
+            & (moments >= latest_start + tolerance_ms)
+            & (moments < latest_start + MULTIPLIER_WINDOW_MS - tolerance_ms)
+        )[:, 0]
+        low = np.where(surely_on, _MULTIPLIER_VALUES[latest], 1)
+        maybe_on = (starts - tolerance_ms <= moments) & (moments < ends + tolerance_ms)
+        high = np.maximum(1, np.where(maybe_on, _MULTIPLIER_VALUES, 0).max(axis=1))
+
+        # бомба обнуляет счёт: считаются только капли после последней
+        after_bomb = pops > last_bomb[pop_run]
+        at_bomb = pops >= last_bomb[pop_run]
+        score_low = np.bincount(pop_run, weights=low * after_bomb, minlength=size)
+        score_high = np.bincount(pop_run, weights=high * at_bomb, minlength=size)
+        mismatch = (points < score_low) | (points > score_high)
+
+        # темп: сколько капель лопнуто за последнюю секунду до каждой
+        order = np.lexsort((pops, pop_run))
+        owners = pop_run[order]
+        base = min(int(pops.min()), 0)
+        keys = owners * (int(pops.max()) - base + 2000) + (pops[order] - base)
+        in_second = np.arange(pops.size) - np.searchsorted(keys, keys - 999) + 1
+        peak = np.zeros(size, dtype=np.int64)
+        np.maximum.at(peak, owners, in_second)
+        flags[:, column[FLAG_TAP_RATE]] = peak > max_taps_per_second
+    else:
+        mismatch = points > 0
+    flags[:, column[FLAG_SCORE]] = has_replay & mismatch
+
+    # проверки по событиям к забегам без записи не применяются
+    for flag in (FLAG_TAP_RATE, FLAG_TIMING, FLAG_BOMBS):
+        flags[:, column[flag]] &= has_replay
+
+    verdicts: list[tuple[str, ...]] = [()] * size
+    for index in np.flatnonzero(flags.any(axis=1)):
+        verdicts[index] = tuple(REPLAY_FLAGS[i] for i in np.flatnonzero(flags[index]))
+    return verdicts
+
+
+def _replay_run(run: FailureRun) -> ReplayRun:
+    return ReplayRun(
+        run_id=run.pk,
+        points=int(run.points or 0),
+        duration_seconds=int(run.duration_seconds or 0),
+        failure_duration_seconds=int(run.failure.duration_seconds or 0),
+        bombs_max=int(run.failure.bombs_max_count or 0),
+        bonuses=run.bonuses,
+        replay=run.replay,
+    )
+
+
+def verify_pending_replays(
+    *, batch_size: int = 2000, auto_ban: bool | None = None
+) -> VerifyStats:
+    """Verify one batch of queued runs and record the verdicts.
+
+    With ``auto_ban`` (default: ``FAILURE_REPLAY_AUTO_BAN``) the owners of
+    flagged runs are banned in the failure after the verdicts are committed,
+    with one ``ban_profiles_in_failure`` call (and one ranking refresh) per
+    failure. Several workers may run side by side.
+    """
+    if auto_ban is None:
+        auto_ban = bool(getattr(settings, "FAILURE_REPLAY_AUTO_BAN", False))
+    with transaction.atomic():
+        runs = list(
+            FailureRun.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(replay_status=FailureRunReplayStatus.PENDING)
+            .select_related("failure")
+            .only(
+                "id",
+                "profile_id",
+                "failure_id",
+                "points",
+                "duration_seconds",
+                "bonuses",
+                "replay",
+                "failure__duration_seconds",
+                "failure__bombs_max_count",
+            )
+            .order_by("id")[:batch_size]
+        )
+        stats = VerifyStats(checked=len(runs))
+        if not runs:
+            return stats
+
+        verdicts = verify_replays(
+            [_replay_run(run) for run in runs],
+            max_taps_per_second=int(getattr(settings, "FAILURE_REPLAY_MAX_TAPS_PER_SECOND", 20)),
+            tolerance_ms=float(getattr(settings, "FAILURE_REPLAY_TOLERANCE_MS", 250)),
+        )
+        now = timezone.now()
+        passed: list[int] = []
+        flagged: list[FailureRun] = []
+        for run, run_flags in zip(runs, verdicts):
+            if not run_flags:
+                passed.append(run.pk)
+                continue
+            run.replay_status = FailureRunReplayStatus.FLAGGED
+            run.replay_flags = ",".join(run_flags)
+            run.updated_at = now
+            flagged.append(run)
+        if passed:
+            FailureRun.objects.filter(pk__in=passed).update(
+                replay_status=FailureRunReplayStatus.PASSED, updated_at=now
+            )
+        if flagged:
+            FailureRun.objects.bulk_update(
+                flagged, ["replay_status", "replay_flags", "updated_at"]
+            )
+
+    if auto_ban and flagged:
+        # баны — после коммита вердиктов, вне транзакции со строками забегов под
+        # блокировкой: одна пачка и один пересчёт рейтинга на сбой
+        failures: dict[int, Failure] = {}
+        profiles: dict[int, set[int]] = defaultdict(set)
+        flags: dict[int, set[str]] = defaultdict(set)
+        for run in flagged:
+            failures[run.failure_id] = run.failure
+            profiles[run.failure_id].add(run.profile_id)
+            flags[run.failure_id].update(run.replay_flags.split(","))
+        for failure_id, failure in failures.items():
+            result = ban_profiles_in_failure(
+                failure,
+                profiles[failure_id],
+                reason=f"Проверка записи забега: {','.join(sorted(flags[failure_id]))}",
+            )
+            stats.banned += result.created
+
+    stats.passed = len(passed)
+    stats.flagged = len(flagged)
+    if flagged:
+        logger.warning(
+            "[replays] flagged %s of %s runs, banned %s",
+            stats.flagged,
+            stats.checked,
+            stats.banned,
+        )
+    return stats
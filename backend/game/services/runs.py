@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import logging
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from django.conf import settings
+from django.db import connection
+
+from ..models import (
+    Failure,
+    FailureBonusType,
+    FailureRun,
+    FailureRunReplayStatus,
+    FailureRunStatus,
+    UserProfile,
+)
+
+logger = logging.getLogger(__name__)
+
+# порядок только дополняется: биты уже сохранены в открытых забегах
+BONUS_BITS: dict[str, int] = {
+    bonus: 1 << index for index, bonus in enumerate(FailureBonusType.values)
+}
+
+_RUNS_TABLE = f'"{FailureRun._meta.db_table}"'
+
+
+def bonuses_from_mask(mask: int) -> list[str]:
+    return [bonus for bonus, bit in BONUS_BITS.items() if mask & bit]
+
+
+def run_token_required() -> bool:
+    """Whether bonus purchase and completion refuse requests without ``run_token``."""
+    return bool(getattr(settings, "FAILURE_RUN_TOKEN_REQUIRED", False))
+
+
+def open_run(profile: UserProfile, failure: Failure, now: datetime) -> FailureRun:
+    """Start a run; it can be completed until duration + ``FAILURE_RUN_GRACE_SECONDS``."""
+    grace = float(getattr(settings, "FAILURE_RUN_GRACE_SECONDS", 60))
+    return FailureRun.objects.create(
+        profile=profile,
+        failure=failure,
+        expires_at=now + timedelta(seconds=int(failure.duration_seconds or 0) + grace),
+    )
+
+
+def _where(
+    profile_id: int, failure_id: int, token: UUID | None, now: datetime
+) -> tuple[str, list]:
+    """WHERE for the caller's open run: by token, otherwise the latest open one.
+
+    The fallback is a temporary path for clients released before run tokens;
+    views turn it off with ``FAILURE_RUN_TOKEN_REQUIRED``.
+    """
+    open_run_sql = (
+        '"profile_id" = %s AND "failure_id" = %s AND "status" = %s AND "expires_at" > %s'
+    )
+    params = [profile_id, failure_id, FailureRunStatus.OPEN, now]
+    if token is not None:
+        return f'"token" = %s AND {open_run_sql}', [token, *params]
+    # клиент без токена (старая версия фронтенда), пока FAILURE_RUN_TOKEN_REQUIRED выключен
+    return (
+        f'"id" = (SELECT "id" FROM {_RUNS_TABLE} WHERE {open_run_sql} '
+        'ORDER BY "id" DESC LIMIT 1)',
+        params,
+    )
+
+
+def buy_run_bonus(
+    profile_id: int,
+    failure_id: int,
+    token: UUID | None,
+    bonus_type: str,
+    limit: int,
+    now: datetime,
+) -> list[str] | None:
+    """Add ``bonus_type`` to the open run with one conditional UPDATE.
+
+    Returns the bonuses of the run, or ``None`` if there is no open run, the
+    bonus is already bought or the run reached ``limit``.
+    """
+    bit = BONUS_BITS[bonus_type]
+    where, params = _where(profile_id, failure_id, token, now)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {_RUNS_TABLE} SET "bonuses" = "bonuses" | %s, '
+            '"bonus_count" = "bonus_count" + 1, "updated_at" = %s '
+            f'WHERE {where} AND "bonuses" & %s = 0 AND "bonus_count" < %s '
+            'RETURNING "bonuses"',
+            [bit, now, *params, bit, limit],
+        )
+        row = cursor.fetchone()
+    return bonuses_from_mask(row[0]) if row else None
+
+
+def find_open_run(
+    profile_id: int, failure_id: int, token: UUID | None, now: datetime
+) -> FailureRun | None:
+    runs = FailureRun.objects.filter(
+        profile_id=profile_id,
+        failure_id=failure_id,
+        status=FailureRunStatus.OPEN,
+        expires_at__gt=now,
+    )
+    if token is not None:
+        runs = runs.filter(token=token)
+    return runs.order_by("-id").first()
+
+
+def close_run(
+    profile_id: int,
+    failure_id: int,
+    token: UUID | None,
+    now: datetime,
+    *,
+    points: int | None = None,
+    duration: int | None = None,
+    replay: dict | None = None,
+) -> list[str] | None:
+    """Complete the open run with one conditional UPDATE; its bonuses or ``None``.
+
+    The claimed result and the client's ``replay`` are kept on the run and
+    queued for ``services.replays``.
+    """
+    where, params = _where(profile_id, failure_id, token, now)
+    replay_status = (
+        FailureRunReplayStatus.PENDING if points is not None else FailureRunReplayStatus.NONE
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {_RUNS_TABLE} SET "status" = %s, "finished_at" = %s, "updated_at" = %s, '
+            '"points" = %s, "duration_seconds" = %s, "replay" = %s::jsonb, "replay_status" = %s '
+            f'WHERE {where} RETURNING "bonuses"',
+            [
+                FailureRunStatus.COMPLETED,
+                now,
+                now,
+                points,
+                duration,
+                json.dumps(replay) if replay is not None else None,
+                replay_status,
+                *params,
+            ],
+        )
+        row = cursor.fetchone()
+    return bonuses_from_mask(row[0]) if row else None
+
+
+def expire_runs(now: datetime, batch_size: int = 5000) -> int:
+    """Mark abandoned runs as expired in batches; returns the number of runs."""
+    total = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {_RUNS_TABLE} SET "status" = %s, "updated_at" = %s '
+                f'WHERE "id" IN (SELECT "id" FROM {_RUNS_TABLE} '
+                '  WHERE "status" = %s AND "expires_at" <= %s LIMIT %s)',
+                [FailureRunStatus.EXPIRED, now, FailureRunStatus.OPEN, now, batch_size],
+            )
+            updated = cursor.rowcount
+        total += updated
+        if updated < batch_size:
+            break
+    if total:
+        logger.info("[runs] expired=%s", total)
+    return total
+
+
+def purge_runs(before: datetime, batch_size: int = 5000) -> int:
+    """Delete finished runs last touched before ``before``; returns the number of runs.
+
+    Runs still waiting for replay verification are kept.
+    """
+    total = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {_RUNS_TABLE} WHERE "id" IN (SELECT "id" FROM {_RUNS_TABLE} '
+                '  WHERE "status" <> %s AND "replay_status" <> %s AND "updated_at" < %s '
+                "  LIMIT %s)",
+                [FailureRunStatus.OPEN, FailureRunReplayStatus.PENDING, before, batch_size],
+            )
+            deleted = cursor.rowcount
+        total += deleted
+        if deleted < batch_size:
+            break
+    if total:
+        logger.info("[runs] purged=%s", total)
+    return total
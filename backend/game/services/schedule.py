@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Failure
+
+
+class FailureSchedule:
+    """Per-process copy of the failures that have not ended yet.
+
+    Answers "which failure is active now" without a query. The copy is
+    reloaded at the nearest ``start_time``/``end_time`` boundary, after a
+    local ``Failure`` save/delete (see signals) and at the latest every
+    ``FAILURE_SCHEDULE_TTL_SECONDS`` for edits made by other workers.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._failures: list[tuple[int, datetime | None, datetime | None]] = []
+        self._valid_until: datetime | None = None
+        self._expires_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expires_at = 0.0
+
+    def _expired(self, now: datetime) -> bool:
+        if time.monotonic() >= self._expires_at:
+            return True
+        return self._valid_until is not None and now >= self._valid_until
+
+    def _load(self, now: datetime) -> None:
+        # порядок как в прежнем запросе: NULL start_time в Postgres идёт первым
+        self._failures = list(
+            Failure.objects.filter(Q(end_time__isnull=True) | Q(end_time__gt=now))
+            .order_by("-start_time", "-created_at")
+            .values_list("id", "start_time", "end_time")
+        )
+        boundaries = [
+            moment
+            for _, start, end in self._failures
+            for moment in (start, end)
+            if moment is not None and moment > now
+        ]
+        self._valid_until = min(boundaries, default=None)
+        ttl = float(getattr(settings, "FAILURE_SCHEDULE_TTL_SECONDS", 30))
+        self._expires_at = time.monotonic() + ttl
+
+    def active_failure_id(self, now: datetime | None = None) -> int | None:
+        now = now or timezone.now()
+        with self._lock:
+            if self._expired(now):
+                self._load(now)
+            for failure_id, start, end in self._failures:
+                if (start is None or start <= now) and (end is None or end > now):
+                    return failure_id
+        return None
+
+
+_schedule = FailureSchedule()
+
+
+def active_failure_id(now: datetime | None = None) -> int | None:
+    """Id of the currently active failure from the per-process schedule."""
+    return _schedule.active_failure_id(now)
+
+
+def invalidate_failure_schedule() -> None:
+    _schedule.invalidate()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .scores import PendingScore, record_failure_scores
+
+logger = logging.getLogger(__name__)
+
+
+def score_write_behind_enabled() -> bool:
+    return bool(getattr(settings, "FAILURE_SCORE_WRITE_BEHIND", False))
+
+
+class ScoreBuffer:
+    """Per-process write-behind buffer of failure completions.
+
+    Completions are kept in memory (only the best one per profile and
+    failure) and written by a background thread with one batched upsert every
+    ``FAILURE_SCORE_FLUSH_SECONDS``. A crashed worker loses at most that much
+    time worth of results and never more than ``FAILURE_SCORE_BUFFER_MAX``
+    of them: a request that fills the buffer flushes it itself.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: dict[tuple[int, int], PendingScore] = {}
+        self._pid: int | None = None
+
+    def add(self, score: PendingScore) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._keep_best(score)
+            size = len(self._pending)
+        if size >= int(getattr(settings, "FAILURE_SCORE_BUFFER_MAX", 1000)):
+            self.flush()
+
+    def _keep_best(self, score: PendingScore) -> None:
+        key = (score.profile_id, score.failure_id)
+        current = self._pending.get(key)
+        if current is None or score.points > current.points:
+            self._pending[key] = score
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of results sent."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = list(self._pending.values()), {}
+            if not batch:
+                return 0
+            try:
+                with transaction.atomic():
+                    record_failure_scores(batch)
+            except Exception as exc:  # pragma: no cover - DB failure path
+                logger.warning("[scores] flush of %s results failed: %s", len(batch), exc)
+                # вернём в буфер — уйдут следующей пачкой
+                with self._lock:
+                    for score in batch:
+                        self._keep_best(score)
+                return 0
+            return len(batch)
+
+    def _ensure_started(self) -> None:
+        # после fork поток родителя в дочернем процессе не существует
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._pending = {}
+        threading.Thread(target=self._run, name="score-buffer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run(self) -> None:
+        every = float(getattr(settings, "FAILURE_SCORE_FLUSH_SECONDS", 0.25))
+        while True:
+            time.sleep(every)
+            close_old_connections()
+            self.flush()
+
+
+_buffer = ScoreBuffer()
+
+
+def buffer_failure_score(
+    profile_id: int, failure_id: int, points: int, duration: int, earned_at: datetime
+) -> None:
+    """Queue a completion for the next batched write (write-behind mode)."""
+    _buffer.add(PendingScore(profile_id, failure_id, points, duration, earned_at))
+
+
+def flush_failure_scores() -> int:
+    return _buffer.flush()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Failure, FailureBan, ScoreEntry, UserProfile
+from .histogram import record_scores_in_histogram
+from .live import notify_leaderboard_changed
+from .rank_index import record_in_rank_index
+from .seasons import record_season_delta
+from .standings import failure_has_ended, mark_standings_stale
+
+
+@dataclass
+class ScoreResult:
+    entry: ScoreEntry
+    created: bool
+    improved: bool
+    previous_points: int
+
+
+@dataclass(frozen=True)
+class PendingScore:
+    profile_id: int
+    failure_id: int
+    points: int
+    duration_seconds: int
+    earned_at: datetime
+
+
+_SCORES = ScoreEntry._meta.db_table
+_RETURNED_FIELDS = [
+    "id",
+    "profile_id",
+    "failure_id",
+    "points",
+    "duration_seconds",
+    "earned_at",
+    "is_banned",
+]
+
+# Лучший результат — одним INSERT ... ON CONFLICT: строка обновляется только при
+# улучшении, RETURNING отдаёт только изменённые строки и их прежние очки.
+# Прежние очки читаются снимком запроса, поэтому профили должны быть заблокированы
+# до него (см. record_failure_score/record_failure_scores).
+_UPSERT_SQL = f"""
+    WITH incoming AS (
+        SELECT *
+        FROM unnest(
+            %s::bigint[], %s::bigint[], %s::integer[], %s::integer[], %s::timestamptz[]
+        ) AS t ("profile_id", "failure_id", "points", "duration_seconds", "earned_at")
+    ),
+    previous AS (
+        SELECT s."profile_id", s."failure_id", s."points"
+        FROM "{_SCORES}" AS s
+        JOIN incoming AS i
+            ON s."profile_id" = i."profile_id" AND s."failure_id" = i."failure_id"
+    )
+    INSERT INTO "{_SCORES}" AS score (
+        "profile_id", "failure_id", "points", "duration_seconds", "earned_at",
+        "is_banned", "created_at", "updated_at"
+    )
+    SELECT
+        i."profile_id", i."failure_id", i."points", i."duration_seconds", i."earned_at",
+        p."is_banned" OR EXISTS (
+            SELECT 1 FROM "{FailureBan._meta.db_table}" AS b
+            WHERE b."profile_id" = i."profile_id" AND b."failure_id" = i."failure_id"
+        ),
+        NOW(), NOW()
+    FROM incoming AS i
+    JOIN "{UserProfile._meta.db_table}" AS p ON p."id" = i."profile_id"
+    JOIN "{Failure._meta.db_table}" AS f ON f."id" = i."failure_id"
+    ORDER BY i."failure_id", i."profile_id"
+    ON CONFLICT ("profile_id", "failure_id") DO UPDATE SET
+        "points" = EXCLUDED."points",
+        "duration_seconds" = EXCLUDED."duration_seconds",
+        "earned_at" = EXCLUDED."earned_at",
+        "updated_at" = EXCLUDED."updated_at"
+    WHERE score."points" < EXCLUDED."points"
+    RETURNING
+        {", ".join(f'score."{name}"' for name in _RETURNED_FIELDS)},
+        (
+            SELECT pr."points" FROM previous AS pr
+            WHERE pr."profile_id" = score."profile_id" AND pr."failure_id" = score."failure_id"
+        )
+"""
+
+
+def _upsert_scores(scores: list[PendingScore]) -> list[ScoreResult]:
+    """Write the improving ``scores`` (unique per profile and failure)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _UPSERT_SQL,
+            [
+                [s.profile_id for s in scores],
+                [s.failure_id for s in scores],
+                [s.points for s in scores],
+                [s.duration_seconds for s in scores],
+                [s.earned_at for s in scores],
+            ],
+        )
+        rows = cursor.fetchall()
+    results = []
+    for *values, previous_points in rows:
+        entry = ScoreEntry.from_db(connection.alias, _RETURNED_FIELDS, values)
+        results.append(
+            ScoreResult(
+                entry=entry,
+                created=previous_points is None,
+                improved=True,
+                previous_points=int(previous_points or 0),
+            )
+        )
+    return results
+
+
+def record_failure_score(
+    profile: UserProfile, failure: Failure, points: int, duration: int
+) -> ScoreResult | None:
+    """Keep the best result of ``profile`` in ``failure``.
+
+    Must run inside a transaction that already holds the lock on the profile
+    row; derived structures are updated after commit. Returns ``None`` when
+    the profile or the failure has been deleted in the meantime.
+    """
+    pending = PendingScore(profile.id, failure.id, points, duration, timezone.now())
+    results = _upsert_scores([pending])
+    if results:
+        result = results[0]
+    else:
+        # результат не лучше прежнего: строку не трогали, читаем её для ответа;
+        # строки нет, если upsert ничего не вставил из-за удалённого сбоя или профиля
+        entry = ScoreEntry.objects.filter(profile=profile, failure=failure).first()
+        if entry is None:
+            return None
+        result = ScoreResult(
+            entry=entry, created=False, improved=False, previous_points=int(entry.points or 0)
+        )
+    _apply_improvements({failure.id: failure}, [result])
+    return result
+
+
+def record_failure_scores(scores: list[PendingScore]) -> list[ScoreResult]:
+    """Write a batch of results with one upsert; returns the improved ones.
+
+    Must run inside a transaction. Only the best result per profile and
+    failure is kept; results of deleted profiles or failures are dropped.
+    """
+    best: dict[tuple[int, int], PendingScore] = {}
+    for score in scores:
+        key = (score.profile_id, score.failure_id)
+        if key not in best or score.points > best[key].points:
+            best[key] = score
+    if not best:
+        return []
+
+    # как и при одиночном завершении: прежние очки читаются под блокировкой профилей
+    list(
+        UserProfile.objects.select_for_update()
+        .filter(pk__in={profile_id for profile_id, _ in best})
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    failures = Failure.objects.in_bulk({failure_id for _, failure_id in best})
+    results = _upsert_scores(list(best.values()))
+    _apply_improvements(failures, results)
+    return results
+
+
+def _apply_improvements(failures: dict[int, Failure], results: list[ScoreResult]) -> None:
+    # результат забаненного игрока сохраняется, но в рейтинг и производные таблицы не попадает
+    improved = [r for r in results if r.improved and not r.entry.is_banned]
+    if not improved:
+        return
+    for result in improved:
+        entry = result.entry
+        season_id = failures[entry.failure_id].season_id
+        if season_id:
+            record_season_delta(
+                season_id,
+                entry.profile_id,
+                result.previous_points,
+                int(entry.points or 0),
+                entry.earned_at,
+            )
+    # общие строки гистограммы пишет буфер воркера после COMMIT, не эта транзакция
+    moves = [(r.entry.failure_id, r.previous_points, int(r.entry.points or 0)) for r in improved]
+    entries = [r.entry for r in improved]
+    transaction.on_commit(lambda: _after_scores_improved(failures, entries, moves))
+
+
+def _after_scores_improved(
+    failures: dict[int, Failure],
+    entries: list[ScoreEntry],
+    moves: list[tuple[int, int, int]],
+) -> None:
+    record_scores_in_histogram(moves)
+    by_failure: dict[int, list[ScoreEntry]] = defaultdict(list)
+    for entry in entries:
+        by_failure[entry.failure_id].append(entry)
+    for failure_id, failure_entries in by_failure.items():
+        failure = failures[failure_id]
+        for entry in failure_entries:
+            record_in_rank_index(
+                failure, entry.id, entry.profile_id, int(entry.points or 0), entry.earned_at
+            )
+        notify_leaderboard_changed(failure_id)
+        if failure_has_ended(failure):
+            # поздний результат: если итоги уже зафиксированы, их пересоберёт задача
+            # freeze_failure_standings, а не этот запрос
+            mark_standings_stale(failure_id)
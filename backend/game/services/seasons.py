@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, OuterRef, QuerySet, Subquery, Sum
+from django.utils import timezone
+
+from ..models import (
+    Failure,
+    FailureStanding,
+    ScoreEntry,
+    ScoreEntryArchive,
+    Season,
+    SeasonScore,
+)
+from .leaderboard import RANK_ORDERING, LeaderboardRow, leaderboard_row
+
+logger = logging.getLogger(__name__)
+
+
+def current_season(now: datetime | None = None) -> Season | None:
+    """Running season, otherwise the most recent one that has started."""
+    now = now or timezone.now()
+    started = Season.objects.filter(start_time__lte=now).order_by("-start_time")
+    return started.filter(end_time__gt=now).first() or started.first()
+
+
+def ranked_season_scores(season: Season) -> QuerySet[SeasonScore]:
+    """Season totals in leaderboard order (same keys as ``ranked_scores``)."""
+    return SeasonScore.objects.filter(season=season, points__gt=0).order_by(*RANK_ORDERING)
+
+
+def season_row(score: SeasonScore, position: int) -> LeaderboardRow:
+    row = leaderboard_row(score, position)
+    row["failures_played"] = score.failures_played
+    row["best_rank"] = score.best_rank
+    return row
+
+
+_DELTA_SQL = f"""
+    INSERT INTO "{SeasonScore._meta.db_table}"
+        ("season_id", "profile_id", "points", "failures_played", "earned_at",
+         "created_at", "updated_at")
+    VALUES (%s, %s, %s, %s, %s, NOW(), NOW())
+    ON CONFLICT ("season_id", "profile_id")
+    DO UPDATE SET
+        "points" = "{SeasonScore._meta.db_table}"."points" + EXCLUDED."points",
+        "failures_played" =
+            "{SeasonScore._meta.db_table}"."failures_played" + EXCLUDED."failures_played",
+        "earned_at" = GREATEST("{SeasonScore._meta.db_table}"."earned_at", EXCLUDED."earned_at"),
+        "updated_at" = NOW()
+"""
+
+
+def record_season_delta(
+    season_id: int, profile_id: int, previous_points: int, points: int, earned_at: datetime
+) -> None:
+    """Add the improvement of one failure score to the season total.
+
+    Runs in the transaction that writes the score.
+    """
+    if points <= previous_points or points <= 0:
+        return
+    played = 1 if previous_points <= 0 else 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _DELTA_SQL,
+            [season_id, profile_id, points - max(previous_points, 0), played, earned_at],
+        )
+
+
+def refresh_best_ranks(failure: Failure) -> int:
+    """Recompute ``best_rank`` of everyone placed in the frozen standings of ``failure``."""
+    if not failure.season_id:
+        return 0
+    best = (
+        FailureStanding.objects.filter(
+            failure__season_id=failure.season_id, profile_id=OuterRef("profile_id")
+        )
+        .values("profile_id")
+        .annotate(best=Min("position"))
+        .values("best")
+    )
+    return SeasonScore.objects.filter(
+        season_id=failure.season_id,
+        profile_id__in=FailureStanding.objects.filter(failure=failure).values("profile_id"),
+    ).update(best_rank=Subquery(best))
+
+
+def _season_totals(season_id: int, profile_id: int | None = None) -> list[dict]:
+    """Totals per profile over live and archived scores of the season's failures."""
+    totals: dict[int, dict] = {}
+    for model in (ScoreEntry, ScoreEntryArchive):
+        scores = model.objects.filter(
+            failure__season_id=season_id, points__gt=0, is_banned=False
+        )
+        if profile_id is not None:
+            scores = scores.filter(profile_id=profile_id)
+        rows = (
+            scores.values("profile_id")
+            .annotate(total=Sum("points"), played=Count("id"), last=Max("earned_at"))
+            .order_by()
+        )
+        for row in rows.iterator():
+            current = totals.setdefault(row["profile_id"], row)
+            if current is not row:
+                current["total"] += row["total"]
+                current["played"] += row["played"]
+                current["last"] = max(current["last"], row["last"])
+    return list(totals.values())
+
+
+def _season_best_ranks(season_id: int) -> QuerySet:
+    return (
+        FailureStanding.objects.filter(failure__season_id=season_id)
+        .values("profile_id")
+        .annotate(best=Min("position"))
+        .order_by()
+    )
+
+
+def recompute_season_profile(season_id: int, profile_id: int) -> None:
+    """Rebuild one season row from scratch, e.g. after a ban changed."""
+    totals = next(iter(_season_totals(season_id, profile_id)), None)
+    # order_by нужен first() на агрегирующем queryset
+    best = (
+        _season_best_ranks(season_id).filter(profile_id=profile_id).order_by("profile_id").first()
+    )
+    with transaction.atomic():
+        if totals is None:
+            SeasonScore.objects.filter(season_id=season_id, profile_id=profile_id).delete()
+            return
+        SeasonScore.objects.update_or_create(
+            season_id=season_id,
+            profile_id=profile_id,
+            defaults={
+                "points": totals["total"],
+                "failures_played": totals["played"],
+                "earned_at": totals["last"],
+                "best_rank": best["best"] if best else None,
+            },
+        )
+
+
+def recompute_season(season: Season) -> int:
+    """Rebuild all totals of ``season`` from its scores; returns the number of rows."""
+    best_ranks = {
+        row["profile_id"]: row["best"] for row in _season_best_ranks(season.id).iterator()
+    }
+    rows = [
+        SeasonScore(
+            season=season,
+            profile_id=row["profile_id"],
+            points=row["total"],
+            failures_played=row["played"],
+            earned_at=row["last"],
+            best_rank=best_ranks.get(row["profile_id"]),
+        )
+        for row in _season_totals(season.id)
+    ]
+    with transaction.atomic():
+        SeasonScore.objects.filter(season=season).delete()
+        SeasonScore.objects.bulk_create(rows, batch_size=2000)
+    logger.info("[seasons] recomputed season=%s rows=%s", season.pk, len(rows))
+    return len(rows)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from ..models import Failure, FailureStanding, UserProfile
+from .leaderboard import (
+    LeaderboardRow,
+    decode_score_cursor,
+    encode_score_cursor,
+    leaderboard_row,
+    ranked_scores_with_archive,
+)
+from .seasons import refresh_best_ranks
+
+logger = logging.getLogger(__name__)
+
+STANDINGS_BATCH_SIZE = 2000
+
+
+def failure_has_ended(failure: Failure, now: datetime | None = None) -> bool:
+    now = now or timezone.now()
+    return bool(failure.end_time and failure.end_time <= now)
+
+
+def standings_final_at(failure: Failure) -> datetime | None:
+    """When the last run of ``failure`` can no longer complete: end + duration + grace."""
+    if not failure.end_time:
+        return None
+    grace = float(getattr(settings, "FAILURE_RUN_GRACE_SECONDS", 60))
+    return failure.end_time + timedelta(seconds=int(failure.duration_seconds or 0) + grace)
+
+
+def standings_are_final(failure: Failure, now: datetime | None = None) -> bool:
+    final_at = standings_final_at(failure)
+    return bool(final_at and final_at <= (now or timezone.now()))
+
+
+def freeze_standings(failure: Failure, *, force: bool = False) -> int:
+    """Write the final ranking of an ended failure into ``FailureStanding``.
+
+    The snapshot is only taken once no run can complete any more
+    (``standings_are_final``); until then the live ranking is served. Returns
+    the number of rows written; ``0`` when the results are not final yet or the
+    snapshot already exists (unless ``force`` is set).
+    """
+    with transaction.atomic():
+        locked = Failure.objects.select_for_update().get(pk=failure.pk)
+        if not standings_are_final(locked):
+            return 0
+        if locked.standings_frozen_at and not force:
+            failure.standings_frozen_at = locked.standings_frozen_at
+            return 0
+        # отметка mark_standings_stale, пришедшая после этого момента, не снимается
+        started_at = timezone.now()
+
+        FailureStanding.objects.filter(failure=locked).delete()
+
+        rows = ranked_scores_with_archive(locked)
+        batch: list[FailureStanding] = []
+        total = 0
+        for position, (profile_id, points, earned_at, _) in enumerate(
+            rows.iterator(chunk_size=STANDINGS_BATCH_SIZE), start=1
+        ):
+            batch.append(
+                FailureStanding(
+                    failure=locked,
+                    position=position,
+                    profile_id=profile_id,
+                    points=points,
+                    earned_at=earned_at,
+                )
+            )
+            if len(batch) >= STANDINGS_BATCH_SIZE:
+                FailureStanding.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            FailureStanding.objects.bulk_create(batch)
+            total += len(batch)
+
+        frozen_at = timezone.now()
+        Failure.objects.filter(pk=locked.pk).update(standings_frozen_at=frozen_at)
+        Failure.objects.filter(pk=locked.pk, standings_stale_at__lte=started_at).update(
+            standings_stale_at=None
+        )
+        refresh_best_ranks(locked)
+
+    failure.standings_frozen_at = frozen_at
+    failure.standings_stale_at = None
+    logger.info("[standings] frozen failure=%s rows=%s", failure.pk, total)
+    return total
+
+
+def ensure_standings(failure: Failure) -> bool:
+    """True when ``failure`` has its snapshot, building it if the results are final.
+
+    For jobs (prizes, archiving); requests read ``standings_frozen_at`` and
+    never build the snapshot themselves.
+    """
+    if failure.standings_frozen_at:
+        return True
+    if not standings_are_final(failure):
+        return False
+    freeze_standings(failure)
+    return failure.standings_frozen_at is not None
+
+
+def refreeze_standings(failure_id: int) -> None:
+    """Rebuild an existing snapshot, e.g. after a ban was added post factum."""
+    failure = Failure.objects.filter(pk=failure_id).first()
+    if failure is None or not failure.standings_frozen_at:
+        return
+    freeze_standings(failure, force=True)
+
+
+def mark_standings_stale(failure_id: int) -> bool:
+    """Flag the snapshot of ``failure_id`` for a rebuild by ``freeze_failure_standings``.
+
+    One UPDATE instead of a rebuild: a result that arrives after the snapshot
+    (e.g. flushed late by the write-behind buffer) must not rebuild the whole
+    table on the request path. False when there is no snapshot yet.
+    """
+    return bool(
+        Failure.objects.filter(pk=failure_id, standings_frozen_at__isnull=False).update(
+            standings_stale_at=timezone.now()
+        )
+    )
+
+
+def standings(failure: Failure) -> QuerySet[FailureStanding]:
+    return FailureStanding.objects.filter(failure=failure).order_by("position")
+
+
+def standing_for_profile(failure: Failure, profile: UserProfile) -> FailureStanding | None:
+    return (
+        FailureStanding.objects.filter(failure=failure, profile=profile)
+        .select_related("profile__user")
+        .first()
+    )
+
+
+def standings_page(
+    failure: Failure, *, cursor: str | None, limit: int
+) -> tuple[list[LeaderboardRow], str | None]:
+    """Same contract as ``leaderboard_page`` served by a range read on position."""
+    after = decode_score_cursor(cursor)[1] if cursor else 0
+    items = list(
+        standings(failure)
+        .filter(position__gt=after)
+        .select_related("profile__user")[: limit + 1]
+    )
+    has_more = len(items) > limit
+    items = items[:limit]
+    rows = [leaderboard_row(item, item.position) for item in items]
+    next_cursor = None
+    if has_more and items:
+        next_cursor = encode_score_cursor(items[-1], items[-1].position)
+    return rows, next_cursor
+
+
+def standings_around(
+    failure: Failure, standing: FailureStanding, size: int
+) -> list[LeaderboardRow]:
+    items = (
+        standings(failure)
+        .filter(
+            position__gte=standing.position - size,
+            position__lte=standing.position + size,
+        )
+        .select_related("profile__user")
+    )
+    return [leaderboard_row(item, item.position) for item in items]
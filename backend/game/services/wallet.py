@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from django.db import connection
+from django.utils import timezone
+
+from ..models import UserProfile
+
+_TABLE = UserProfile._meta.db_table
+
+_CREDIT_SQL = f"""
+    UPDATE "{_TABLE}" SET "balance" = "balance" + %s, "updated_at" = %s
+    WHERE "id" = %s
+    RETURNING "balance"
+"""
+# списание проходит, только если хватает монет: баланс не уходит в минус
+# и без предварительной блокировки строки профиля
+_DEBIT_SQL = f"""
+    UPDATE "{_TABLE}" SET "balance" = "balance" - %s, "updated_at" = %s
+    WHERE "id" = %s AND "balance" >= %s
+    RETURNING "balance"
+"""
+
+
+class InsufficientBalanceError(ValueError):
+    """Raised by ``debit`` when the profile has fewer coins than required."""
+
+    def __init__(self, balance: int, required: int) -> None:
+        super().__init__(f"balance {balance} is less than {required}")
+        self.balance = balance
+        self.required = required
+
+
+def _check_amount(amount: int) -> int:
+    amount = int(amount)
+    if amount < 0:
+        raise ValueError(f"amount must not be negative, got {amount}")
+    return amount
+
+
+def credit(profile: UserProfile, amount: int, *, now: datetime | None = None) -> int:
+    """Add ``amount`` coins to ``profile`` in one statement; returns the new balance.
+
+    ``profile.balance`` is set to the returned value, so callers need no
+    ``refresh_from_db``.
+    """
+    amount = _check_amount(amount)
+    with connection.cursor() as cursor:
+        cursor.execute(_CREDIT_SQL, [amount, now or timezone.now(), profile.pk])
+        row = cursor.fetchone()
+    if row is None:
+        raise UserProfile.DoesNotExist(f"profile {profile.pk} does not exist")
+    profile.balance = row[0]
+    return profile.balance
+
+
+def debit(profile: UserProfile, amount: int, *, now: datetime | None = None) -> int:
+    """Take ``amount`` coins from ``profile`` in one statement; returns the new balance.
+
+    The balance check is part of the UPDATE, so concurrent spends cannot
+    overdraw the profile. Raises ``InsufficientBalanceError`` (with the
+    current balance) when there are not enough coins; nothing is charged then.
+    """
+    amount = _check_amount(amount)
+    with connection.cursor() as cursor:
+        cursor.execute(_DEBIT_SQL, [amount, now or timezone.now(), profile.pk, amount])
+        row = cursor.fetchone()
+    if row is None:
+        balance = (
+            UserProfile.objects.filter(pk=profile.pk).values_list("balance", flat=True).first()
+        )
+        if balance is None:
+            raise UserProfile.DoesNotExist(f"profile {profile.pk} does not exist")
+        profile.balance = balance
+        raise InsufficientBalanceError(balance, amount)
+    profile.balance = row[0]
+    return profile.balance
@@ -1,16 +1,22 @@
 from __future__ import annotations
 
 import logging
-import threading
 from typing import Optional
 
-import requests
-from django.conf import settings
-from django.db.models.signals import post_delete, post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import Failure
+from .models import Failure, FailureBan, FailureWebhookKind, UserProfile
+from .services.bans import sync_score_ban_flags
+from .services.histogram import rebuild_score_histogram
+from .services.live import notify_leaderboard_changed
+from .services.outbox import enqueue_failure_event
+from .services.referrals import change_referrals_count
+from .services.schedule import invalidate_failure_schedule
+from .services.seasons import recompute_season_profile
+from .services.standings import refreeze_standings
 
 logger = logging.getLogger(__name__)
 
@@ -23,38 +29,11 @@ def _serialize_dt(value: Optional[timezone.datetime]) -> Optional[str]:
     return value.isoformat()
 
 
-def _post_failure_created(payload: dict[str, object]) -> None:
-    url = getattr(settings, "FAILURE_CREATE_URL", "")
-    if not url:
-        logger.info("[failures] create hook skipped: FAILURE_CREATE_URL not set")
-        return
-
-    try:
-        resp = requests.post(
-            url,
-            json=payload,
-            timeout=getattr(settings, "FAILURE_CREATE_TIMEOUT", 10),
-        )
-        resp.raise_for_status()
-    except Exception as exc:  # pragma: no cover - network failure path
-        logger.error("[failures] create hook failed", exc_info=exc)
-
-
-def _post_failure_deleted(payload: dict[str, object]) -> None:
-    url = getattr(settings, "FAILURE_DELETE_URL", "")
-    if not url:
-        logger.info("[failures] delete hook skipped: FAILURE_DELETE_URL not set")
-        return
-
-    try:
-        resp = requests.post(
-            url,
-            json=payload,
-            timeout=getattr(settings, "FAILURE_DELETE_TIMEOUT", 10),
-        )
-        resp.raise_for_status()
-    except Exception as exc:  # pragma: no cover - network failure path
-        logger.error("[failures] delete hook failed", exc_info=exc)
+@receiver(post_save, sender=Failure)
+@receiver(post_delete, sender=Failure)
+def failure_schedule_changed(sender, instance: Failure, **kwargs) -> None:
+    # другие воркеры подхватят правку по FAILURE_SCHEDULE_TTL_SECONDS
+    transaction.on_commit(invalidate_failure_schedule)
 
 
 @receiver(post_save, sender=Failure)
@@ -62,26 +41,92 @@ def notify_failure_created(sender, instance: Failure, created: bool, **kwargs) -
     if not created:
         return
 
-    payload = {
-        "secret": getattr(settings, "FAILURE_CREATE_SECRET", ""),
-        "name": instance.name,
-        "reward": int(instance.reward or 0),
-        "start_time": _serialize_dt(instance.start_time),
-        "end_time": _serialize_dt(instance.end_time),
-    }
-
-    worker = threading.Thread(target=_post_failure_created, args=(payload,))
-    worker.daemon = True
-    worker.start()
+    # в той же транзакции, что и сбой; отправляет dispatch_failure_webhooks
+    enqueue_failure_event(
+        FailureWebhookKind.CREATED,
+        instance.pk,
+        {
+            "name": instance.name,
+            "reward": int(instance.reward or 0),
+            "start_time": _serialize_dt(instance.start_time),
+            "end_time": _serialize_dt(instance.end_time),
+        },
+    )
 
 
 @receiver(post_delete, sender=Failure)
 def notify_failure_deleted(sender, instance: Failure, **kwargs) -> None:
-    payload = {
-        "secret": getattr(settings, "FAILURE_DELETE_SECRET", ""),
-        "name": instance.name,
-    }
-
-    worker = threading.Thread(target=_post_failure_deleted, args=(payload,))
-    worker.daemon = True
-    worker.start()
+    enqueue_failure_event(FailureWebhookKind.DELETED, instance.pk, {"name": instance.name})
+
+
+def _rebuild_histogram(failure_id: int) -> None:
+    # бан убирает/возвращает участника, проще пересчитать корзины целиком
+    failure = Failure.objects.filter(pk=failure_id).first()
+    if failure is not None:
+        rebuild_score_histogram(failure)
+
+
+def _recompute_season_profile(failure_id: int, profile_id: int) -> None:
+    season_id = Failure.objects.filter(pk=failure_id).values_list("season_id", flat=True).first()
+    if season_id:
+        recompute_season_profile(season_id, profile_id)
+
+
+def _ranking_changed(failure_id: int, profile_id: int) -> None:
+    transaction.on_commit(lambda: refreeze_standings(failure_id))
+    transaction.on_commit(lambda: _rebuild_histogram(failure_id))
+    transaction.on_commit(lambda: _recompute_season_profile(failure_id, profile_id))
+    transaction.on_commit(lambda: notify_leaderboard_changed(failure_id))
+
+
+@receiver(post_save, sender=FailureBan)
+@receiver(post_delete, sender=FailureBan)
+def standings_changed_by_ban(sender, instance: FailureBan, **kwargs) -> None:
+    profile_id = instance.profile_id
+    # по всем сбоям профиля: в админке у бана можно сменить сбой
+    for failure_id in sync_score_ban_flags(profile_id):
+        _ranking_changed(failure_id, profile_id)
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_profile_ban(sender, instance: UserProfile, **kwargs) -> None:
+    # через __dict__: отложенное поле (.only()) не должно вызывать запрос
+    instance._loaded_is_banned = instance.__dict__.get("is_banned")
+    instance._loaded_referred_by_id = instance.__dict__.get("referred_by_id")
+
+
+@receiver(post_save, sender=UserProfile)
+def standings_changed_by_profile_ban(
+    sender, instance: UserProfile, created: bool, **kwargs
+) -> None:
+    if created or "is_banned" not in instance.__dict__:
+        return
+    if instance.is_banned == getattr(instance, "_loaded_is_banned", None):
+        return
+    instance._loaded_is_banned = instance.is_banned
+    for failure_id in sync_score_ban_flags(instance.pk):
+        _ranking_changed(failure_id, instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def referrals_count_changed_by_profile(
+    sender, instance: UserProfile, created: bool, **kwargs
+) -> None:
+    # ReferralCodeApplyView меняет счётчик сам через queryset.update(); здесь —
+    # правки referred_by из админки и прочих save()
+    if "referred_by_id" not in instance.__dict__:
+        return
+    previous = None if created else getattr(instance, "_loaded_referred_by_id", None)
+    current = instance.referred_by_id
+    if previous == current:
+        return
+    instance._loaded_referred_by_id = current
+    change_referrals_count(previous, -1)
+    change_referrals_count(current, 1)
+
+
+@receiver(post_delete, sender=UserProfile)
+def referrals_count_changed_by_profile_delete(
+    sender, instance: UserProfile, **kwargs
+) -> None:
+    change_referrals_count(instance.__dict__.get("referred_by_id"), -1)
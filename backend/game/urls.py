@@ -28,12 +28,18 @@ from .views import (
     # Сбои
     FailureListView,
     FailureStartView,
+    FailureAdmissionStatsView,
     FailureCompleteView,
     FailureBonusPurchaseView,
 
     # Очки и лидерборд
     ScoreListView,
     LeaderboardView,
+    LeaderboardStreamTokenView,
+    LeaderboardStreamView,
+    LeaderboardDistributionView,
+    ReferralLeaderboardView,
+    SeasonLeaderboardView,
 
     # Adsgram
     AdsgramBlockView,
@@ -83,6 +89,11 @@ urlpatterns = [
     # Сбои
     path("failures/", FailureListView.as_view(), name="failures"),
     path("failures/start/", FailureStartView.as_view(), name="failure-start"),
+    path(
+        "failures/admission/",
+        FailureAdmissionStatsView.as_view(),
+        name="failure-admission",
+    ),
     path("failures/complete/", FailureCompleteView.as_view(), name="failure-complete"),
     path(
         "failures/bonus-purchase/",
@@ -93,6 +104,27 @@ urlpatterns = [
     # Очки и лидерборд
     path("scores/", ScoreListView.as_view(), name="scores"),
     path("leaderboard/", LeaderboardView.as_view(), name="leaderboard"),
+    path(
+        "leaderboard/referrals/",
+        ReferralLeaderboardView.as_view(),
+        name="leaderboard-referrals",
+    ),
+    path("seasons/leaderboard/", SeasonLeaderboardView.as_view(), name="season-leaderboard"),
+    path(
+        "leaderboard/distribution/",
+        LeaderboardDistributionView.as_view(),
+        name="leaderboard-distribution",
+    ),
+    path(
+        "leaderboard/<int:failure_id>/stream/",
+        LeaderboardStreamView.as_view(),
+        name="leaderboard-stream",
+    ),
+    path(
+        "leaderboard/<int:failure_id>/stream/token/",
+        LeaderboardStreamTokenView.as_view(),
+        name="leaderboard-stream-token",
+    ),
 
     # Adsgram
     path("adsgram/block/", AdsgramBlockView.as_view(), name="adsgram-block"),
@@ -1,20 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import math
+from dataclasses import asdict
 from datetime import date, timedelta
+import json
 import logging
 import threading
 from typing import Optional
 
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
 from django.db import IntegrityError, transaction
 from django.db.models import Sum, F, Q, Count
+from django.http import HttpRequest, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import parse_etags
+from django.views import View
 from rest_framework import permissions, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import Token
 
 from cat_game_backend.permissions import IsNotBanned
 from .models import (
@@ -29,15 +42,16 @@ from .models import (
     DailyReward,
     DailyRewardClaim,
     Failure,
-    FailureBonusPurchase,
     FailureBonusType,
     QuizQuestion,
     ScoreEntry,
+    ScoreEntryArchive,
     QuizAttempt,
     AdsgramBlock,
     AdsgramAssignment,
     AdsgramAssignmentStatus,
     FrontendConfig,
+    Season,
 )
 from .serializers import (
     TaskCompletionSerializer,
@@ -50,6 +64,7 @@ from .serializers import (
     AdvertisementButtonSerializer,
     FrontendConfigSerializer,
     FailureSerializer,
+    failure_payload,
     FailureStartSerializer,
     FailureCompleteSerializer,
     FailureBonusPurchaseSerializer,
@@ -63,8 +78,55 @@ from .serializers import (
     AdsgramAssignmentCompleteSerializer,
 )
 from .services import (
+    FAILURE_STATES,
+    FAILURES_MAX_PAGE_SIZE,
+    FAILURES_PAGE_SIZE,
+    LEADERBOARD_MAX_AROUND,
+    LEADERBOARD_MAX_PAGE_SIZE,
+    LEADERBOARD_PAGE_SIZE,
     AdsgramIntegrationError,
+    CursorError,
+    InsufficientBalanceError,
+    active_failure_id,
+    bonuses_from_mask,
+    buffer_failure_score,
+    buy_run_bonus,
+    close_run,
+    compact_leaderboard,
+    credit,
+    current_season,
+    debit,
+    entry_for_profile,
+    failures_for,
+    failures_page,
+    find_open_run,
     get_adsgram_client,
+    get_failure_start_gate,
+    get_leaderboard_hub,
+    get_rank_index,
+    indexed_page,
+    indexed_rows,
+    invalidate_failure_schedule,
+    leaderboard_around,
+    leaderboard_etag,
+    leaderboard_page,
+    leaderboard_row,
+    open_run,
+    position_of,
+    preload_failure_player_counts,
+    ranked_circle_scores,
+    ranked_scores,
+    ranked_season_scores,
+    record_failure_score,
+    record_failure_start,
+    run_token_required,
+    score_distribution,
+    score_write_behind_enabled,
+    season_row,
+    standing_for_profile,
+    standings,
+    standings_around,
+    standings_page,
 )
 
 User = get_user_model()
@@ -157,9 +219,7 @@ def _run_telegram_check(profile_id: int, task_id: int, channel_id: str, telegram
                 return
         assignment.is_completed = True
         assignment.save(update_fields=["is_completed", "updated_at"])
-        profile.balance = F("balance") + task.reward
-        profile.save(update_fields=["balance", "updated_at"])
-        profile.refresh_from_db(fields=["balance"])
+        credit(profile, task.reward)
 
     logger.info(
         "[tasks] telegram check: completed and rewarded",
@@ -284,9 +344,7 @@ class TaskToggleCompleteView(APIView):
             assignment.is_completed = True
             assignment.save(update_fields=["is_completed", "updated_at"])
             # optional: reward user instantly for task.reward
-            profile.balance = F("balance") + task.reward
-            profile.save(update_fields=["balance", "updated_at"])
-            profile.refresh_from_db(fields=["balance"])
+            credit(profile, task.reward)
 
         if not is_completed and assignment.is_completed:
             assignment.is_completed = False
@@ -383,18 +441,14 @@ class SimulationStartView(APIView):
                 reward_amount_3=250,
             )
         cost = config.attempt_cost
-        profile.refresh_from_db(fields=["balance"])
-
-        if profile.balance < cost:
+        try:
+            debit(profile, cost)
+        except InsufficientBalanceError as exc:
             return Response(
-                {"detail": "Недостаточно монет для запуска симуляции.", "balance": profile.balance, "required": cost},
+                {"detail": "Недостаточно монет для запуска симуляции.", "balance": exc.balance, "required": cost},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        profile.balance = F("balance") - cost
-        profile.save(update_fields=["balance", "updated_at"])
-        profile.refresh_from_db(fields=["balance"])
-
         return Response(
             {
                 "detail": "Симуляция успешно запущена!",
@@ -418,9 +472,7 @@ class SimulationAdRewardView(APIView):
     def post(self, request: Request) -> Response:
         profile = request.user.profile
         reward = int(getattr(settings, "SIMULATION_AD_REWARD", 200))
-        profile.balance = F("balance") + reward
-        profile.save(update_fields=["balance", "updated_at"])
-        profile.refresh_from_db(fields=["balance"])
+        credit(profile, reward)
 
         return Response(
             {
@@ -497,9 +549,7 @@ class SimulationRewardClaimView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        profile.balance = F("balance") + reward_amount
-        profile.save(update_fields=["balance", "updated_at"])
-        profile.refresh_from_db(fields=["balance"])
+        credit(profile, reward_amount)
 
         return Response(
             {
@@ -528,6 +578,13 @@ class RuleCategoryListView(APIView):
 
 # ---------- Daily rewards ----------
 
+def _run_token_missing() -> Response:
+    return Response(
+        {"detail": "Обновите приложение: нужен run_token забега."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
 def _failure_is_active(failure: Failure, now: timezone.datetime | None = None) -> bool:
     now = now or timezone.now()
     if failure.start_time and failure.start_time > now:
@@ -537,6 +594,20 @@ def _failure_is_active(failure: Failure, now: timezone.datetime | None = None) -
     return True
 
 
+def _active_failure(queryset, now: timezone.datetime) -> Failure | None:
+    """Активный сбой по расписанию воркера — одним запросом по первичному ключу."""
+    failure_id = active_failure_id(now)
+    if failure_id is None:
+        return None
+    failure = queryset.filter(pk=failure_id).first()
+    if failure is None or not _failure_is_active(failure, now):
+        # расписание устарело: сбой правили в другом процессе
+        invalidate_failure_schedule()
+        failure_id = active_failure_id(now)
+        failure = queryset.filter(pk=failure_id).first() if failure_id else None
+    return failure
+
+
 def _ensure_daily_reward_defaults() -> None:
     existing = set(DailyReward.objects.values_list("day_number", flat=True))
     missing = [idx for idx in range(1, 9) if idx not in existing]
@@ -630,20 +701,16 @@ class DailyRewardClaimTodayView(APIView):
             sequence_day=day_to_claim,
         )
 
-        profile.balance = F("balance") + reward_cfg.reward_amount
         profile.daily_reward_last_claimed_at = today
         profile.daily_reward_streak = 0 if day_to_claim == 8 else day_to_claim
         profile.save(
             update_fields=[
-                "balance",
                 "updated_at",
                 "daily_reward_last_claimed_at",
                 "daily_reward_streak",
             ]
         )
-        profile.refresh_from_db(
-            fields=["balance", "daily_reward_last_claimed_at", "daily_reward_streak"]
-        )
+        credit(profile, reward_cfg.reward_amount)
 
         serializer = DailyRewardClaimSerializer(claim)
         next_day = _next_reward_day(profile, today)
@@ -707,9 +774,7 @@ class AdvertisementButtonClaimView(APIView):
         AdvertisementButtonRewardClaim.objects.create(button=button, profile=profile)
 
         if button.reward_amount:
-            profile.balance = F("balance") + int(button.reward_amount)
-            profile.save(update_fields=["balance", "updated_at"])
-            profile.refresh_from_db(fields=["balance"])
+            credit(profile, int(button.reward_amount))
 
         return Response(
             {
@@ -731,15 +796,55 @@ class FrontendConfigView(APIView):
 
 # ---------- Failures ----------
 
+def _failure_payloads(failures: list[Failure], request: Request) -> list[dict]:
+    # счётчики игроков всех сбоев синхронизируются одним чтением, а не по запросу на сбой
+    preload_failure_player_counts([failure.pk for failure in failures])
+    return [failure_payload(failure, request) for failure in failures]
+
+
 class FailureListView(APIView):
     permission_classes = (permissions.IsAuthenticated, IsNotBanned)
 
     def get(self, request: Request) -> Response:
-        failures = Failure.objects.order_by("-created_at")
-        serializer = FailureSerializer(
-            failures, many=True, context={"request": request}
+        states = [
+            state.strip()
+            for state in request.query_params.get("state", "").split(",")
+            if state.strip()
+        ]
+        if any(state not in FAILURE_STATES for state in states):
+            return Response(
+                {"detail": "Некорректный параметр state: active, upcoming или past."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # отметка «пройден» для всех сбоев — одним EXISTS в том же запросе
+        failures = failures_for(request.user.profile.id, states)
+
+        if not any(key in request.query_params for key in ("limit", "cursor")):
+            return Response(_failure_payloads(list(failures), request))
+
+        try:
+            limit = int(request.query_params.get("limit", FAILURES_PAGE_SIZE))
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "Некорректные параметры пагинации."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, FAILURES_MAX_PAGE_SIZE))
+        try:
+            page, next_cursor = failures_page(
+                failures, cursor=request.query_params.get("cursor") or None, limit=limit
+            )
+        except CursorError:
+            return Response(
+                {"detail": "Некорректный курсор."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {
+                "results": _failure_payloads(page, request),
+                "next_cursor": next_cursor,
+            }
         )
-        return Response(serializer.data)
 
 
 from rest_framework import status, permissions, serializers
@@ -753,10 +858,46 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def _lock_profile(profile_id: int) -> None:
+    """Упорядочивает параллельные запросы одного игрока (строка профиля — его собственная)."""
+    list(UserProfile.objects.select_for_update().filter(pk=profile_id).values_list("pk"))
+
+
+def _start_ticket(request: HttpRequest) -> str | None:
+    try:
+        data = json.loads(request.body or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return None
+    ticket = data.get("ticket") if isinstance(data, dict) else None
+    return ticket if isinstance(ticket, str) else None
+
+
 class FailureStartView(APIView):
     permission_classes = (permissions.IsAuthenticated, IsNotBanned)
 
-    @transaction.atomic
+    def dispatch(self, request, *args, **kwargs):
+        # при старте сбоя все клиенты приходят в одну секунду: сверх бюджета воркера
+        # сразу отвечаем 503 с задержкой и талоном, до авторизации и запросов к базе
+        gate = get_failure_start_gate()
+        if gate is None or request.method != "POST":
+            return super().dispatch(request, *args, **kwargs)
+        with gate.admit(_start_ticket(request)) as admission:
+            if admission.admitted:
+                return super().dispatch(request, *args, **kwargs)
+        response = JsonResponse(
+            {
+                "detail": "Слишком много игроков начинают сбой одновременно. Повторите попытку.",
+                "retry_after_ms": admission.retry_after_ms,
+                "ticket": admission.ticket,
+            },
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response["Retry-After"] = str(math.ceil(admission.retry_after_ms / 1000))
+        response["Cache-Control"] = "no-store"
+        # строку в django.request на каждый отказ отсекает фильтр из settings.LOGGING:
+        # сводку раз в 5 с пишет gate
+        return response
+
     def post(self, request):
         logger.info("FAILURE START POST data=%s user=%s", request.data, request.user.id)
 
@@ -772,7 +913,8 @@ class FailureStartView(APIView):
         now = timezone.now()
         profile = request.user.profile
 
-        qs = Failure.objects.select_for_update()
+        # строку сбоя делят все игроки события — читаем её без блокировки
+        qs = Failure.objects.all()
 
         if failure_id is not None:
             try:
@@ -781,12 +923,7 @@ class FailureStartView(APIView):
                 logger.warning("FAILURE START 404: not found id=%s", failure_id)
                 return Response({"detail": "Сбой не найден."}, status=status.HTTP_404_NOT_FOUND)
         else:
-            failure = (
-                qs.filter(Q(start_time__isnull=True) | Q(start_time__lte=now))
-                .filter(Q(end_time__isnull=True) | Q(end_time__gt=now))
-                .order_by("-start_time", "-created_at")
-                .first()
-            )
+            failure = _active_failure(qs, now)
             if not failure:
                 logger.warning("FAILURE START 404: active not found")
                 return Response({"detail": "Активный сбой не найден."}, status=status.HTTP_404_NOT_FOUND)
@@ -795,41 +932,39 @@ class FailureStartView(APIView):
             logger.warning("FAILURE START 400: not active failure_id=%s", failure.id)
             return Response({"detail": "Сбой недоступен для участия."}, status=status.HTTP_400_BAD_REQUEST)
 
-        profile = UserProfile.objects.select_for_update().get(pk=profile.pk)
         attempt_cost = int(failure.attempt_cost or 0)
 
-        if attempt_cost > 0:
-            if profile.balance < attempt_cost:
-                logger.warning(
-                    "FAILURE START 400: insufficient balance profile_id=%s cost=%s balance=%s",
-                    profile.id,
-                    attempt_cost,
-                    profile.balance,
-                )
-                return Response(
-                    {"detail": "Недостаточно монет для участия в сбое."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        with transaction.atomic():
+            if attempt_cost > 0:
+                try:
+                    debit(profile, attempt_cost, now=now)
+                except InsufficientBalanceError as exc:
+                    logger.warning(
+                        "FAILURE START 400: insufficient balance profile_id=%s cost=%s balance=%s",
+                        profile.id,
+                        attempt_cost,
+                        exc.balance,
+                    )
+                    return Response(
+                        {"detail": "Недостаточно монет для участия в сбое."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
 
-            profile.balance = max(profile.balance - attempt_cost, 0)
-            profile.save(update_fields=["balance", "updated_at"])
-            profile.refresh_from_db(fields=["balance"])
+            # бонусы живут в забеге: новый старт — новый забег без бонусов
+            run = open_run(profile, failure, now)
 
-        # bonuses are single-use: clear leftovers from previous attempts
-        FailureBonusPurchase.objects.filter(
-            profile=profile, failure=failure
-        ).delete()
+            # счётчики участников — в памяти воркера, в базу уходят периодически
+            failure_id, profile_id = failure.id, profile.id
+            transaction.on_commit(lambda: record_failure_start(failure_id, profile_id))
 
         purchases: list[str] = []
 
-        failure_payload = FailureSerializer(
-            failure, context={"request": request}
-        ).data
-
         return Response(
             {
                 "detail": "Можно начинать.",
-                "failure": failure_payload,
+                "run_token": str(run.token),
+                "expires_at": run.expires_at.isoformat(),
+                "failure": failure_payload(failure, request),
                 "duration_seconds": failure.duration_seconds,
                 "bombs_min_count": failure.bombs_min_count,
                 "bombs_max_count": failure.bombs_max_count,
@@ -841,10 +976,21 @@ class FailureStartView(APIView):
             }
         )
 
+class FailureAdmissionStatsView(APIView):
+    """Метрики допуска к старту сбоя в воркере, который обслужил запрос."""
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request: Request) -> Response:
+        gate = get_failure_start_gate()
+        if gate is None:
+            return Response({"enabled": False})
+        return Response({"enabled": True, **asdict(gate.stats())})
+
+
 class FailureCompleteView(APIView):
     permission_classes = (permissions.IsAuthenticated, IsNotBanned)
 
-    @transaction.atomic
     def post(self, request: Request) -> Response:
         serializer = FailureCompleteSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -852,48 +998,113 @@ class FailureCompleteView(APIView):
         failure_id = serializer.validated_data["failure_id"]
         points = serializer.validated_data["points"]
         duration = serializer.validated_data["duration_seconds"]
+        run_token = serializer.validated_data.get("run_token")
+        replay = serializer.validated_data.get("replay")
+        if run_token is None and run_token_required():
+            return _run_token_missing()
 
         profile = request.user.profile
 
         try:
-            failure = Failure.objects.select_for_update().get(id=failure_id)
+            failure = Failure.objects.get(id=failure_id)
         except Failure.DoesNotExist:
             return Response({"detail": "Сбой не найден."}, status=status.HTTP_404_NOT_FOUND)
 
-        entry = (
-            ScoreEntry.objects.select_for_update()
-            .filter(profile=profile, failure=failure)
-            .first()
-        )
-
-        now = timezone.now()
-        detail = "Результат сохранён."
+        if score_write_behind_enabled():
+            return self._complete_write_behind(
+                request, profile, failure, points, duration, run_token, replay
+            )
 
-        if entry is None:
-            ScoreEntry.objects.create(
-                profile=profile,
-                failure=failure,
+        with transaction.atomic():
+            # прежние очки в upsert record_failure_score читаются под этой блокировкой
+            _lock_profile(profile.pk)
+
+            # результат принимается только по открытому забегу, и только один раз
+            # результат и запись забега проверяются позже воркером verify_failure_replays
+            closed = close_run(
+                profile.pk,
+                failure.pk,
+                run_token,
+                timezone.now(),
                 points=points,
-                duration_seconds=duration,
-                earned_at=now,
+                duration=duration,
+                replay=replay,
             )
-        else:
-            if points > int(entry.points or 0):
-                entry.points = points
-                entry.duration_seconds = duration
-                entry.earned_at = now
-                entry.save(update_fields=["points", "duration_seconds", "earned_at", "updated_at"])
-                detail = "Результат обновлён."
-
-        # bonuses are single-use per attempt: clear purchases after completion
-        FailureBonusPurchase.objects.filter(
-            profile=profile, failure=failure
-        ).delete()
+            if closed is None:
+                return Response(
+                    {"detail": "Забег не найден или уже завершён."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # последним: общие строки гистограммы заблокированы только до COMMIT
+            result = record_failure_score(profile, failure, points, duration)
+            if result is None:
+                # сбой удалили между чтением и записью результата
+                transaction.set_rollback(True)
+                return Response({"detail": "Сбой не найден."}, status=status.HTTP_404_NOT_FOUND)
+
+        detail = "Результат сохранён."
+        if result.improved and not result.created:
+            detail = "Результат обновлён."
+
+        # место считаем уже после коммита, вне блокировок строк гистограммы
+        entry = result.entry
+        index = get_rank_index(failure) if entry.points else None
+        position = (
+            index.position_for(entry.points, entry.earned_at, entry.id)
+            if index is not None
+            else None
+        )
 
         return Response(
             {
                 "detail": detail,
                 "score": points,
+                "position": position,
+                "failure": FailureSerializer(failure).data,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def _complete_write_behind(
+        self, request, profile, failure, points, duration, run_token, replay
+    ):
+        """Accept the result right away; it reaches the database with the next batch.
+
+        Closing the run stays a synchronous UPDATE: that conditional UPDATE is what
+        accepts a result only once per open run, and the answer (200 or 400) depends
+        on it. It touches only the player's own run row, so unlike the shared score
+        and histogram rows it does not contend between players.
+        """
+        now = timezone.now()
+        closed = close_run(
+            profile.pk,
+            failure.pk,
+            run_token,
+            now,
+            points=points,
+            duration=duration,
+            replay=replay,
+        )
+        if closed is None:
+            return Response(
+                {"detail": "Забег не найден или уже завершён."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        buffer_failure_score(profile.pk, failure.pk, points, duration, now)
+
+        # оценка места: индекс ещё не знает о результате из буфера
+        index = get_rank_index(failure) if points else None
+        position = None
+        if index is not None:
+            places = [index.position_for(points, now, 0), index.rank_of_profile(profile.pk)]
+            position = min(place for place in places if place is not None)
+
+        return Response(
+            {
+                "detail": "Результат принят.",
+                "score": points,
+                "position": position,
                 "failure": FailureSerializer(failure).data,
             },
             status=status.HTTP_200_OK,
@@ -903,18 +1114,20 @@ class FailureCompleteView(APIView):
 class FailureBonusPurchaseView(APIView):
     permission_classes = (permissions.IsAuthenticated, IsNotBanned)
 
-    @transaction.atomic
     def post(self, request: Request) -> Response:
         serializer = FailureBonusPurchaseSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         failure_id = serializer.validated_data["failure_id"]
         bonus_type = serializer.validated_data["bonus_type"]
+        run_token = serializer.validated_data.get("run_token")
+        if run_token is None and run_token_required():
+            return _run_token_missing()
 
         profile = request.user.profile
 
         try:
-            failure = Failure.objects.select_for_update().get(id=failure_id)
+            failure = Failure.objects.get(id=failure_id)
         except Failure.DoesNotExist:
             return Response({"detail": "Сбой не найден."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -930,55 +1143,46 @@ class FailureBonusPurchaseView(APIView):
         #         {"detail": "Сбой уже завершён."}, status=status.HTTP_400_BAD_REQUEST
         #     )
 
-        existing = FailureBonusPurchase.objects.select_for_update().filter(
-            profile=profile, failure=failure
-        )
-
-        if existing.filter(bonus_type=bonus_type).exists():
-            return Response(
-                {"detail": "Бонус уже приобретён."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if existing.count() >= failure.max_bonuses_per_run:
-            return Response(
-                {"detail": "Достигнут лимит бонусов."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
         prices = failure.bonus_prices()
         price = int(prices.get(bonus_type, 0))
 
         if price < 0:
             price = 0
 
-        profile.refresh_from_db(fields=["balance"])
-        if profile.balance < price:
-            return Response(
-                {
-                    "detail": "Недостаточно монет.",
-                    "balance": profile.balance,
-                    "required": price,
-                },
-                status=status.HTTP_400_BAD_REQUEST,
+        with transaction.atomic():
+            # лимит, повторная покупка и открытость забега — в одном условном UPDATE
+            purchases = buy_run_bonus(
+                profile.pk,
+                failure.pk,
+                run_token,
+                bonus_type,
+                failure.max_bonuses_per_run,
+                now,
             )
-
-        if price:
-            profile.balance = F("balance") - price
-            profile.save(update_fields=["balance", "updated_at"])
-            profile.refresh_from_db(fields=["balance"])
-
-        FailureBonusPurchase.objects.create(
-            profile=profile,
-            failure=failure,
-            bonus_type=bonus_type,
-        )
-
-        purchases = list(
-            FailureBonusPurchase.objects.filter(
-                profile=profile, failure=failure
-            ).values_list("bonus_type", flat=True)
-        )
+            if purchases is None:
+                run = find_open_run(profile.pk, failure.pk, run_token, now)
+                if run is None:
+                    detail = "Забег не найден или уже завершён."
+                elif bonus_type in bonuses_from_mask(run.bonuses):
+                    detail = "Бонус уже приобретён."
+                else:
+                    detail = "Достигнут лимит бонусов."
+                return Response({"detail": detail}, status=status.HTTP_400_BAD_REQUEST)
+
+            if price:
+                try:
+                    debit(profile, price, now=now)
+                except InsufficientBalanceError as exc:
+                    # бонус в забеге откатывается вместе с транзакцией
+                    transaction.set_rollback(True)
+                    return Response(
+                        {
+                            "detail": "Недостаточно монет.",
+                            "balance": exc.balance,
+                            "required": price,
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
 
         return Response(
             {
@@ -1138,11 +1342,10 @@ class ScoreListView(APIView):
 
     def get(self, request: Request) -> Response:
         profile = request.user.profile
-        scores = (
-            ScoreEntry.objects.filter(profile=profile)
-            .select_related("failure")
-            .order_by("-earned_at", "-id")
-        )
+        scores = list(ScoreEntry.objects.filter(profile=profile).select_related("failure"))
+        # архивные строки сохраняют id, поэтому порядок тот же, что до переноса
+        scores += ScoreEntryArchive.objects.filter(profile=profile).select_related("failure")
+        scores.sort(key=lambda score: (score.earned_at, score.id), reverse=True)
         return Response(ScoreEntrySerializer(scores, many=True).data)
 
     @transaction.atomic
@@ -1186,9 +1389,7 @@ class ScoreListView(APIView):
 
         profile = request.user.profile
         if reward:
-            profile.balance = F("balance") + reward
-            profile.save(update_fields=["balance", "updated_at"])
-            profile.refresh_from_db(fields=["balance"])
+            credit(profile, reward)
 
         QuizAttempt.objects.create(
             profile=profile,
@@ -1208,72 +1409,472 @@ class ScoreListView(APIView):
         return Response(resp.data, status=status.HTTP_200_OK)
 
 
+def _leaderboard_failure(request: Request) -> tuple[Failure | None, Response | None]:
+    """Сбой из ?failure=<id>, иначе текущий активный; вторым значением — ответ с ошибкой."""
+    failure_param = request.query_params.get("failure")
+    if not failure_param:
+        return _active_failure(Failure.objects.all(), timezone.now()), None
+
+    try:
+        failure_id = int(failure_param)
+    except (TypeError, ValueError):
+        return None, Response(
+            {"detail": "Некорректный идентификатор сбоя."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        return Failure.objects.get(id=failure_id), None
+    except Failure.DoesNotExist:
+        return None, Response(
+            {"detail": "Сбой не найден."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+
+def _request_etags(request: Request) -> set[str]:
+    # nginx с gzip ослабляет ETag до W/"...", сравниваем без префикса
+    return {
+        etag[2:] if etag.startswith("W/") else etag
+        for etag in parse_etags(request.headers.get("If-None-Match", ""))
+    }
+
+
 class LeaderboardView(APIView):
     """Возвращает таблицу лидеров для выбранного сбоя."""
 
     permission_classes = (permissions.IsAuthenticated, IsNotBanned)
 
     def get(self, request: Request) -> Response:
-        failure_param = request.query_params.get("failure")
-        failure_obj: Failure | None = None
+        failure_obj, error = _leaderboard_failure(request)
+        if error is not None:
+            return error
+
+        if failure_obj is None:
+            return self._respond(request, None)
+
+        # версия таблицы меняется только при улучшении результата или бане,
+        # поэтому повторный опрос отвечает 304 без чтения ScoreEntry
+        etag = leaderboard_etag(failure_obj, request.user.profile.id)
+        if etag in _request_etags(request):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = self._respond(request, failure_obj)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def _respond(self, request: Request, failure_obj: Failure | None) -> Response:
+        if request.query_params.get("compact"):
+            return self._compact(request, failure_obj)
+
+        # итоги строит задача freeze_failure_standings после окончания забегов;
+        # пока их нет, отдаётся живой рейтинг, а не пересчёт под блокировкой сбоя
+        frozen = failure_obj is not None and failure_obj.standings_frozen_at is not None
+
+        paginated = any(
+            key in request.query_params for key in ("limit", "cursor", "around")
+        )
+        if paginated:
+            return self._paginated(request, failure_obj, frozen)
+
+        if failure_obj is None:
+            ranked_items = []
+        elif frozen:
+            # сбой завершён: читаем готовые итоги без пересчёта рангов
+            ranked_items = (
+                (standing.position, standing)
+                for standing in standings(failure_obj).select_related("profile__user")
+            )
+        else:
+            ranked_items = enumerate(
+                ranked_scores(failure_obj).select_related("profile", "profile__user"),
+                start=1,
+            )
+
+        rows = []
+        current = None
+        profile_id = request.user.profile.id
+        for position, entry in ranked_items:
+            row = leaderboard_row(entry, position)
+            rows.append(row)
+            if entry.profile_id == profile_id:
+                current = row
+
+        return Response(
+            {
+                "entries": rows,
+                "current_user": current,
+                "failure": (
+                    failure_payload(failure_obj, request) if failure_obj is not None else None
+                ),
+            }
+        )
+
+    def _compact(self, request: Request, failure_obj: Failure | None) -> Response:
+        """Компактный формат: словарь профилей и строки [id, очки, время], since — дельта."""
+        if failure_obj is None:
+            return Response(
+                {"since": None, "full": True, "profiles": {}, "rows": [], "removed": []}
+            )
+        try:
+            payload = compact_leaderboard(
+                failure_obj, since=request.query_params.get("since") or None
+            )
+        except CursorError:
+            return Response(
+                {"detail": "Некорректный параметр since."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        payload["me"] = request.user.profile.id
+        if payload["full"]:
+            payload["failure"] = failure_payload(failure_obj, request)
+        return Response(payload)
+
+    def _paginated(
+        self, request: Request, failure_obj: Failure | None, frozen: bool
+    ) -> Response:
+        """Режим с limit/cursor и окном around вокруг текущего пользователя."""
+        try:
+            limit = int(request.query_params.get("limit", LEADERBOARD_PAGE_SIZE))
+            around = int(request.query_params.get("around", 0))
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "Некорректные параметры пагинации."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, LEADERBOARD_MAX_PAGE_SIZE))
+        around = max(0, min(around, LEADERBOARD_MAX_AROUND))
+        cursor = request.query_params.get("cursor") or None
+
+        payload: dict[str, object] = {
+            "entries": [],
+            "next_cursor": None,
+            "current_user": None,
+            "failure": None,
+        }
+        if around:
+            payload["around"] = []
+        if failure_obj is None:
+            return Response(payload)
+
+        profile = request.user.profile
+        index = None if frozen else get_rank_index(failure_obj)
+        ranked = ranked_scores(failure_obj)
+        try:
+            if frozen:
+                rows, next_cursor = standings_page(failure_obj, cursor=cursor, limit=limit)
+            elif index is not None:
+                rows, next_cursor = indexed_page(index, cursor=cursor, limit=limit)
+            else:
+                rows, next_cursor = leaderboard_page(ranked, cursor=cursor, limit=limit)
+        except CursorError:
+            return Response(
+                {"detail": "Некорректный курсор."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        payload["entries"] = rows
+        payload["next_cursor"] = next_cursor
+
+        if frozen:
+            standing = standing_for_profile(failure_obj, profile)
+            if standing is not None:
+                payload["current_user"] = leaderboard_row(standing, standing.position)
+                if around:
+                    payload["around"] = standings_around(failure_obj, standing, around)
+        elif index is not None:
+            position = index.rank_of_profile(profile.id)
+            if position is not None:
+                window = indexed_rows(index.around(position, around))
+                payload["current_user"] = next(
+                    (row for row in window if row["position"] == position), None
+                )
+                if around:
+                    payload["around"] = window
+        else:
+            entry = entry_for_profile(ranked, profile)
+            if entry is not None:
+                position = position_of(ranked, entry)
+                payload["current_user"] = leaderboard_row(entry, position)
+                if around:
+                    payload["around"] = leaderboard_around(ranked, entry, position, around)
+
+        payload["failure"] = failure_payload(failure_obj, request)
+        return Response(payload)
+
+
+class ReferralLeaderboardView(APIView):
+    """Таблица сбоя среди «своих»: пригласивший, приглашённые и сам пользователь."""
+
+    permission_classes = (permissions.IsAuthenticated, IsNotBanned)
+
+    def get(self, request: Request) -> Response:
+        failure_obj, error = _leaderboard_failure(request)
+        if error is not None:
+            return error
+        if failure_obj is None:
+            return Response({"entries": [], "current_user": None, "failure": None})
 
-        if failure_param:
+        profile = request.user.profile
+        rows = []
+        current = None
+        circle = ranked_circle_scores(failure_obj, profile).select_related("profile__user")
+        for position, entry in enumerate(circle, start=1):
+            row = leaderboard_row(entry, position)
+            rows.append(row)
+            if entry.profile_id == profile.id:
+                current = row
+
+        return Response(
+            {
+                "entries": rows,
+                "current_user": current,
+                "failure": failure_payload(failure_obj, request),
+            }
+        )
+
+
+class LeaderboardDistributionView(APIView):
+    """Гистограмма очков сбоя и доля участников с меньшим результатом."""
+
+    permission_classes = (permissions.IsAuthenticated, IsNotBanned)
+
+    def get(self, request: Request) -> Response:
+        failure_obj, error = _leaderboard_failure(request)
+        if error is not None:
+            return error
+        if failure_obj is None:
+            return Response({"failure_id": None, "total": 0, "buckets": [], "current_user": None})
+
+        score_param = request.query_params.get("score")
+        if score_param is not None:
             try:
-                failure_id = int(failure_param)
+                points = int(score_param)
             except (TypeError, ValueError):
                 return Response(
-                    {"detail": "Некорректный идентификатор сбоя."},
+                    {"detail": "Некорректное значение очков."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
+        else:
+            points = (
+                ScoreEntry.objects.filter(profile=request.user.profile, failure=failure_obj)
+                .values_list("points", flat=True)
+                .first()
+            )
+            if points is None and failure_obj.scores_archived_at:
+                points = (
+                    ScoreEntryArchive.objects.filter(
+                        profile=request.user.profile, failure=failure_obj
+                    )
+                    .values_list("points", flat=True)
+                    .first()
+                )
+
+        distribution = score_distribution(failure_obj, points)
+        current = None
+        if points:
+            current = {"score": points, "percentile": distribution["percentile"]}
+        return Response(
+            {
+                "failure_id": failure_obj.id,
+                "total": distribution["total"],
+                "buckets": distribution["buckets"],
+                "current_user": current,
+            }
+        )
+
 
+class SeasonLeaderboardView(APIView):
+    """Сезонная таблица: сумма лучших результатов игрока по сбоям сезона.
+
+    Параметры как у постраничного лидерборда: limit, cursor, around.
+    """
+
+    permission_classes = (permissions.IsAuthenticated, IsNotBanned)
+
+    def get(self, request: Request) -> Response:
+        season_param = request.query_params.get("season")
+        if season_param:
             try:
-                failure_obj = Failure.objects.get(id=failure_id)
-            except Failure.DoesNotExist:
+                season = Season.objects.filter(id=int(season_param)).first()
+            except (TypeError, ValueError):
                 return Response(
-                    {"detail": "Сбой не найден."},
-                    status=status.HTTP_404_NOT_FOUND,
+                    {"detail": "Некорректный идентификатор сезона."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if season is None:
+                return Response(
+                    {"detail": "Сезон не найден."}, status=status.HTTP_404_NOT_FOUND
                 )
         else:
-            now = timezone.now()
-            failure_obj = (
-                Failure.objects.filter(Q(start_time__isnull=True) | Q(start_time__lte=now))
-                .filter(Q(end_time__isnull=True) | Q(end_time__gt=now))
-                .order_by("-start_time", "-created_at")
-                .first()
+            season = current_season()
+
+        try:
+            limit = int(request.query_params.get("limit", LEADERBOARD_PAGE_SIZE))
+            around = int(request.query_params.get("around", 0))
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "Некорректные параметры пагинации."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, LEADERBOARD_MAX_PAGE_SIZE))
+        around = max(0, min(around, LEADERBOARD_MAX_AROUND))
+        cursor = request.query_params.get("cursor") or None
+
+        payload: dict[str, object] = {
+            "entries": [],
+            "next_cursor": None,
+            "current_user": None,
+            "season": None,
+        }
+        if around:
+            payload["around"] = []
+        if season is None:
+            return Response(payload)
+
+        payload["season"] = {
+            "id": season.id,
+            "name": season.name,
+            "start_time": season.start_time.isoformat(),
+            "end_time": season.end_time.isoformat(),
+        }
+        ranked = ranked_season_scores(season)
+        try:
+            rows, next_cursor = leaderboard_page(
+                ranked, cursor=cursor, limit=limit, row=season_row
+            )
+        except CursorError:
+            return Response(
+                {"detail": "Некорректный курсор."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        payload["entries"] = rows
+        payload["next_cursor"] = next_cursor
+
+        score = entry_for_profile(ranked, request.user.profile)
+        if score is not None:
+            position = position_of(ranked, score)
+            payload["current_user"] = season_row(score, position)
+            if around:
+                payload["around"] = leaderboard_around(
+                    ranked, score, position, around, row=season_row
+                )
+        return Response(payload)
 
-        qs = ScoreEntry.objects.select_related("profile", "profile__user")
-        if failure_obj is not None:
-            qs = qs.filter(failure=failure_obj)
-            qs = qs.exclude(profile__failure_bans__failure=failure_obj)
-        else:
-            qs = qs.none()
 
-        qs = qs.filter(points__gt=0).order_by("-points", "earned_at", "id")
+class LeaderboardStreamToken(Token):
+    """Короткоживущий токен только для открытия SSE-потока одного сбоя.
 
-        rows = []
-        for position, entry in enumerate(qs, start=1):
-            rows.append(
-                {
-                    "position": position,
-                    "username": entry.profile.user.username,
-                    "first_name": entry.profile.user.first_name or "",
-                    "last_name": entry.profile.user.last_name or "",
-                    "photo_url": entry.profile.photo_url or "",
-                    "score": int(entry.points or 0),
-                    "duration_seconds": 0,  # legacy поле, больше не используем
-                    "achieved_at": entry.earned_at.isoformat() if entry.earned_at else None,
-                }
-            )
+    EventSource не умеет заголовки, и токен уходит в ?token= — его пишут логи
+    nginx и gunicorn, поэтому обычный access-токен в адресе не принимается.
+    """
 
-        current = next((r for r in rows if r["username"] == request.user.username), None)
+    token_type = "leaderboard_stream"
+    lifetime = timedelta(seconds=int(getattr(settings, "LEADERBOARD_STREAM_TOKEN_SECONDS", 60)))
 
-        failure_payload = (
-            FailureSerializer(failure_obj, context={"request": request}).data
-            if failure_obj is not None
-            else None
-        )
 
-        return Response(
-            {"entries": rows, "current_user": current, "failure": failure_payload}
+class LeaderboardStreamTokenView(APIView):
+    """Выдаёт токен для ?token= потока ``LeaderboardStreamView``."""
+
+    permission_classes = (permissions.IsAuthenticated, IsNotBanned)
+
+    def post(self, request: Request, failure_id: int) -> Response:
+        failure = Failure.objects.filter(id=failure_id).first()
+        if failure is None:
+            return Response({"detail": "Сбой не найден."}, status=status.HTTP_404_NOT_FOUND)
+        if not _failure_is_active(failure):
+            return Response({"detail": "Сбой не активен."}, status=status.HTTP_400_BAD_REQUEST)
+        token = LeaderboardStreamToken.for_user(request.user)
+        token["failure_id"] = failure.id
+        expires_in = int(LeaderboardStreamToken.lifetime.total_seconds())
+        return Response({"token": str(token), "expires_in": expires_in})
+
+
+def _stream_user(request: HttpRequest, failure_id: int):
+    """JWT из заголовка Authorization или потоковый токен сбоя из ?token=."""
+    auth = JWTAuthentication()
+    raw_token = request.GET.get("token")
+    try:
+        if raw_token:
+            token = LeaderboardStreamToken(raw_token)
+            if token.get("failure_id") != failure_id:
+                return None
+            return auth.get_user(token)
+        result = auth.authenticate(request)
+    except (AuthenticationFailed, TokenError):
+        return None
+    return result[0] if result else None
+
+
+def _stream_failure(user, failure_id: int) -> Failure | None:
+    profile = getattr(user, "profile", None)
+    if profile is None or profile.is_banned:
+        return None
+    return Failure.objects.filter(id=failure_id).first()
+
+
+def _sse(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class LeaderboardStreamView(View):
+    """SSE-поток изменений лидерборда активного сбоя.
+
+    События: ``update`` (top — первые места, position — место подписчика,
+    отправляются только изменившиеся поля) и ``ended`` по окончании сбоя.
+    Работает только под ASGI.
+    """
+
+    async def get(self, request: HttpRequest, failure_id: int):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"detail": "Поток доступен только через ASGI."},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+
+        user = await sync_to_async(_stream_user)(request, failure_id)
+        if user is None:
+            return JsonResponse(
+                {"detail": "Учетные данные не были предоставлены."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        failure = await sync_to_async(_stream_failure)(user, failure_id)
+        if failure is None:
+            return JsonResponse(
+                {"detail": "Сбой не найден."}, status=status.HTTP_404_NOT_FOUND
+            )
+        if not _failure_is_active(failure):
+            return JsonResponse(
+                {"detail": "Сбой не активен."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(
+            self._events(failure, user.profile.id), content_type="text/event-stream"
         )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def _events(self, failure: Failure, profile_id: int):
+        heartbeat = float(getattr(settings, "LEADERBOARD_STREAM_HEARTBEAT_SECONDS", 15))
+        max_seconds = float(getattr(settings, "LEADERBOARD_STREAM_MAX_SECONDS", 300))
+        hub = get_leaderboard_hub()
+        subscription = await hub.subscribe(failure, profile_id)
+        loop = asyncio.get_running_loop()
+        # ограничиваем жизнь потока: EventSource сам переподключится,
+        # а зависшие после обрыва соединения подписки не копятся
+        deadline = loop.time() + max_seconds
+        try:
+            yield "retry: 3000\n\n"
+            while loop.time() < deadline:
+                if subscription.has_ended():
+                    yield _sse("ended", {"failure_id": failure.id})
+                    return
+                update = await subscription.next_update(heartbeat)
+                if update is None:
+                    yield ": ping\n\n"
+                else:
+                    yield _sse("update", update)
+        finally:
+            hub.unsubscribe(subscription)
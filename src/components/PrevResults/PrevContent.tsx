@@ -69,7 +69,7 @@ export default function PrevContent() {
     enabled: Boolean(tokens),
     queryFn: async () => {
       if (!tokens) throw new Error('missing tokens')
-      const data = await request<FailureResponse[]>(`/failures/`, {
+      const data = await request<FailureResponse[]>(`/failures/?state=past`, {
         headers: { Authorization: `Bearer ${tokens.access}` },
       })
       return data
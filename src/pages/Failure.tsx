@@ -17,9 +17,11 @@ import { request, ApiError } from "../shared/api/httpClient";
 import type {
   FailureResponse,
   FailureStartResponse,
+  FailureStartBusyResponse,
   FailureCompleteResponse,
   FailureBonusPurchaseResponse,
   FailureBonusType,
+  FailureReplay,
 } from "../shared/api/types";
 import useGlobalStore from "../shared/store/useGlobalStore";
 import FailureShop from "../components/failure/shop/FailureShop";
@@ -153,6 +155,49 @@ const LoaderTopLayer = styled.div<{ $visible: boolean }>`
 const nextFrame = () =>
   new Promise<void>((r) => requestAnimationFrame(() => r()));
 const sleep = (ms: number) => new Promise<void>((r) => setTimeout(r, ms));
+// миллисекунды от начала раунда для записи забега
+const elapsedSince = (startedAt: number) =>
+  Math.max(0, Math.round(Date.now() - startedAt));
+
+// сколько раз повторять старт, если сервер просит подождать (503 с талоном)
+const START_MAX_ATTEMPTS = 10;
+
+const startBusyHint = (error: unknown): FailureStartBusyResponse | null => {
+  if (!(error instanceof ApiError) || error.status !== 503) return null;
+  try {
+    const parsed = JSON.parse(error.message) as FailureStartBusyResponse;
+    return typeof parsed.ticket === "string" && parsed.retry_after_ms > 0
+      ? parsed
+      : null;
+  } catch {
+    return null;
+  }
+};
+
+// в момент старта сбоя сервер пускает не всех сразу: ждём своей очереди с талоном
+async function startFailureRun(
+  accessToken: string,
+  failureId: number
+): Promise<FailureStartResponse> {
+  let ticket: string | undefined;
+  for (let attempt = 1; ; attempt += 1) {
+    try {
+      return await request<FailureStartResponse>("/failures/start/", {
+        method: "POST",
+        headers: {
+          Authorization: `Bearer ${accessToken}`,
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({ failure_id: failureId, ticket }),
+      });
+    } catch (error) {
+      const busy = startBusyHint(error);
+      if (!busy || attempt >= START_MAX_ATTEMPTS) throw error;
+      ticket = busy.ticket;
+      await sleep(busy.retry_after_ms);
+    }
+  }
+}
 
 async function waitImages(container: HTMLElement) {
   const imgs = Array.from(
@@ -317,6 +362,10 @@ export default function Failure() {
 
   // фиксированная метка окончания раунда
   const endAtRef = useRef<number | null>(null);
+  const runTokenRef = useRef<string | null>(null);
+  // запись забега для серверной проверки результата
+  const replayRef = useRef<FailureReplay>({ pops: [], bombs: [], bonuses: {} });
+  const gameStartedAtRef = useRef(0);
 
   // Покадровый сценарий загрузки
   const [contentVisible, setContentVisible] = useState(false);
@@ -443,6 +492,7 @@ export default function Failure() {
   const handleBonusActivate = useCallback(
     (type: FailureBonusType) => {
       if (bonusStatus[type] !== "available") return;
+      replayRef.current.bonuses[type] = elapsedSince(gameStartedAtRef.current);
 
       switch (type) {
         case "x2":
@@ -469,10 +519,12 @@ export default function Failure() {
 
   const handlePop = useCallback(() => {
     if (!isGameRunning) return;
+    replayRef.current.pops.push(elapsedSince(gameStartedAtRef.current));
     setScore((s) => s + activeMultiplier);
   }, [activeMultiplier, isGameRunning]);
 
   const handleBombHit = useCallback(() => {
+    replayRef.current.bombs.push(elapsedSince(gameStartedAtRef.current));
     setScore(0);
   }, []);
 
@@ -492,6 +544,8 @@ export default function Failure() {
       setResultModalOpen(false);
       setTimeLeft(durationSeconds);
       endAtRef.current = Date.now() + durationSeconds * 1000;
+      gameStartedAtRef.current = Date.now();
+      replayRef.current = { pops: [], bombs: [], bonuses: {} };
       scheduleBombs(durationSeconds, bombMin, bombMax);
       setIsGameRunning(true);
     },
@@ -608,20 +662,13 @@ export default function Failure() {
 
     setIsStarting(true);
     try {
-      const payload = { failure_id: failure.id };
-      const response = await request<FailureStartResponse>("/failures/start/", {
-        method: "POST",
-        headers: {
-          Authorization: `Bearer ${tokens.access}`,
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify(payload),
-      });
+      const response = await startFailureRun(tokens.access, failure.id);
 
       const dur = response.duration_seconds ?? 60;
       const bombMin = response.bombs_min_count ?? 0;
       const bombMax = response.bombs_max_count ?? 0;
 
+      runTokenRef.current = response.run_token ?? null;
       setDuration(dur);
       setTimeLeft(dur);
       setScore(0);
@@ -704,7 +751,11 @@ export default function Failure() {
               Authorization: `Bearer ${tokens.access}`,
               "Content-Type": "application/json",
             },
-            body: JSON.stringify({ failure_id: failure.id, bonus_type: type }),
+            body: JSON.stringify({
+              failure_id: failure.id,
+              bonus_type: type,
+              run_token: runTokenRef.current,
+            }),
           }
         );
 
@@ -767,6 +818,8 @@ export default function Failure() {
             failure_id: failure.id,
             points: score,
             duration_seconds: duration,
+            run_token: runTokenRef.current,
+            replay: replayRef.current,
           }),
         }
       );
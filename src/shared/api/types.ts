@@ -167,6 +167,8 @@ export type FailureResponse = {
 
 export type FailureStartResponse = {
   detail: string;
+  run_token: string;
+  expires_at: string;
   failure: FailureResponse;
   duration_seconds: number;
   bombs_min_count: number;
@@ -178,6 +180,20 @@ export type FailureStartResponse = {
   balance: number;
 };
 
+// Ответ 503 старта сбоя при перегрузке: повторить через retry_after_ms с талоном
+export type FailureStartBusyResponse = {
+  detail: string;
+  retry_after_ms: number;
+  ticket: string;
+};
+
+// Запись забега для серверной проверки: миллисекунды от начала игры
+export type FailureReplay = {
+  pops: number[];
+  bombs: number[];
+  bonuses: Partial<Record<FailureBonusType, number>>;
+};
+
 export type FailureCompleteResponse = {
   detail: string;
   score: number;